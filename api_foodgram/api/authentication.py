@@ -0,0 +1,142 @@
+"""Custom authentication classes."""
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from recipes.cache import bump_data_version, get_data_version
+
+TOKEN_CACHE_KEY = "auth_token:{}"
+USER_TOKENS_VERSION = "user_tokens:{}"
+
+
+# Fields of the user which the request path reads, the others, the
+# password among them, are loaded from the database on access.
+CACHED_USER_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "feed_pulled",
+)
+
+
+def get_attnames(model, names=None):
+    return [
+        field.attname
+        for field in model._meta.concrete_fields
+        if names is None or field.attname in names
+    ]
+
+
+def get_values(instance, names=None):
+    return tuple(
+        getattr(instance, attname)
+        for attname in get_attnames(type(instance), names)
+    )
+
+
+def get_instance(model, values, names=None):
+    return model.from_db(None, get_attnames(model, names), values)
+
+
+def invalidate_user_tokens(user_ids):
+    """Mark the cached tokens of the users as changed after the commit."""
+    user_ids = list(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            bump_data_version(USER_TOKENS_VERSION.format(user_id))
+
+    transaction.on_commit(bump)
+
+
+class LocalTokenCache:
+    """Bounded in-process cache of tokens with least recently used eviction."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_LOCAL_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication resolving the token owner from the cache.
+
+    The token and the fields of its user which the request path reads
+    are kept in the bounded in-process cache and in the shared cache for
+    TOKEN_CACHE_TIMEOUT seconds. An entry holds the version of the
+    tokens of the user, so it is not used by any process once the
+    version is bumped on logout, password change, deactivation of the
+    user or deletion of the token. The version is read before the token
+    is read from the database, so an entry never holds a version bumped
+    after its data was read. The owner of an unknown token is not known
+    before the token is read, so the first request only caches the
+    owner and the next one caches the data.
+    """
+
+    local_cache = LocalTokenCache()
+
+    def get_entry(self, key):
+        """Return the cached entry of the token, also an outdated one."""
+        entry = self.local_cache.get(key)
+        if entry is None or entry[0] < time():
+            entry = cache.get(TOKEN_CACHE_KEY.format(key))
+            if entry is not None:
+                self.local_cache.set(key, entry)
+        return entry
+
+    def set_entry(self, key, entry):
+        cache.set(
+            TOKEN_CACHE_KEY.format(key), entry, settings.TOKEN_CACHE_TIMEOUT
+        )
+        self.local_cache.set(key, entry)
+
+    def authenticate_credentials(self, key):
+        entry = self.get_entry(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            self.set_entry(key, (0, None, user.pk, None, None))
+            return user, token
+        version = get_data_version(USER_TOKENS_VERSION.format(entry[2]))
+        if entry[0] >= time() and entry[1] == version:
+            user = get_instance(get_user_model(), entry[3], CACHED_USER_FIELDS)
+            token = get_instance(self.get_model(), entry[4])
+            token.user = user
+            return user, token
+        user, token = super().authenticate_credentials(key)
+        if user.pk == entry[2]:
+            self.set_entry(
+                key,
+                (
+                    time() + settings.TOKEN_CACHE_TIMEOUT,
+                    version,
+                    user.pk,
+                    get_values(user, CACHED_USER_FIELDS),
+                    get_values(token),
+                ),
+            )
+        return user, token
@@ -0,0 +1,73 @@
+"""Routing of reads to the replica databases.
+
+The database for the reads of a request is chosen once by the
+ReplicaRoutingMiddleware: a replica for requests with safe methods,
+the primary ('default') database for writes and for callers pinned to
+it after a write. Writes always go to the primary database. Queries
+outside of requests (management commands, shell) use the primary.
+"""
+
+import random
+import threading
+from contextlib import contextmanager
+from time import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+state = threading.local()
+unavailable_until = {}
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def is_available(alias):
+    """Check the connection to the replica, skip it for a while on failure."""
+    if unavailable_until.get(alias, 0) > time():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        unavailable_until[alias] = time() + settings.DB_REPLICA_RETRY_SECONDS
+        return False
+    unavailable_until.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    """Return an available replica in random order, or the primary."""
+    replicas = get_replicas()
+    random.shuffle(replicas)
+    for alias in replicas:
+        if is_available(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def reading_from(alias):
+    """Route the reads to the database within the block."""
+    previous = getattr(state, "alias", None)
+    state.alias = alias
+    try:
+        yield
+    finally:
+        state.alias = previous
+
+
+class ReplicaRouter:
+    """Send reads to the database chosen for the request."""
+
+    def db_for_read(self, model, **hints):
+        return getattr(state, "alias", None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
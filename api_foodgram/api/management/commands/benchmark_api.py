@@ -0,0 +1,642 @@
+"""Benchmark the API endpoints: latency percentiles, queries and memory."""
+
+import base64
+import json
+import math
+import shutil
+import tempfile
+import tracemalloc
+from collections import namedtuple
+from io import BytesIO
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import URLResolver, resolve
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_user_tokens
+from api.v1.urls import urlpatterns
+from recipes import shopping_list
+from recipes.models import (
+    Favorite,
+    ImageUpload,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.user_state import invalidate_user_state
+from users.models import Subscription, User
+
+PASSWORD = "Kx9-steady-lantern-31"
+TRANSACTION_QUERIES = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO")
+PERCENTILES = (50, 95, 99)
+# The API root and the routes which the router adds to the relation
+# viewsets besides their list route, which serves the same DELETE.
+SKIPPED_ROUTES = (
+    "api-root",
+    "favorite-delete",
+    "favorite-detail",
+    "shopping_cart-delete",
+    "shopping_cart-detail",
+    "subscribe-delete",
+    "subscribe-detail",
+)
+
+Scenario = namedtuple(
+    "Scenario",
+    ("name", "user", "method", "path", "data", "status", "json"),
+    defaults=(None, 200, True),
+)
+
+
+def get_percentile(values, percentile):
+    """Return the nearest-rank percentile of the values."""
+    values = sorted(values)
+    rank = math.ceil(percentile / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new("RGB", (800, 600), (200, 120, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def get_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_patterns(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+def get_routes():
+    """Return the (name, method) pairs of the API routes."""
+    routes = set()
+    for pattern in get_patterns(urlpatterns):
+        if pattern.name in SKIPPED_ROUTES:
+            continue
+        view = pattern.callback.cls
+        methods = set(getattr(pattern.callback, "actions", None) or ())
+        methods.update(
+            method
+            for method in view.http_method_names
+            if method not in ("head", "options") and hasattr(view, method)
+        )
+        routes.update(
+            (pattern.name, method)
+            for method in methods
+            if method in view.http_method_names
+        )
+    return routes
+
+
+def find_missing_routes(scenarios):
+    """Return descriptions of the API routes without a scenario."""
+    covered = {
+        (resolve(urlsplit(scenario.path).path).url_name, scenario.method)
+        for scenario in scenarios
+    }
+    return [
+        f"{method.upper()} {name}"
+        for name, method in sorted(get_routes() - covered)
+    ]
+
+
+class QueryTimer:
+    """Count the queries and their time, except the transaction control."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not sql.startswith(TRANSACTION_QUERIES):
+                self.count += 1
+                self.time += perf_counter() - started
+
+
+class Command(BaseCommand):
+    """Run request scenarios through the test client and measure them.
+
+    All requests run in transactions which are rolled back, so writing
+    scenarios are repeatable and the database is left unchanged. The
+    reader is a dedicated user, and the cached data of the benchmark
+    users is invalidated after the rollback. A full run fails when a
+    route of the API has no scenario.
+    """
+
+    help = "Benchmark the API endpoints, check the results against budgets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            help="Run the scenarios with names starting with the value.",
+        )
+        parser.add_argument("--output", help="File for the JSON results.")
+        parser.add_argument(
+            "--compare", help="JSON results of a previous run to compare."
+        )
+        parser.add_argument(
+            "--budgets",
+            help=(
+                'JSON file of limits: {"default": {"p95_ms": 100}, '
+                '"scenarios": {"<name>": {"queries": 5}}}.'
+            ),
+        )
+
+    def setup(self):
+        """Prepare users, tokens and relations used by the scenarios."""
+        recipes = Recipe.objects.order_by("-favorites_count", "id")
+        if recipes.count() < 2:
+            raise CommandError("Not enough data, run generate_load_data.")
+        recipe, other_recipe = recipes[:2]
+        reader, other_author = (
+            User.objects.create_user(
+                username=f"benchmark_{name}",
+                email=f"benchmark_{name}@example.com",
+                password=PASSWORD,
+            )
+            for name in ("reader", "author")
+        )
+        Favorite.objects.create(user=reader, recipe=recipe)
+        ShoppingCart.objects.create(user=reader, recipe=recipe)
+        Subscription.objects.create(user=reader, author=recipe.author)
+        self.clients = {"anonymous": Client()}
+        for name, user in (("reader", reader), ("author", recipe.author)):
+            token, _ = Token.objects.get_or_create(user=user)
+            self.clients[name] = Client(
+                HTTP_AUTHORIZATION=f"Token {token.key}"
+            )
+        upload = ImageUpload.objects.create(
+            user=recipe.author, width=800, height=600
+        )
+        upload.file.save("benchmark.jpg", BytesIO(get_image()))
+        return {
+            "reader": reader,
+            "recipe": recipe,
+            "other_recipe": other_recipe,
+            "other_author": other_author,
+            "image_token": str(upload.token),
+        }
+
+    @staticmethod
+    def get_recipe_data(**fields):
+        return {
+            "tags": list(Tag.objects.values_list("id", flat=True)[:2]),
+            "ingredients": [
+                {"id": ingredient_id, "amount": 10}
+                for ingredient_id in Ingredient.objects.values_list(
+                    "id", flat=True
+                )[:8]
+            ],
+            "name": "Benchmark recipe",
+            "text": "Benchmark recipe description.",
+            "cooking_time": 30,
+            **fields,
+        }
+
+    def get_scenarios(self, objects):
+        recipe, other_recipe = objects["recipe"], objects["other_recipe"]
+        author_id = recipe.author_id
+        tags = "&".join(
+            f"tags={slug}"
+            for slug in Tag.objects.values_list("slug", flat=True)
+        )
+        word = recipe.name.split()[0]
+        ingredient = Ingredient.objects.first()
+        tag = Tag.objects.first()
+        image = (
+            "data:image/jpeg;base64," + base64.b64encode(get_image()).decode()
+        )
+        recipe_data = self.get_recipe_data()
+        pantry = "&".join(
+            f"ingredients={ingredient_id}"
+            for ingredient_id in Ingredient.objects.values_list(
+                "id", flat=True
+            )[:10]
+        )
+        return (
+            Scenario("users_list", "anonymous", "get", "/api/users/"),
+            Scenario(
+                "users_create",
+                "anonymous",
+                "post",
+                "/api/users/",
+                {
+                    "email": "benchmark_new@example.com",
+                    "username": "benchmark_new",
+                    "first_name": "Benchmark",
+                    "last_name": "User",
+                    "password": PASSWORD,
+                },
+                status=201,
+            ),
+            Scenario(
+                "users_detail", "reader", "get", f"/api/users/{author_id}/"
+            ),
+            Scenario("users_me", "reader", "get", "/api/users/me/"),
+            Scenario(
+                "users_subscriptions",
+                "reader",
+                "get",
+                "/api/users/subscriptions/?recipes_limit=3",
+            ),
+            Scenario(
+                "users_subscribe",
+                "reader",
+                "post",
+                f"/api/users/{objects['other_author'].id}/subscribe/",
+                status=201,
+            ),
+            Scenario(
+                "users_unsubscribe",
+                "reader",
+                "delete",
+                f"/api/users/{author_id}/subscribe/",
+                status=204,
+            ),
+            Scenario(
+                "users_set_password",
+                "reader",
+                "post",
+                "/api/users/set_password/",
+                {"new_password": PASSWORD, "current_password": PASSWORD},
+                status=204,
+            ),
+            Scenario(
+                "auth_token_login",
+                "anonymous",
+                "post",
+                "/api/auth/token/login/",
+                {"email": objects["reader"].email, "password": PASSWORD},
+            ),
+            Scenario(
+                "auth_token_logout",
+                "reader",
+                "post",
+                "/api/auth/token/logout/",
+                status=204,
+            ),
+            Scenario("tags_list", "anonymous", "get", "/api/tags/"),
+            Scenario(
+                "tags_detail", "anonymous", "get", f"/api/tags/{tag.id}/"
+            ),
+            Scenario(
+                "ingredients_list", "anonymous", "get", "/api/ingredients/"
+            ),
+            Scenario(
+                "ingredients_search",
+                "anonymous",
+                "get",
+                f"/api/ingredients/?name={ingredient.name[:3]}",
+            ),
+            Scenario(
+                "ingredients_detail",
+                "anonymous",
+                "get",
+                f"/api/ingredients/{ingredient.id}/",
+            ),
+            Scenario(
+                "recipes_list_anonymous", "anonymous", "get", "/api/recipes/"
+            ),
+            Scenario("recipes_list_reader", "reader", "get", "/api/recipes/"),
+            Scenario(
+                "recipes_list_page_2",
+                "reader",
+                "get",
+                "/api/recipes/?page=2&limit=3",
+            ),
+            Scenario(
+                "recipes_list_cursor",
+                "reader",
+                "get",
+                "/api/recipes/?pagination=cursor&limit=24",
+            ),
+            Scenario(
+                "recipes_list_tags", "reader", "get", f"/api/recipes/?{tags}"
+            ),
+            Scenario(
+                "recipes_list_author",
+                "anonymous",
+                "get",
+                f"/api/recipes/?author={author_id}",
+            ),
+            Scenario(
+                "recipes_list_favorited",
+                "reader",
+                "get",
+                "/api/recipes/?is_favorited=1",
+            ),
+            Scenario(
+                "recipes_list_in_cart",
+                "reader",
+                "get",
+                "/api/recipes/?is_in_shopping_cart=1",
+            ),
+            Scenario(
+                "recipes_list_search",
+                "anonymous",
+                "get",
+                f"/api/recipes/?search={word}&{tags}",
+            ),
+            Scenario(
+                "recipes_detail", "reader", "get", f"/api/recipes/{recipe.id}/"
+            ),
+            Scenario("recipes_feed", "reader", "get", "/api/recipes/feed/"),
+            Scenario(
+                "recipes_similar",
+                "anonymous",
+                "get",
+                f"/api/recipes/{recipe.id}/similar/",
+            ),
+            Scenario(
+                "recipes_pantry",
+                "reader",
+                "get",
+                f"/api/recipes/pantry/?{pantry}&max_missing=3",
+            ),
+            Scenario(
+                "recipes_create_base64",
+                "author",
+                "post",
+                "/api/recipes/",
+                {**recipe_data, "image": image},
+                status=201,
+            ),
+            Scenario(
+                "recipes_create_token",
+                "author",
+                "post",
+                "/api/recipes/",
+                {**recipe_data, "image_token": objects["image_token"]},
+                status=201,
+            ),
+            Scenario(
+                "recipes_patch",
+                "author",
+                "patch",
+                f"/api/recipes/{recipe.id}/",
+                recipe_data,
+            ),
+            Scenario(
+                "recipes_patch_image",
+                "author",
+                "patch",
+                f"/api/recipes/{recipe.id}/",
+                {**recipe_data, "image": image},
+            ),
+            Scenario(
+                "recipes_delete",
+                "author",
+                "delete",
+                f"/api/recipes/{recipe.id}/",
+                status=204,
+            ),
+            Scenario(
+                "recipes_image_upload",
+                "author",
+                "post",
+                "/api/recipes/images/",
+                lambda: {"file": BytesIO(get_image())},
+                status=201,
+                json=False,
+            ),
+            Scenario(
+                "favorite_add",
+                "reader",
+                "post",
+                f"/api/recipes/{other_recipe.id}/favorite/",
+                status=201,
+            ),
+            Scenario(
+                "favorite_remove",
+                "reader",
+                "delete",
+                f"/api/recipes/{recipe.id}/favorite/",
+                status=204,
+            ),
+            Scenario(
+                "shopping_cart_add",
+                "reader",
+                "post",
+                f"/api/recipes/{other_recipe.id}/shopping_cart/",
+                status=201,
+            ),
+            Scenario(
+                "shopping_cart_remove",
+                "reader",
+                "delete",
+                f"/api/recipes/{recipe.id}/shopping_cart/",
+                status=204,
+            ),
+            *(
+                Scenario(
+                    f"{name}_bulk_{method}",
+                    "reader",
+                    method,
+                    path,
+                    {"ids": ids},
+                )
+                for name, path, ids in (
+                    (
+                        "favorite",
+                        "/api/recipes/favorite/",
+                        [recipe.id, other_recipe.id],
+                    ),
+                    (
+                        "shopping_cart",
+                        "/api/recipes/shopping_cart/",
+                        [recipe.id, other_recipe.id],
+                    ),
+                    (
+                        "users_subscribe",
+                        "/api/users/subscribe/",
+                        [author_id, objects["other_author"].id],
+                    ),
+                )
+                for method in ("post", "delete")
+            ),
+            *(
+                Scenario(
+                    f"shopping_cart_download_{renderer_format}",
+                    "reader",
+                    "get",
+                    "/api/recipes/download_shopping_cart/"
+                    f"?format={renderer_format}",
+                )
+                for renderer_format in ("txt", "csv", "json", "pdf")
+            ),
+        )
+
+    def request(self, scenario):
+        """Send the request in a transaction which is rolled back."""
+        client = self.clients[scenario.user]
+        data = scenario.data() if callable(scenario.data) else scenario.data
+        kwargs = {}
+        if scenario.json and (
+            scenario.data is not None or scenario.method in ("post", "patch")
+        ):
+            kwargs["content_type"] = "application/json"
+        with transaction.atomic():
+            response = getattr(client, scenario.method)(
+                scenario.path, data, **kwargs
+            )
+            if response.streaming:
+                b"".join(response.streaming_content)
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, scenario, iterations, warmup):
+        for _ in range(warmup):
+            self.request(scenario)
+        latencies, query_counts, sql_times, statuses = [], [], [], set()
+        for _ in range(iterations):
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                started = perf_counter()
+                statuses.add(self.request(scenario).status_code)
+                latencies.append(perf_counter() - started)
+            query_counts.append(timer.count)
+            sql_times.append(timer.time)
+        tracemalloc.start()
+        self.request(scenario)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result = {
+            f"p{percentile}_ms": round(
+                get_percentile(latencies, percentile) * 1000, 2
+            )
+            for percentile in PERCENTILES
+        }
+        result.update(
+            queries=max(query_counts),
+            sql_ms=round(get_percentile(sql_times, 50) * 1000, 3),
+            peak_memory_kb=round(peak_memory / 1024),
+            statuses=sorted(statuses),
+        )
+        return result
+
+    @staticmethod
+    def check_budgets(results, budgets):
+        """Return descriptions of the exceeded limits."""
+        violations = []
+        for name, result in results.items():
+            limits = {
+                **budgets.get("default", {}),
+                **budgets.get("scenarios", {}).get(name, {}),
+            }
+            for metric, limit in limits.items():
+                if result[metric] > limit:
+                    violations.append(
+                        f"{name}: {metric} {result[metric]} > {limit}"
+                    )
+        return violations
+
+    def compare(self, results, path):
+        with open(path, encoding="utf8") as file:
+            previous = json.load(file)["scenarios"]
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            old = previous[name]
+            self.stdout.write(
+                f"{name}: p95 {old['p95_ms']} -> {result['p95_ms']} ms, "
+                f"queries {old['queries']} -> {result['queries']}, "
+                f"memory {old['peak_memory_kb']} -> "
+                f"{result['peak_memory_kb']} KB"
+            )
+
+    def run_scenarios(self, options):
+        results = {}
+        with transaction.atomic():
+            objects = self.setup()
+            author_id = objects["recipe"].author_id
+            scenarios = self.get_scenarios(objects)
+            missing = find_missing_routes(scenarios)
+            if missing and not options["scenario"]:
+                raise CommandError(
+                    "No scenarios of the routes: " + ", ".join(missing)
+                )
+            for scenario in scenarios:
+                if options["scenario"] and not scenario.name.startswith(
+                    tuple(options["scenario"])
+                ):
+                    continue
+                result = self.measure(
+                    scenario, options["iterations"], options["warmup"]
+                )
+                result["expected_status"] = scenario.status
+                results[scenario.name] = result
+                self.stdout.write(
+                    f"{scenario.name}: p50 {result['p50_ms']} ms, "
+                    f"p95 {result['p95_ms']} ms, "
+                    f"p99 {result['p99_ms']} ms, "
+                    f"{result['queries']} queries, "
+                    f"SQL {result['sql_ms']} ms, "
+                    f"{result['peak_memory_kb']} KB"
+                )
+            transaction.set_rollback(True)
+        self.invalidate_caches(
+            (objects["reader"].id, objects["other_author"].id, author_id)
+        )
+        return results
+
+    @staticmethod
+    def invalidate_caches(user_ids):
+        """Invalidate the data cached for the users during the benchmark.
+
+        The versions are bumped by the on_commit callbacks, which were
+        discarded with the rolled back transaction. Outside a
+        transaction the callbacks run at once.
+        """
+        for user_id in user_ids:
+            invalidate_user_state(user_id)
+        shopping_list.bump_versions(user_ids)
+        invalidate_user_tokens(user_ids)
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=["testserver"], MEDIA_ROOT=media_root
+            ):
+                results = self.run_scenarios(options)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf8") as file:
+                json.dump(
+                    {
+                        "database": connection.vendor,
+                        "iterations": options["iterations"],
+                        "scenarios": results,
+                    },
+                    file,
+                    indent=2,
+                )
+        if options["compare"]:
+            self.compare(results, options["compare"])
+        violations = [
+            f"{name}: status {result['statuses']}, "
+            f"expected {result['expected_status']}"
+            for name, result in results.items()
+            if result["statuses"] != [result["expected_status"]]
+        ]
+        if options["budgets"]:
+            with open(options["budgets"], encoding="utf8") as file:
+                violations += self.check_budgets(results, json.load(file))
+        if violations:
+            raise CommandError("\n".join(violations))
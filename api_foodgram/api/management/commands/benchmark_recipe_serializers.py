@@ -0,0 +1,97 @@
+"""Compare the fast and the model serializers of recipe listings."""
+
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.v1.serializers import GetRecipeSerializer, RecipeRowSerializer
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Check the output parity and measure the cost per serialized recipe."""
+
+    help = (
+        "Check that RecipeRowSerializer renders the same JSON as "
+        "GetRecipeSerializer and compare their speed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=(6, 24, 100),
+            help="Page sizes to compare.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of renderings of every page.",
+        )
+        parser.add_argument(
+            "--user",
+            help="Username of the request user, anonymous by default.",
+        )
+
+    @staticmethod
+    def get_request(username):
+        request = Request(APIRequestFactory().get("/api/recipes/"))
+        if username is not None:
+            request.user = User.objects.get(username=username)
+        return request
+
+    @staticmethod
+    def render_model_serializer(request, size):
+        queryset = Recipe.objects.select_related("author").prefetch_related(
+            "tags", "recipe_ingredient__ingredient", "image_derivatives"
+        )[:size]
+        return JSONRenderer().render(
+            GetRecipeSerializer(
+                queryset, many=True, context={"request": request}
+            ).data
+        )
+
+    @staticmethod
+    def render_row_serializer(request, size):
+        queryset = RecipeRowSerializer.get_rows(Recipe.objects.all())[:size]
+        return JSONRenderer().render(
+            RecipeRowSerializer(
+                queryset, many=True, context={"request": request}
+            ).data
+        )
+
+    @staticmethod
+    def measure(render, request, size, repeat):
+        """Return the time of one rendering in seconds, queries included."""
+        started = perf_counter()
+        for _ in range(repeat):
+            render(request, size)
+        return (perf_counter() - started) / repeat
+
+    @override_settings(ALLOWED_HOSTS=["testserver"])
+    def handle(self, *args, **options):
+        request = self.get_request(options["user"])
+        for size in options["sizes"]:
+            expected = self.render_model_serializer(request, size)
+            if self.render_row_serializer(request, size) != expected:
+                raise CommandError(f"Output differs for {size} recipes.")
+            count = min(size, Recipe.objects.count()) or 1
+            before, after = (
+                self.measure(render, request, size, options["repeat"])
+                for render in (
+                    self.render_model_serializer,
+                    self.render_row_serializer,
+                )
+            )
+            self.stdout.write(
+                f"{size} recipes: {before / count * 1e6:.0f} us -> "
+                f"{after / count * 1e6:.0f} us per recipe "
+                f"({before / after:.1f}x)"
+            )
@@ -0,0 +1,125 @@
+"""Benchmark the startup: import of the WSGI module and the first request."""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+STARTUP_SCRIPT = """
+import json
+import sys
+from time import perf_counter
+
+started = perf_counter()
+from api_foodgram.wsgi import application
+from api.warmup import request, warm_up
+imported = perf_counter()
+if sys.argv[1] == "warm":
+    warm_up(application)
+warmed = perf_counter()
+status = request(application, sys.argv[2])
+finished = perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "warmup_ms": (warmed - imported) * 1000,
+    "first_request_ms": (finished - warmed) * 1000,
+    "status": status,
+}))
+"""
+MODES = ("cold", "warm")
+METRICS = ("import_ms", "warmup_ms", "first_request_ms")
+
+
+class Command(BaseCommand):
+    """Start fresh interpreters and time the startup phases.
+
+    Every run imports 'api_foodgram.wsgi' in a new process and makes one
+    request to the path, without ('cold') and after ('warm') the worker
+    warmup. The medians of the runs are reported and can be checked
+    against the budgets.
+    """
+
+    help = "Benchmark the import and first request of the WSGI application."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--path", default="/api/recipes/")
+        parser.add_argument("--output", help="File for the JSON results.")
+        parser.add_argument(
+            "--budgets",
+            help=(
+                'JSON file of limits: {"cold": {"first_request_ms": 500}, '
+                '"warm": {"import_ms": 1000}}.'
+            ),
+        )
+
+    @staticmethod
+    def run_process(mode, path):
+        process = subprocess.run(
+            (sys.executable, "-c", STARTUP_SCRIPT, mode, path),
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": os.environ.get(
+                    "DJANGO_SETTINGS_MODULE", "api_foodgram.settings"
+                ),
+                "PERFORMANCE_SAMPLE_RATE": "0",
+            },
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr)
+        return json.loads(process.stdout.splitlines()[-1])
+
+    def measure(self, mode, runs, path):
+        samples = [self.run_process(mode, path) for _ in range(runs)]
+        result = {
+            metric: round(
+                statistics.median(sample[metric] for sample in samples), 1
+            )
+            for metric in METRICS
+        }
+        result["statuses"] = sorted({sample["status"] for sample in samples})
+        return result
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in MODES:
+            result = results[mode] = self.measure(
+                mode, options["runs"], options["path"]
+            )
+            self.stdout.write(
+                f"{mode}: import {result['import_ms']} ms, "
+                f"warmup {result['warmup_ms']} ms, "
+                f"first request {result['first_request_ms']} ms, "
+                f"status {', '.join(result['statuses'])}"
+            )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf8") as file:
+                json.dump(
+                    {
+                        "path": options["path"],
+                        "runs": options["runs"],
+                        "modes": results,
+                    },
+                    file,
+                    indent=2,
+                )
+        if not options["budgets"]:
+            return
+        with open(options["budgets"], encoding="utf8") as file:
+            budgets = json.load(file)
+        violations = [
+            f"{mode}: {metric} {results[mode][metric]} > {limit}"
+            for mode, limits in budgets.items()
+            for metric, limit in limits.items()
+            if results[mode][metric] > limit
+        ]
+        if violations:
+            raise CommandError("\n".join(violations))
@@ -0,0 +1,444 @@
+"""Explain the queries of the API endpoints, suggest missing indexes."""
+
+import json
+import os
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.middleware import get_query_shape
+from recipes.models import Favorite, Recipe, Tag
+from users.models import User
+
+COLUMN = r'"(\w+)"\."(\w+)"'
+PREDICATE = re.compile(
+    rf"(?:UPPER\(|LOWER\()?{COLUMN}(?:::text\))?\)?" r" (=|IN|LIKE|<=|>=|<|>) "
+)
+JOIN_COLUMN = re.compile(rf"= {COLUMN}")
+ORDER_BY = re.compile(r" ORDER BY (.+?)(?: LIMIT | OFFSET |$)")
+SORT_COLUMN = re.compile(rf"{COLUMN}( DESC)?")
+FUNCTION = re.compile(rf"(UPPER|LOWER)\({COLUMN}(?:::text)?\) LIKE")
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+SQLITE_SORT = "USE TEMP B-TREE FOR ORDER BY"
+TABLE = re.compile(r'(?:FROM|JOIN) "(\w+)"')
+SORT_NODES = ("Sort", "Incremental Sort")
+
+
+def get_postgresql_plan(sql, params):
+    """Return plan lines, scanned tables, sort flag and execution time."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params
+        )
+        explained = cursor.fetchone()[0][0]
+    lines, scans, sorted_ = [], set(), False
+    nodes = [explained["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        line = node["Node Type"]
+        sorted_ = sorted_ or line in SORT_NODES
+        if "Relation Name" in node:
+            line += f" on {node['Relation Name']}"
+            if node["Node Type"] == "Seq Scan":
+                scans.add(node["Relation Name"])
+        if "Index Name" in node:
+            line += f" using {node['Index Name']}"
+        lines.append(line)
+        nodes.extend(reversed(node.get("Plans", ())))
+    return lines, scans, sorted_, explained["Execution Time"]
+
+
+def get_sqlite_plan(sql, params):
+    """Return plan lines, scanned tables and sort flag, no time."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = [row[3] for row in cursor.fetchall()]
+    lines, scans, sorted_ = [], set(), False
+    for detail in details:
+        detail = detail.replace(" TABLE ", " ", 1)
+        match = SQLITE_SCAN.match(detail)
+        if match:
+            scans.add(match.group(1))
+        sorted_ = sorted_ or detail == SQLITE_SORT
+        lines.append(detail)
+    return lines, scans, sorted_, None
+
+
+PLANNERS = {"postgresql": get_postgresql_plan, "sqlite": get_sqlite_plan}
+
+
+def get_label(sql, labels):
+    """Return a label of the query stable under changes of its columns.
+
+    The label is the sorted tables which the query reads and the ordinal
+    of the query among the earlier queries of the same tables.
+    """
+    tables = ",".join(sorted(set(TABLE.findall(sql)))) or "-"
+    ordinal = sum(label.rpartition("#")[0] == tables for label in labels)
+    return f"{tables}#{ordinal + 1}"
+
+
+def get_existing_indexes(table):
+    """Return column lists of the indexes of the table."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [
+        constraint["columns"]
+        for constraint in constraints.values()
+        if constraint["index"] or constraint["unique"]
+    ]
+
+
+def get_index_columns(sql, table):
+    """Return (column, order) of the table to be indexed, in that order.
+
+    Columns compared with values go first, then the join columns and the
+    columns of the ORDER BY clause.
+    """
+    where = sql.partition(" WHERE ")[2]
+    columns = [
+        (match.group(2), "")
+        for match in PREDICATE.finditer(where)
+        if match.group(1) == table
+    ]
+    columns.extend(
+        (match.group(2), "")
+        for match in JOIN_COLUMN.finditer(sql)
+        if match.group(1) == table
+    )
+    order_by = ORDER_BY.search(sql)
+    if order_by:
+        columns.extend(
+            (match.group(2), match.group(3) or "")
+            for match in SORT_COLUMN.finditer(order_by.group(1))
+            if match.group(1) == table
+        )
+    orders = {}
+    for column, order in columns:
+        orders.setdefault(column, order)
+    return list(orders.items())
+
+
+def suggest_index(sql, table):
+    """Return an index statement for the scanned table, or None.
+
+    Case-insensitive LIKE lookups on PostgreSQL get a functional index
+    with the 'text_pattern_ops' operator class. No index is suggested
+    when an existing one starts with the same columns.
+    """
+    where = sql.partition(" WHERE ")[2]
+    for match in FUNCTION.finditer(where):
+        if match.group(2) == table and connection.vendor == "postgresql":
+            function, _, column = match.groups()
+            return (
+                f'CREATE INDEX ON "{table}" '
+                f'({function}("{column}") text_pattern_ops)'
+            )
+    columns = get_index_columns(sql, table)
+    names = [column for column, _ in columns]
+    if not names or any(
+        existing[: len(names)] == names
+        for existing in get_existing_indexes(table)
+    ):
+        return None
+    column_list = ", ".join(f'"{column}"{order}' for column, order in columns)
+    return f'CREATE INDEX ON "{table}" ({column_list})'
+
+
+def suggest_sort_index(sql):
+    """Return an index statement to read rows in ORDER BY order, or None.
+
+    Suggested when the ordering columns belong to one table which is
+    filtered by equality only, as in the recipes of one author.
+    """
+    order_by = ORDER_BY.search(sql)
+    if not order_by:
+        return None
+    tables = {
+        match.group(1) for match in SORT_COLUMN.finditer(order_by.group(1))
+    }
+    if len(tables) != 1:
+        return None
+    (table,) = tables
+    where = sql.partition(" WHERE ")[2]
+    operators = {
+        match.group(3)
+        for match in PREDICATE.finditer(where)
+        if match.group(1) == table
+    }
+    if operators != {"="}:
+        return None
+    return suggest_index(sql, table)
+
+
+class Command(BaseCommand):
+    """Explain the SELECT queries of the API endpoints.
+
+    The endpoints are requested through the test client with
+    representative parameters in a transaction which is rolled back.
+    Every SELECT query is explained: 'EXPLAIN (ANALYZE, BUFFERS)' on
+    PostgreSQL, 'EXPLAIN QUERY PLAN' on SQLite. Sequential scans are
+    reported with suggested indexes. The plans are saved as snapshots
+    with --update. Queries are matched with the snapshot by the scenario
+    and a label of the tables they read, and --check fails when a query
+    scans a table which its snapshot plan did not scan, and when a query
+    is new or no longer executed. The committed snapshots are taken
+    from the data of api.tests.test_query_plans, which saves them when
+    run with QUERY_PLANS_UPDATE=1.
+    """
+
+    help = "Explain the queries of the API endpoints, suggest indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Save the plans as the snapshot.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail on new sequential scans and on changed queries.",
+        )
+        parser.add_argument(
+            "--snapshot",
+            help="Snapshot file, by default one per database vendor.",
+        )
+
+    @staticmethod
+    def get_scenarios():
+        """Return (name, user, method, path) of representative requests."""
+        reader = (
+            User.objects.annotate(favorites_total=Count("favorites"))
+            .order_by("-favorites_total", "id")
+            .first()
+        )
+        author = (
+            User.objects.exclude(id=reader.id)
+            .exclude(subscription__user=reader)
+            .order_by("-recipes_count", "id")
+            .first()
+        )
+        recipe = Recipe.objects.order_by("-favorites_count", "id").first()
+        if author is None or recipe is None:
+            raise CommandError("Not enough data, run generate_load_data.")
+        tags = "&".join(
+            f"tags={slug}"
+            for slug in Tag.objects.values_list("slug", flat=True)[:2]
+        )
+        word = recipe.name.split()[0]
+        favorite = (
+            Recipe.objects.exclude(
+                id__in=Favorite.objects.filter(user=reader).values("recipe")
+            )
+            .order_by("id")
+            .first()
+        )
+        scenarios = [
+            ("recipes_list", None, "get", "/api/recipes/"),
+            ("recipes_list_reader", reader, "get", "/api/recipes/"),
+            ("recipes_list_tags", None, "get", f"/api/recipes/?{tags}"),
+            (
+                "recipes_list_author",
+                None,
+                "get",
+                f"/api/recipes/?author={author.id}",
+            ),
+            (
+                "recipes_list_favorited",
+                reader,
+                "get",
+                "/api/recipes/?is_favorited=1",
+            ),
+            (
+                "recipes_list_in_cart",
+                reader,
+                "get",
+                "/api/recipes/?is_in_shopping_cart=1",
+            ),
+            (
+                "recipes_list_search",
+                None,
+                "get",
+                f"/api/recipes/?search={word}",
+            ),
+            (
+                "recipes_list_cursor",
+                None,
+                "get",
+                "/api/recipes/?pagination=cursor",
+            ),
+            ("recipes_detail", reader, "get", f"/api/recipes/{recipe.id}/"),
+            ("users_list", reader, "get", "/api/users/"),
+            (
+                "users_subscriptions",
+                reader,
+                "get",
+                "/api/users/subscriptions/?recipes_limit=3",
+            ),
+            (
+                "shopping_cart_download",
+                reader,
+                "get",
+                "/api/recipes/download_shopping_cart/?format=txt",
+            ),
+        ]
+        if favorite is not None:
+            scenarios.append(
+                (
+                    "favorite_add",
+                    reader,
+                    "post",
+                    f"/api/recipes/{favorite.id}/favorite/",
+                )
+            )
+        scenarios.append(
+            (
+                "subscribe",
+                reader,
+                "post",
+                f"/api/users/{author.id}/subscribe/",
+            )
+        )
+        return scenarios
+
+    @staticmethod
+    def capture_queries(user, method, path):
+        """Request the path, return (sql, params) of the SELECT queries."""
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith("SELECT"):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        client = Client()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client = Client(HTTP_AUTHORIZATION=f"Token {token.key}")
+        with connection.execute_wrapper(capture), transaction.atomic():
+            response = getattr(client, method)(path)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise CommandError(f"{path}: status {response.status_code}.")
+        return queries
+
+    def explain(self, name, user, method, path):
+        """Return the plans of the queries, print scans and suggestions.
+
+        Queries of the same shape are explained once.
+        """
+        explain = PLANNERS[connection.vendor]
+        plans = {}
+        for sql, params in self.capture_queries(user, method, path):
+            shape = get_query_shape(sql)
+            if shape in plans:
+                plans[shape]["count"] += 1
+                continue
+            lines, scans, sorted_, duration = explain(sql, params)
+            scans &= self.tables
+            plans[shape] = {
+                "label": get_label(
+                    sql, [plan["label"] for plan in plans.values()]
+                ),
+                "sql": shape,
+                "plan": lines,
+                "scans": sorted(scans),
+                "count": 1,
+            }
+            if self.verbosity > 1:
+                self.stdout.write(f"{name}: {shape}")
+                for line in lines:
+                    self.stdout.write(f"    {line}")
+                if duration is not None:
+                    self.stdout.write(f"    Execution time: {duration} ms")
+            for table in sorted(scans):
+                suggestion = suggest_index(sql, table)
+                self.stdout.write(
+                    f"{name}: sequential scan of '{table}'"
+                    + (f", suggested: {suggestion}" if suggestion else "")
+                )
+            suggestion = sorted_ and suggest_sort_index(sql)
+            if suggestion:
+                self.stdout.write(
+                    f"{name}: rows are sorted, suggested: {suggestion}"
+                )
+        for query in plans.values():
+            if query["count"] >= settings.PERFORMANCE_REPEATED_QUERIES:
+                self.stdout.write(
+                    f"{name}: query executed {query['count']} times: "
+                    f"{query['sql']}"
+                )
+        return list(plans.values())
+
+    @staticmethod
+    def find_regressions(plans, snapshot):
+        """Return descriptions of new scans and queries out of snapshot."""
+        regressions = []
+        for name in sorted(snapshot.keys() - plans.keys()):
+            regressions.append(f"{name}: scenario is no longer run")
+        for name, queries in plans.items():
+            previous = {
+                query.get("label"): query for query in snapshot.get(name, ())
+            }
+            for query in queries:
+                label = query["label"]
+                if label not in previous:
+                    regressions.append(
+                        f"{name}: new query {label}: {query['sql']}"
+                    )
+                    continue
+                scans = set(previous.pop(label)["scans"])
+                for table in sorted(set(query["scans"]) - scans):
+                    regressions.append(
+                        f"{name}: sequential scan of '{table}' in "
+                        f"{query['sql']}"
+                    )
+            for label, query in previous.items():
+                regressions.append(
+                    f"{name}: query {label} is no longer executed: "
+                    f"{query['sql']}"
+                )
+        return regressions
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self.tables = set(connection.introspection.table_names())
+        if connection.vendor not in PLANNERS:
+            raise CommandError(f"Unsupported database: {connection.vendor}.")
+        snapshot_path = options["snapshot"] or os.path.join(
+            settings.QUERY_PLAN_SNAPSHOT_DIR, f"{connection.vendor}.json"
+        )
+        plans = {}
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            with transaction.atomic():
+                for name, *request in self.get_scenarios():
+                    plans[name] = self.explain(name, *request)
+                transaction.set_rollback(True)
+        if options["update"]:
+            os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+            with open(snapshot_path, "w", encoding="utf8") as file:
+                json.dump(plans, file, indent=2, sort_keys=True)
+            self.stdout.write(f"Snapshot saved to {snapshot_path}.")
+        if options["check"]:
+            if not os.path.exists(snapshot_path):
+                raise CommandError(
+                    f"No snapshot {snapshot_path}, run with --update."
+                )
+            with open(snapshot_path, encoding="utf8") as file:
+                regressions = self.find_regressions(plans, json.load(file))
+            if regressions:
+                raise CommandError(
+                    "\n".join(regressions)
+                    + "\nCheck the plans, then update the snapshot with"
+                    " QUERY_PLANS_UPDATE=1 python manage.py test"
+                    " api.tests.test_query_plans."
+                )
+            self.stdout.write("No plan regressions.")
@@ -0,0 +1,228 @@
+"""Custom middleware."""
+
+import hashlib
+import logging
+import random
+import re
+import traceback
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from api import db_router
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDERS = re.compile(r"%s(?:, %s)+")
+SQL_LOG_LENGTH = 500
+PRIMARY_PIN_COOKIE = "db_primary"
+PRIMARY_PIN_KEY = "db_primary:{}"
+
+
+def get_query_shape(sql):
+    """Return the SQL with lists of placeholders collapsed into one."""
+    return PLACEHOLDERS.sub("%s, ...", sql)
+
+
+def get_origin():
+    """Return the innermost frame of the project code as 'file:line name'.
+
+    Frames below the database layer, e.g. of other query wrappers, are
+    skipped.
+    """
+    below_database = True
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if (
+            not frame.filename.startswith(settings.BASE_DIR)
+            or "site-packages" in frame.filename
+        ):
+            below_database = False
+        elif not below_database:
+            return f"{frame.filename}:{frame.lineno} {frame.name}"
+    return "unknown"
+
+
+class RequestProfile:
+    """Queries of a request with their total time by query shape."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.shapes = {}
+        self.origins = {}
+        self.query_count = 0
+        self.db_time = 0
+        self.render_started = None
+        self.render_time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - started
+            self.query_count += 1
+            self.db_time += duration
+            shape = get_query_shape(sql)
+            statistics = self.shapes.setdefault(shape, [0, 0])
+            statistics[0] += 1
+            statistics[1] += duration
+            if statistics[0] == settings.PERFORMANCE_REPEATED_QUERIES:
+                self.origins[shape] = get_origin()
+
+    def start_render(self):
+        self.render_started = perf_counter()
+
+    def finish_render(self, response):
+        self.render_time = perf_counter() - self.render_started
+
+    def get_top_queries(self, count):
+        """Return (shape, count, time) of the slowest query shapes."""
+        return sorted(
+            (
+                (shape, executions, duration)
+                for shape, (executions, duration) in self.shapes.items()
+            ),
+            key=lambda query: query[2],
+            reverse=True,
+        )[:count]
+
+    def get_repeated_queries(self):
+        """Return (shape, count, origin) of queries repeated too often."""
+        return [
+            (shape, self.shapes[shape][0], origin)
+            for shape, origin in self.origins.items()
+        ]
+
+
+class PerformanceMiddleware:
+    """Measure the database and rendering time of sampled requests.
+
+    The 'Server-Timing' header of a sampled response gets the time of
+    the queries, of the response rendering (serialization) and the total
+    time. Slow requests are logged with their slowest queries, repeated
+    query shapes (N+1 patterns) are logged with the view and the code
+    executing them. Requests which are not sampled are passed through.
+    Queries of streaming responses executed after the view returns are
+    not measured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+        profile = request.performance_profile = RequestProfile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        total_time = perf_counter() - profile.started
+        response["Server-Timing"] = (
+            f'db;dur={profile.db_time * 1000:.1f};desc="'
+            f'{profile.query_count} queries", '
+            f"serialize;dur={profile.render_time * 1000:.1f}, "
+            f"total;dur={total_time * 1000:.1f}"
+        )
+        self.log(request, response, profile, total_time)
+        return response
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, "performance_profile", None)
+        if profile is not None:
+            profile.start_render()
+            response.add_post_render_callback(profile.finish_render)
+        return response
+
+    @staticmethod
+    def get_view_name(request):
+        match = request.resolver_match
+        if match is None:
+            return "-"
+        return match.view_name or match._func_path
+
+    def log(self, request, response, profile, total_time):
+        view = self.get_view_name(request)
+        for shape, count, origin in profile.get_repeated_queries():
+            logger.warning(
+                "Query repeated %s times in %s %s (view %s) at %s: %s",
+                count,
+                request.method,
+                request.path,
+                view,
+                origin,
+                shape[:SQL_LOG_LENGTH],
+            )
+        if total_time * 1000 < settings.PERFORMANCE_SLOW_REQUEST_MS:
+            return
+        logger.warning(
+            "Slow request %s %s (view %s): status %s, %.1f ms, "
+            "%s queries in %.1f ms. Slowest queries:\n%s",
+            request.method,
+            request.path,
+            view,
+            response.status_code,
+            total_time * 1000,
+            profile.query_count,
+            profile.db_time * 1000,
+            "\n".join(
+                f"{duration * 1000:.1f} ms, {count}x: "
+                f"{shape[:SQL_LOG_LENGTH]}"
+                for shape, count, duration in profile.get_top_queries(
+                    settings.PERFORMANCE_TOP_QUERIES
+                )
+            ),
+        )
+
+
+class ReplicaRoutingMiddleware:
+    """Read from a replica database on requests with safe methods.
+
+    After a request with an unsafe method the caller is pinned to the
+    primary database for DB_PRIMARY_PIN_SECONDS, so that the replication
+    lag does not hide the changes from the caller. The caller is known
+    by the Authorization header and, for anonymous clients, by a cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def get_pin_key(request):
+        authorization = request.META.get("HTTP_AUTHORIZATION")
+        if not authorization:
+            return None
+        return PRIMARY_PIN_KEY.format(
+            hashlib.sha256(authorization.encode()).hexdigest()
+        )
+
+    def is_pinned(self, request):
+        if PRIMARY_PIN_COOKIE in request.COOKIES:
+            return True
+        key = self.get_pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def pin(self, request, response):
+        timeout = settings.DB_PRIMARY_PIN_SECONDS
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE, "1", max_age=timeout, httponly=True
+        )
+        key = self.get_pin_key(request)
+        if key is not None:
+            cache.set(key, True, timeout)
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        if safe and not self.is_pinned(request):
+            alias = db_router.choose_replica()
+        else:
+            alias = DEFAULT_DB_ALIAS
+        with db_router.reading_from(alias):
+            response = self.get_response(request)
+        if not safe:
+            self.pin(request, response)
+        return response
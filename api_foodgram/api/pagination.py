@@ -1,7 +1,21 @@
 """Custom pagination."""
 
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from collections import OrderedDict
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.feed import get_feed
 
 
 class PageNumberLimitPagination(PageNumberPagination):
@@ -21,3 +35,108 @@ class LimitPagination(PageNumberPagination):
 
     def get_paginated_response(self, data):
         return data
+
+
+class CursorLimitPagination(CursorPagination):
+    """Custom pagination: opaque cursor, item limit.
+
+    The ordering is taken from the 'cursor_ordering' attribute of the view.
+    """
+
+    page_size_query_param = "limit"
+    page_size = settings.PAGE_SIZE
+    max_page_size = settings.MAX_PAGE_SIZE
+    ordering = ("-pub_date", "id")
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "cursor_ordering", self.ordering)
+
+
+class PageNumberOrCursorPagination(BasePagination):
+    """Custom pagination: page number or cursor on request.
+
+    Cursor pagination is used with the 'pagination=cursor' query parameter
+    and for the requests with a cursor.
+    """
+
+    mode_query_param = "pagination"
+    page_number_pagination_class = PageNumberLimitPagination
+    cursor_pagination_class = CursorLimitPagination
+
+    def __init__(self):
+        self.paginator = None
+
+    def get_paginator(self, request):
+        cursor_class = self.cursor_pagination_class
+        if (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or cursor_class.cursor_query_param in request.query_params
+        ):
+            return cursor_class()
+        return self.page_number_pagination_class()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class FeedPagination(PageNumberLimitPagination):
+    """Custom pagination of the recipe feed: opaque cursor, item limit.
+
+    The cursor holds the publication date and the ID of the last recipe
+    of the page. The 'queryset' is the user, the page is the recipe IDs.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        self.request = None
+        self.next_position = None
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            pub_date, recipe_id = (
+                urlsafe_b64decode(encoded.encode()).decode().split("|")
+            )
+            position = parse_datetime(pub_date), int(recipe_id)
+        except (DecodeError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def encode_cursor(position):
+        pub_date, recipe_id = position
+        return urlsafe_b64encode(
+            f"{pub_date.isoformat()}|{recipe_id}".encode()
+        ).decode()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_page_size(request)
+        positions = get_feed(queryset, limit + 1, self.decode_cursor(request))
+        if len(positions) > limit:
+            self.next_position = positions[limit - 1]
+        return [recipe_id for _, recipe_id in positions[:limit]]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict((("next", self.get_next_link()), ("results", data)))
+        )
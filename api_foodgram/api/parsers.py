@@ -0,0 +1,20 @@
+"""Custom parsers."""
+
+from rest_framework.parsers import FileUploadParser
+
+
+class RawImageUploadParser(FileUploadParser):
+    """Request body with an image as the uploaded file.
+
+    The body is streamed through the upload handlers like a file of a
+    multipart form. The file name from Content-Disposition is optional.
+    """
+
+    media_type = "image/*"
+    default_filename = "image"
+
+    def get_filename(self, stream, media_type, parser_context):
+        return (
+            super().get_filename(stream, media_type, parser_context)
+            or self.default_filename
+        )
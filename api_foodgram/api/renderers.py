@@ -0,0 +1,134 @@
+"""Custom renderers."""
+
+import csv
+import json
+import os.path
+from abc import ABCMeta, abstractmethod
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_LIST_FIELDS = ("name", "measurement_unit", "amount")
+
+
+class Echo:
+    """File-like object returning the written value."""
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer, metaclass=ABCMeta):
+    """Base renderer of the shopping list export.
+
+    The shopping list rows are streamed by the 'stream' method. The
+    'render' method is used for error responses only.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode()
+
+    @abstractmethod
+    def stream(self, rows):
+        """Yield chunks of the file from (name, unit, amount) rows."""
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Shopping list export: plain text."""
+
+    media_type = "text/plain"
+    format = "txt"
+
+    def stream(self, rows):
+        for row in rows:
+            yield " ".join(str(element) for element in row) + "\n"
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Shopping list export: CSV."""
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(SHOPPING_LIST_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Shopping list export: JSON."""
+
+    media_type = "application/json"
+    format = "json"
+
+    def stream(self, rows):
+        separator = "["
+        for row in rows:
+            yield separator + json.dumps(
+                dict(zip(SHOPPING_LIST_FIELDS, row)), ensure_ascii=False
+            )
+            separator = ","
+        yield "[]" if separator == "[" else "]"
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """Shopping list export: PDF."""
+
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+    font_name = "ShoppingList"
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        if not os.path.exists(settings.SHOPPING_LIST_PDF_FONT):
+            return "Helvetica"
+        pdfmetrics.registerFont(
+            TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT)
+        )
+        return self.font_name
+
+    def build(self, rows):
+        """Return the PDF document of the shopping list."""
+        buffer = BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        top = A4[1] - self.margin
+        position = top
+        for row in rows:
+            if position < self.margin:
+                document.showPage()
+                position = top
+            document.setFont(font, self.font_size)
+            document.drawString(
+                self.margin,
+                position,
+                " ".join(str(element) for element in row),
+            )
+            position -= self.font_size * 1.5
+        document.save()
+        return buffer.getvalue()
+
+    def stream(self, rows):
+        yield self.build(rows)
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer,
+)
@@ -0,0 +1,21 @@
+"""Signal handlers of the 'api' application."""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_user_tokens
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    """Drop the cached tokens of the user on logout or token deletion."""
+    invalidate_user_tokens((instance.user_id,))
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, created, **kwargs):
+    """Drop the cached tokens of the changed user."""
+    if not created:
+        invalidate_user_tokens((instance.pk,))
@@ -0,0 +1,75 @@
+"""Base test case of the 'api' application."""
+
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class APITestCase(TestCase):
+    """Test case with an empty cache and factories of the test objects.
+
+    Changes of the tests are rolled back, so the cached data versions
+    are never bumped after a commit: the cache is cleared instead.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def create_user(name):
+        return User.objects.create_user(
+            username=name,
+            email=f"{name}@example.com",
+            password="password",
+            first_name=name.title(),
+            last_name="Tester",
+        )
+
+    @staticmethod
+    def create_tag(name):
+        return Tag.objects.create(
+            name=name, color=f"#{Tag.objects.count():06X}", slug=name
+        )
+
+    @staticmethod
+    def create_ingredient(name):
+        return Ingredient.objects.create(name=name, measurement_unit="g")
+
+    @staticmethod
+    def create_recipe(author, name, tags=(), ingredients=()):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=name,
+            text=f"{name} text",
+            cooking_time=10,
+            image="recipes/images/test.png",
+        )
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    @staticmethod
+    def get_client(user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
@@ -0,0 +1,55 @@
+"""Tests of the cached token authentication."""
+
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import (
+    TOKEN_CACHE_KEY,
+    USER_TOKENS_VERSION,
+    CachedTokenAuthentication,
+)
+from api.tests.base import APITestCase
+from recipes.cache import bump_data_version
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("reader")
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.token.key)
+
+    def test_queries(self):
+        for queries in (1, 1, 0, 0):
+            with self.assertNumQueries(queries):
+                user, token = self.authenticate()
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(token.key, self.token.key)
+
+    def test_password_is_not_cached(self):
+        self.authenticate()
+        self.authenticate()
+        entry = cache.get(TOKEN_CACHE_KEY.format(self.token.key))
+        self.assertNotIn(self.user.password, entry[3])
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user.email, self.user.email)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password("password"))
+
+    def test_bumped_version_is_not_served(self):
+        self.authenticate()
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        bump_data_version(USER_TOKENS_VERSION.format(self.user.pk))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_unknown_token(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials("unknown")
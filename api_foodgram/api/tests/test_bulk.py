@@ -0,0 +1,148 @@
+"""Tests of the bulk endpoints of the user relations."""
+
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import ScopedRateThrottle
+
+from api.tests.base import APITestCase
+from recipes import shopping_list
+from recipes.counters import COUNTERS, find_counter_drift
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+
+class BulkRelationsTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("reader")
+        self.authors = [
+            self.create_user(f"author{number}") for number in (1, 2)
+        ]
+        ingredients = [
+            self.create_ingredient(name) for name in ("flour", "milk")
+        ]
+        self.recipes = [
+            self.create_recipe(
+                self.authors[0], f"recipe{number}", (), ingredients
+            )
+            for number in range(3)
+        ]
+        self.client = self.get_client(self.user)
+        self.routes = (
+            (
+                "/api/recipes/favorite/",
+                Favorite,
+                "recipe_id",
+                [recipe.id for recipe in self.recipes],
+            ),
+            (
+                "/api/recipes/shopping_cart/",
+                ShoppingCart,
+                "recipe_id",
+                [recipe.id for recipe in self.recipes],
+            ),
+            (
+                "/api/users/subscribe/",
+                Subscription,
+                "author_id",
+                [author.id for author in self.authors],
+            ),
+        )
+
+    def request(self, method, url, ids):
+        return getattr(self.client, method)(url, {"ids": ids}, format="json")
+
+    def assertNoDrift(self):
+        for counter in COUNTERS:
+            self.assertEqual(find_counter_drift(*counter), [], counter)
+        self.assertEqual(shopping_list.find_drift(), {})
+
+    def assertStatuses(self, response, statuses):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["results"],
+            [{"id": pk, "status": status} for pk, status in statuses],
+        )
+
+    def test_create(self):
+        for url, model, field, (first, *others) in self.routes:
+            with self.subTest(url=url):
+                model.objects.create(user=self.user, **{field: first})
+                response = self.request("post", url, [first, *others, 9999])
+                self.assertStatuses(
+                    response,
+                    [(first, "exists")]
+                    + [(pk, "created") for pk in others]
+                    + [(9999, "invalid")],
+                )
+                self.assertEqual(
+                    set(
+                        model.objects.filter(user=self.user).values_list(
+                            field, flat=True
+                        )
+                    ),
+                    {first, *others},
+                )
+                self.assertNoDrift()
+
+    def test_self_subscription_is_invalid(self):
+        response = self.request(
+            "post", "/api/users/subscribe/", [self.user.id]
+        )
+        self.assertStatuses(response, [(self.user.id, "invalid")])
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_delete(self):
+        for url, model, field, (first, *others) in self.routes:
+            with self.subTest(url=url):
+                self.request("post", url, others)
+                response = self.request("delete", url, [first, *others])
+                self.assertStatuses(
+                    response,
+                    [(first, "absent")] + [(pk, "deleted") for pk in others],
+                )
+                self.assertFalse(model.objects.filter(user=self.user).exists())
+                self.assertNoDrift()
+
+    def test_repeated_changes_do_not_drift(self):
+        for url, _, _, ids in self.routes:
+            with self.subTest(url=url):
+                for method in ("post", "post", "delete", "post"):
+                    self.request(method, url, ids)
+                self.assertNoDrift()
+
+    def test_size_limit(self):
+        ids = list(range(1, settings.MAX_BULK_SIZE + 2))
+        for url, _, _, _ in self.routes:
+            for method in ("post", "delete"):
+                with self.subTest(url=url, method=method):
+                    response = self.request(method, url, ids)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn("ids", response.data)
+                    response = self.request(method, url, ids[:-1])
+                    self.assertEqual(response.status_code, 200)
+
+    def test_empty_ids(self):
+        response = self.request("post", "/api/recipes/favorite/", [])
+        self.assertEqual(response.status_code, 400)
+
+    def test_anonymous(self):
+        response = self.get_client().post(
+            "/api/recipes/favorite/", {"ids": [1]}, format="json"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_throttle_scope(self):
+        with mock.patch.object(
+            ScopedRateThrottle, "THROTTLE_RATES", {"bulk": "2/minute"}
+        ):
+            for url, _, _, ids in self.routes:
+                with self.subTest(url=url):
+                    statuses = [
+                        self.request(method, url, ids).status_code
+                        for method in ("post", "delete", "post")
+                    ]
+                    self.assertEqual(statuses, [200, 200, 429])
+                    cache.clear()
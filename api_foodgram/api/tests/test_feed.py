@@ -0,0 +1,54 @@
+"""Tests of recipes/feed/ endpoint."""
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import APITestCase
+from users.models import Subscription, User
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTest(APITestCase):
+    """Feed of a user following fanned out and pulled authors."""
+
+    url = "/api/recipes/feed/"
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("reader")
+        self.other = self.create_user("other")
+        self.client = self.get_client(self.user)
+        self.recipe_ids = []
+        self.follow_authors(0, 2)
+
+    def follow_authors(self, first, last, pulled=True):
+        for number in range(first, last):
+            author = self.create_user(f"author{number}")
+            Subscription.objects.create(user=self.user, author=author)
+            if pulled:
+                Subscription.objects.create(user=self.other, author=author)
+            for recipe_number in range(2):
+                recipe = self.create_recipe(
+                    author, f"recipe{number}-{recipe_number}"
+                )
+                self.recipe_ids.append(recipe.id)
+
+    def get_feed_ids(self):
+        response = self.client.get(self.url, {"limit": 100})
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    def test_feed_merges_entries_and_pulled_authors(self):
+        self.follow_authors(2, 3, pulled=False)
+        self.assertEqual(User.objects.filter(feed_pulled=True).count(), 2)
+        self.assertEqual(self.get_feed_ids(), self.recipe_ids[::-1])
+
+    def test_queries_do_not_grow_with_pulled_authors(self):
+        for _ in range(2):
+            self.get_feed_ids()
+        with CaptureQueriesContext(connection) as two_authors:
+            self.get_feed_ids()
+        self.follow_authors(2, 6)
+        with self.assertNumQueries(len(two_authors)):
+            self.assertEqual(self.get_feed_ids(), self.recipe_ids[::-1])
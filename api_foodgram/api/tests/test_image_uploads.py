@@ -0,0 +1,89 @@
+"""Tests of the recipe image uploads."""
+
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils import timezone
+from PIL import Image
+
+from api.tests.base import APITestCase
+from recipes.images import build_current_image_derivatives
+from recipes.models import ImageUpload, Recipe, RecipeImage
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new("RGB", (40, 30), (200, 120, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class ImageUploadTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.create_user("author"))
+        self.recipe_data = {
+            "tags": [self.create_tag("breakfast").id],
+            "ingredients": [
+                {"id": self.create_ingredient("flour").id, "amount": 5}
+            ],
+            "name": "Pancakes",
+            "text": "Pancakes text",
+            "cooking_time": 10,
+        }
+
+    def upload(self):
+        new_file = TemporaryFileUploadHandler.new_file
+        with mock.patch.object(
+            TemporaryFileUploadHandler,
+            "new_file",
+            autospec=True,
+            side_effect=new_file,
+        ) as spooled:
+            response = self.client.post(
+                "/api/recipes/images/",
+                get_image(),
+                content_type="image/jpeg",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(spooled.called)
+        return response.data["image_token"]
+
+    def create_recipe(self, image_token):
+        return self.client.post(
+            "/api/recipes/",
+            {**self.recipe_data, "image_token": image_token},
+            format="json",
+        )
+
+    def test_recipe_uses_uploaded_image(self):
+        response = self.create_recipe(self.upload())
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_derivatives_are_built_after_the_request(self):
+        response = self.create_recipe(self.upload())
+        self.assertEqual(response.data["image_srcset"], {})
+        self.assertFalse(RecipeImage.objects.exists())
+        recipe = Recipe.objects.get()
+        build_current_image_derivatives(recipe.id, "recipes/images/old.jpg")
+        self.assertFalse(RecipeImage.objects.exists())
+        build_current_image_derivatives(recipe.id, recipe.image.name)
+        self.assertEqual(
+            sorted(RecipeImage.objects.values_list("format", "width")),
+            [("jpeg", 40), ("webp", 40)],
+        )
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.image_width, recipe.image_height), (40, 30))
+
+    def test_expired_upload_is_rejected(self):
+        image_token = self.upload()
+        ImageUpload.objects.update(
+            created=timezone.now()
+            - timedelta(seconds=settings.RECIPE_IMAGE_UPLOAD_LIFETIME + 1)
+        )
+        response = self.create_recipe(image_token)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("image_token", response.data)
@@ -0,0 +1,132 @@
+"""Tests of the pantry index and the recipes/pantry/ endpoint."""
+
+from unittest import mock
+
+from django.db import transaction
+
+from api.tests.base import APITestCase
+from recipes.cache import bump_data_version, get_data_version
+from recipes.pantry import PANTRY_INDEX_VERSION, PantryIndex
+
+
+class PantryTest(APITestCase):
+    url = "/api/recipes/pantry/"
+
+    def setUp(self):
+        super().setUp()
+        author = self.create_user("author")
+        self.breakfast, self.dinner = (
+            self.create_tag(name) for name in ("breakfast", "dinner")
+        )
+        self.flour, self.milk, self.egg, self.salt = (
+            self.create_ingredient(name)
+            for name in ("flour", "milk", "egg", "salt")
+        )
+        self.pancakes = self.create_recipe(
+            author, "Pancakes", (self.breakfast,), (self.flour, self.milk)
+        )
+        self.omelette = self.create_recipe(
+            author, "Omelette", (self.breakfast,), (self.egg, self.milk)
+        )
+        self.bread = self.create_recipe(
+            author, "Bread", (self.dinner,), (self.flour, self.egg, self.salt)
+        )
+        self.crepes = self.create_recipe(
+            author, "Crepes", (self.dinner,), (self.flour, self.milk)
+        )
+        self.bread.cooking_time = 60
+        self.bread.save()
+        self.index = PantryIndex()
+        patcher = mock.patch("api.v1.views.pantry_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # The changes are published at once, a test has no commit.
+        patcher = mock.patch.object(
+            transaction, "on_commit", side_effect=lambda func: func()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_matches(self, ingredients, **params):
+        response = self.get_client().get(
+            self.url,
+            {
+                "ingredients": [ingredient.id for ingredient in ingredients],
+                **params,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            (recipe["id"], recipe["missing_ingredients_count"])
+            for recipe in response.data["results"]
+        ]
+
+    def match(self, ingredients, **params):
+        return self.index.match(
+            [ingredient.id for ingredient in ingredients], **params
+        ).tolist()
+
+    def test_ranking(self):
+        # Cookable recipes first, then by the missing count, the newest
+        # first among equals.
+        self.assertEqual(
+            self.get_matches((self.flour, self.milk)),
+            [
+                (self.crepes.id, 0),
+                (self.pancakes.id, 0),
+                (self.omelette.id, 1),
+                (self.bread.id, 2),
+            ],
+        )
+
+    def test_filters(self):
+        pantry = [self.flour, self.milk]
+        self.assertEqual(
+            self.get_matches(pantry, tags="dinner", max_missing=1),
+            [(self.crepes.id, 0)],
+        )
+        self.assertEqual(
+            self.match(pantry, tag_ids=[self.dinner.id]),
+            [[self.crepes.id, 0], [self.bread.id, 2]],
+        )
+        self.assertEqual(
+            self.match(pantry, max_cooking_time=30),
+            [
+                [self.crepes.id, 0],
+                [self.pancakes.id, 0],
+                [self.omelette.id, 1],
+            ],
+        )
+        self.assertEqual(
+            self.match(pantry, max_missing=0),
+            [[self.crepes.id, 0], [self.pancakes.id, 0]],
+        )
+
+    def test_changes_are_applied_incrementally(self):
+        self.index.get_state()
+        with mock.patch.object(
+            self.index, "build", wraps=self.index.build
+        ) as build:
+            self.crepes.delete()
+            waffles = self.create_recipe(
+                self.crepes.author, "Waffles", (), (self.flour,)
+            )
+            self.pancakes.cooking_time = 90
+            self.pancakes.save()
+            self.assertEqual(
+                self.match([self.flour], max_cooking_time=30),
+                [[waffles.id, 0]],
+            )
+        build.assert_not_called()
+
+    def test_rebuild_runs_in_background(self):
+        old_state = self.index.get_state()
+        bump_data_version(PANTRY_INDEX_VERSION)
+        with mock.patch("recipes.pantry.Thread") as thread:
+            self.assertIs(self.index.get_state(), old_state)
+            self.assertIs(self.index.get_state(), old_state)
+        thread.assert_called_once()
+        self.index.rebuild(get_data_version(PANTRY_INDEX_VERSION))
+        state = self.index.get_state()
+        self.assertIsNot(state, old_state)
+        self.assertEqual(state.version, get_data_version(PANTRY_INDEX_VERSION))
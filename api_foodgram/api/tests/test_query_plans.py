@@ -0,0 +1,55 @@
+"""Tests of the query plans of the API endpoints."""
+
+import os
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+
+from api.tests.base import APITestCase
+from recipes.models import Favorite, ShoppingCart
+
+SNAPSHOT_PATH = os.path.join(
+    settings.QUERY_PLAN_SNAPSHOT_DIR, f"{connection.vendor}.json"
+)
+
+
+@skipUnless(
+    os.path.exists(SNAPSHOT_PATH),
+    f"No query plan snapshot of {connection.vendor}.",
+)
+class QueryPlansTest(APITestCase):
+    """Fail on new queries and scans which the snapshot plans lack.
+
+    The snapshot is taken from the data of this test, so the scenarios
+    run the same queries. The plans of SQLite do not depend on the
+    number of rows.
+    """
+
+    def setUp(self):
+        super().setUp()
+        reader = self.create_user("reader")
+        tags = [self.create_tag(name) for name in ("breakfast", "dinner")]
+        ingredients = [
+            self.create_ingredient(name) for name in ("flour", "milk", "egg")
+        ]
+        for number in range(3):
+            author = self.create_user(f"author{number}")
+            for recipe_number in range(3):
+                recipe = self.create_recipe(
+                    author,
+                    f"Pancakes {number}-{recipe_number}",
+                    tags,
+                    ingredients,
+                )
+        Favorite.objects.create(user=reader, recipe=recipe)
+        ShoppingCart.objects.create(user=reader, recipe=recipe)
+
+    def test_no_plan_regressions(self):
+        # QUERY_PLANS_UPDATE=1 saves the plans of this data as the snapshot.
+        options = ["--update"] if os.getenv("QUERY_PLANS_UPDATE") else []
+        output = StringIO()
+        call_command("explain_queries", "--check", *options, stdout=output)
+        self.assertIn("No plan regressions.", output.getvalue())
@@ -0,0 +1,92 @@
+"""Tests of the serializers of 'Recipes' resource."""
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.tests.base import APITestCase
+from api.v1.serializers import GetRecipeSerializer, RecipeRowSerializer
+from recipes.models import Favorite, Recipe, RecipeImage, ShoppingCart
+from users.models import Subscription
+
+
+class RecipeRowSerializerTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("reader")
+        authors = [self.create_user("author1"), self.create_user("author2")]
+        tags = [self.create_tag("breakfast"), self.create_tag("dinner")]
+        ingredients = [
+            self.create_ingredient(name) for name in ("salt", "egg", "milk")
+        ]
+        recipes = [
+            self.create_recipe(authors[0], "omelette", tags, ingredients),
+            self.create_recipe(authors[0], "toast", tags[:1]),
+            self.create_recipe(authors[1], "porridge", (), ingredients[2:]),
+        ]
+        for width in (320, 640):
+            RecipeImage.objects.create(
+                recipe=recipes[0],
+                format="webp",
+                width=width,
+                height=width // 2,
+                file=f"recipes/derivatives/omelette-{width}.webp",
+            )
+        Favorite.objects.create(user=self.user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=recipes[2])
+        Subscription.objects.create(user=self.user, author=authors[1])
+
+    @staticmethod
+    def get_request(user=None):
+        request = Request(APIRequestFactory().get("/api/recipes/"))
+        if user is not None:
+            request.user = user
+        return request
+
+    @staticmethod
+    def render(serializer_class, queryset, request):
+        return JSONRenderer().render(
+            serializer_class(
+                queryset, many=True, context={"request": request}
+            ).data
+        )
+
+    def assert_same_output(self, request):
+        expected = self.render(
+            GetRecipeSerializer,
+            Recipe.objects.select_related("author").prefetch_related(
+                "tags", "recipe_ingredient__ingredient", "image_derivatives"
+            ),
+            request,
+        )
+        self.assertEqual(
+            self.render(
+                RecipeRowSerializer,
+                RecipeRowSerializer.get_rows(Recipe.objects.all()),
+                request,
+            ),
+            expected,
+        )
+
+    def test_same_output_for_anonymous_user(self):
+        self.assert_same_output(self.get_request())
+
+    def test_same_output_for_user(self):
+        self.assert_same_output(self.get_request(self.user))
+
+    def test_same_output_for_single_recipe(self):
+        recipe = Recipe.objects.get(name="omelette")
+        request = self.get_request(self.user)
+        self.assertEqual(
+            JSONRenderer().render(
+                RecipeRowSerializer(
+                    RecipeRowSerializer.get_rows(
+                        Recipe.objects.filter(pk=recipe.pk)
+                    ).get(),
+                    context={"request": request},
+                ).data
+            ),
+            JSONRenderer().render(
+                GetRecipeSerializer(recipe, context={"request": request}).data
+            ),
+        )
@@ -0,0 +1,88 @@
+"""Tests of PATCH of the recipes/{id}/ endpoint."""
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connection
+
+from api.tests.base import APITestCase
+from api.v1.serializers import PostPatchRecipeSerializer
+from recipes.models import Recipe
+
+WRITES = ("INSERT", "UPDATE", "DELETE")
+# The search data of a recipe is refreshed by one UPDATE on PostgreSQL,
+# by a DELETE and an INSERT of the full-text table on SQLite.
+SEARCH_INDEX_QUERIES = {"postgresql": 1, "sqlite": 2}
+
+
+class RecipeUpdateTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        author = self.create_user("author")
+        self.tags = [self.create_tag(name) for name in ("breakfast", "lunch")]
+        self.ingredients = [
+            self.create_ingredient(name) for name in ("flour", "milk")
+        ]
+        self.recipe = self.create_recipe(
+            author, "Pancakes", self.tags, self.ingredients
+        )
+        self.client = self.get_client(author)
+        self.url = f"/api/recipes/{self.recipe.id}/"
+        # The token is cached by the first two requests, the owner of the
+        # token by the first one and its data by the second one.
+        for _ in range(2):
+            self.client.get(self.url)
+
+    def patch(self, data, query_count):
+        with self.assertNumQueries(query_count) as context:
+            response = self.client.patch(self.url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        return [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith(WRITES)
+        ]
+
+    def test_unchanged_recipe_is_not_written(self):
+        writes = self.patch(
+            {
+                "name": "Pancakes",
+                "text": "Pancakes text",
+                "cooking_time": 10,
+                "tags": [tag.id for tag in self.tags],
+                "ingredients": [
+                    {"id": ingredient.id, "amount": 5}
+                    for ingredient in self.ingredients
+                ],
+            },
+            17,
+        )
+        self.assertEqual(writes, [])
+
+    def test_only_changed_field_is_written(self):
+        search_index_queries = SEARCH_INDEX_QUERIES[connection.vendor]
+        writes = self.patch({"name": "Crepes"}, 12 + search_index_queries)
+        self.assertEqual(len(writes), 1 + search_index_queries)
+        self.assertTrue(writes[0].startswith('UPDATE "recipes_recipe"'))
+        self.assertNotIn('"text"', writes[0])
+        self.assertEqual(Recipe.objects.get().name, "Crepes")
+        self.assertEqual(self.recipe.ingredients.count(), 2)
+
+
+class StoredFileTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * (File.DEFAULT_CHUNK_SIZE // 100)
+        self.recipe = self.create_recipe(self.create_user("author"), "Tea")
+        self.recipe.image.save("tea.png", ContentFile(self.content))
+
+    def is_stored_file(self, content):
+        return PostPatchRecipeSerializer.is_stored_file(
+            self.recipe.image, ContentFile(content)
+        )
+
+    def test_same_content(self):
+        self.assertTrue(self.is_stored_file(self.content))
+
+    def test_other_content(self):
+        self.assertFalse(self.is_stored_file(self.content[:-1] + b"x"))
+        self.assertFalse(self.is_stored_file(self.content[:-1]))
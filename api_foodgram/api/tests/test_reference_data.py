@@ -0,0 +1,28 @@
+"""Tests of the cached tags and ingredients lists."""
+
+from django.core.cache import cache
+
+from api.tests.base import APITestCase
+from recipes.cache import TAGS_VERSION, bump_data_version, get_data_version
+
+
+class ReferenceDataCacheTest(APITestCase):
+    url = "/api/tags/"
+
+    def get_tags(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_previous_version_is_deleted(self):
+        self.create_tag("breakfast")
+        self.get_tags()
+        old_key = (
+            f"reference_data:{TAGS_VERSION}:{get_data_version(TAGS_VERSION)}"
+        )
+        self.assertIsNotNone(cache.get(old_key))
+        self.create_tag("dinner")
+        # The version is bumped after the commit, which a test lacks.
+        bump_data_version(TAGS_VERSION)
+        self.assertEqual(len(self.get_tags().json()), 2)
+        self.assertIsNone(cache.get(old_key))
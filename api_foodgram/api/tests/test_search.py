@@ -0,0 +1,39 @@
+"""Tests of the full-text search index of recipes."""
+
+from unittest import skipUnless
+
+from django.db import connection
+
+from api.tests.base import APITestCase
+from recipes.models import Recipe
+from recipes.search import (
+    RECIPE_SEARCH_TABLE,
+    search_recipes,
+    update_recipe_search_index,
+)
+
+
+class RecipeSearchIndexTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ingredient = self.create_ingredient("flour")
+        self.recipe = self.create_recipe(
+            self.create_user("author"), "Pancakes", (), (self.ingredient,)
+        )
+        update_recipe_search_index()
+
+    def search(self, query):
+        return list(search_recipes(Recipe.objects.all(), query))
+
+    def test_renamed_ingredient_is_reindexed(self):
+        self.ingredient.name = "buckwheat"
+        self.ingredient.save()
+        self.assertEqual(self.search("buckwheat"), [self.recipe])
+        self.assertEqual(self.search("flour"), [])
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite index table only.")
+    def test_deleted_recipe_is_removed(self):
+        self.recipe.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {RECIPE_SEARCH_TABLE}")
+            self.assertEqual(cursor.fetchone(), (0,))
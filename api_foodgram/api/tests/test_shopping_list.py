@@ -0,0 +1,37 @@
+"""Tests of the shopping list download."""
+
+from unittest import mock
+
+from api.renderers import ShoppingListPDFRenderer
+from api.tests.base import APITestCase
+from recipes.cache import INGREDIENTS_VERSION, bump_data_version
+from recipes.models import ShoppingCart
+
+
+class ShoppingListPDFTest(APITestCase):
+    url = "/api/recipes/download_shopping_cart/?format=pdf"
+
+    def setUp(self):
+        super().setUp()
+        user = self.create_user("reader")
+        self.ingredient = self.create_ingredient("flour")
+        recipe = self.create_recipe(
+            self.create_user("author"), "Pancakes", (), (self.ingredient,)
+        )
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        self.client = self.get_client(user)
+
+    def test_document_is_rebuilt_when_ingredients_change(self):
+        with mock.patch.object(
+            ShoppingListPDFRenderer, "build", return_value=b"%PDF"
+        ) as build:
+            for _ in range(2):
+                self.assertEqual(self.client.get(self.url).content, b"%PDF")
+            self.assertEqual(build.call_count, 1)
+            self.ingredient.name = "buckwheat"
+            self.ingredient.save()
+            # The version is bumped after the commit, which a test lacks.
+            bump_data_version(INGREDIENTS_VERSION)
+            self.client.get(self.url)
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(build.call_args[0][0][0][0], "buckwheat")
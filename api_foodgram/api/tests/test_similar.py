@@ -0,0 +1,82 @@
+"""Tests of the similar recipes and the recipes/{id}/similar/ endpoint."""
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+
+from api.tests.base import APITestCase
+from recipes.models import SimilarRecipe
+from recipes.similarity import LAST_UPDATE_KEY, update_similar_recipes
+
+
+@override_settings(SIMILAR_RECIPES_MAX_DF=1, SIMILAR_RECIPES_TAG_WEIGHT=0)
+class SimilarRecipesTest(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user("author")
+        self.flour, self.milk, self.egg, self.salt = (
+            self.create_ingredient(name)
+            for name in ("flour", "milk", "egg", "salt")
+        )
+        self.pancakes = self.create_recipe(
+            self.author, "Pancakes", (), (self.flour, self.milk)
+        )
+        self.bread = self.create_recipe(
+            self.author, "Bread", (), (self.flour, self.egg)
+        )
+        self.soup = self.create_recipe(self.author, "Soup", (), (self.salt,))
+
+    def get_similar(self, recipe):
+        return list(
+            SimilarRecipe.objects.filter(recipe=recipe)
+            .order_by("-score", "similar_id")
+            .values_list("similar_id", flat=True)
+        )
+
+    def update(self):
+        """Run an incremental update since the previous one."""
+        started = timezone.now()
+        update_similar_recipes()
+        # The time is saved after the commit, which a test lacks.
+        cache.set(LAST_UPDATE_KEY, started)
+
+    def test_similar_action(self):
+        crepes = self.create_recipe(
+            self.author, "Crepes", (), (self.flour, self.milk)
+        )
+        update_similar_recipes(full=True)
+        client = self.get_client()
+        response = client.get(f"/api/recipes/{self.pancakes.id}/similar/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe["id"] for recipe in response.data],
+            [crepes.id, self.bread.id],
+        )
+        response = client.get(f"/api/recipes/{self.soup.id}/similar/")
+        self.assertEqual(response.data, [])
+        response = client.get("/api/recipes/9999/similar/")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SIMILAR_RECIPES_COUNT=1)
+    def test_new_closer_recipe_is_added(self):
+        self.update()
+        self.assertEqual(self.get_similar(self.pancakes), [self.bread.id])
+        crepes = self.create_recipe(
+            self.author, "Crepes", (), (self.flour, self.milk)
+        )
+        self.update()
+        self.assertEqual(self.get_similar(self.pancakes), [crepes.id])
+        self.assertEqual(self.get_similar(crepes), [self.pancakes.id])
+        self.assertEqual(self.get_similar(self.bread), [self.pancakes.id])
+
+    @override_settings(SIMILAR_RECIPES_COUNT=1)
+    def test_deleted_neighbour_is_replaced(self):
+        crepes = self.create_recipe(
+            self.author, "Crepes", (), (self.flour, self.milk)
+        )
+        self.update()
+        self.assertEqual(self.get_similar(self.pancakes), [crepes.id])
+        crepes.delete()
+        self.assertEqual(self.get_similar(self.pancakes), [])
+        self.update()
+        self.assertEqual(self.get_similar(self.pancakes), [self.bread.id])
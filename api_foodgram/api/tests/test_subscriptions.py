@@ -0,0 +1,40 @@
+"""Tests of users/subscriptions/ endpoint."""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import APITestCase
+from users.models import Subscription
+
+
+class SubscriptionsTest(APITestCase):
+    url = "/api/users/subscriptions/"
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("reader")
+        for number in range(6):
+            author = self.create_user(f"author{number}")
+            Subscription.objects.create(user=self.user, author=author)
+            for recipe_number in range(3):
+                self.create_recipe(author, f"recipe{number}-{recipe_number}")
+        self.client = self.get_client(self.user)
+
+    def get_page(self, limit):
+        response = self.client.get(
+            self.url, {"limit": limit, "recipes_limit": 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), limit)
+        return response
+
+    def test_queries_do_not_grow_with_page_size(self):
+        for _ in range(2):
+            self.get_page(2)
+        with CaptureQueriesContext(connection) as small_page:
+            self.get_page(2)
+        with self.assertNumQueries(len(small_page)):
+            response = self.get_page(6)
+        for author in response.data["results"]:
+            self.assertEqual(len(author["recipes"]), 2)
+            self.assertEqual(author["recipes_count"], 3)
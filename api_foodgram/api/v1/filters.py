@@ -1,45 +1,69 @@
 """Custom filters."""
 
-from django.db.models import Case, IntegerField, Value, When
 from django_filters import rest_framework
 from rest_framework import filters
 
 from recipes.models import Recipe, Tag
+from recipes.search import ingredient_index, search_recipes
 
 
 class RecipeFilter(rest_framework.FilterSet):
     """Filter for 'Recipes' resource."""
 
     is_in_shopping_cart = rest_framework.BooleanFilter(
-        label="In shopping cart"
+        method="filter_is_in_shopping_cart", label="In shopping cart"
+    )
+    is_favorited = rest_framework.BooleanFilter(
+        method="filter_is_favorited", label="In favorites"
     )
-    is_favorited = rest_framework.BooleanFilter(label="In favorites")
     author = rest_framework.NumberFilter()
     tags = rest_framework.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name="tags__slug",
         to_field_name="slug",
     )
+    search = rest_framework.CharFilter(method="filter_search", label="Search")
 
     class Meta:
         model: Recipe
-        fields = ("author", "is_favorited", "is_in_shopping_cart", "tags")
+        fields = (
+            "author",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "tags",
+            "search",
+        )
+
+    def filter_user_relation(self, queryset, relation, value):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        lookup = {f"{relation}__user": user}
+        if value:
+            return queryset.filter(**lookup)
+        return queryset.exclude(**lookup)
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_user_relation(queryset, "favorites", value)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_user_relation(queryset, "carts", value)
+
+    @staticmethod
+    def filter_search(queryset, name, value):
+        return search_recipes(queryset, value)
 
 
 class IngredientSearchFilter(filters.SearchFilter):
-    """Filter for 'Ingredients' resource."""
+    """Filter for 'Ingredients' resource.
+
+    Served from the in-memory ingredient index without database queries.
+    """
 
     search_param = "name"
 
     def filter_queryset(self, request, queryset, view):
         name = request.query_params.get(self.search_param)
-        if name is not None:
-            queryset = queryset.annotate(
-                ingredient_order=Case(
-                    When(name__istartswith=name, then=Value(1)),
-                    When(name__icontains=name, then=Value(2)),
-                    default=0,
-                    output_field=IntegerField(),
-                )
-            ).exclude(ingredient_order=0).order_by("ingredient_order", "name")
-        return queryset
+        if name is None or view.action != "list":
+            return queryset
+        return ingredient_index.search(name)
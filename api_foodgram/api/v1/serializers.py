@@ -1,20 +1,35 @@
 """Serializers of the 'api' application."""
 
+import os.path
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db import IntegrityError, transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
 from djoser.serializers import UserCreateSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from api.pagination import LimitPagination
+from recipes import shopping_list
+from recipes.images import read_image_header, schedule_image_derivatives
 from recipes.models import (
     Favorite,
+    ImageUpload,
     Ingredient,
     Recipe,
+    RecipeImage,
     RecipeIngredient,
     ShoppingCart,
     Tag,
 )
+from recipes.search import update_recipe_search_index
+from recipes.user_state import get_user_state
 from users.models import Subscription, User
 
 
@@ -33,6 +48,54 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
+class UserStateMixin:
+    """Access to the relations of the request user with recipes, authors."""
+
+    @property
+    def user_state(self):
+        context = self.context
+        if "user_state" not in context:
+            request = context.get("request")
+            context["user_state"] = get_user_state(
+                request.user if request else None
+            )
+        return context["user_state"]
+
+
+class RecipeImageMixin:
+    """URLs of the recipe image and its resized derivatives."""
+
+    def get_image_url(self, name):
+        if not name:
+            return None
+        url = default_storage.url(name)
+        request = self.context.get("request")
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_srcset(self, derivatives):
+        """Return srcset strings by format from (format, width, name)."""
+        sources = {}
+        for image_format, width, name in sorted(
+            derivatives, key=lambda derivative: derivative[1]
+        ):
+            sources.setdefault(image_format, []).append(
+                f"{self.get_image_url(name)} {width}w"
+            )
+        return {
+            image_format: ", ".join(sources[image_format])
+            for image_format in settings.RECIPE_IMAGE_FORMATS
+            if image_format in sources
+        }
+
+    def get_image_srcset(self, obj):
+        return self.get_srcset(
+            (derivative.format, derivative.width, derivative.file.name)
+            for derivative in obj.image_derivatives.all()
+        )
+
+
 class CustomUserSerializer(serializers.ModelSerializer):
     """Serializer for GET requests to endpoints of 'Users' resource."""
 
@@ -116,19 +179,29 @@ class RecipeIngredientsSerializer(serializers.ModelSerializer):
         )
 
 
-class GetRecipeSerializer(serializers.ModelSerializer):
+class RecipeAuthorSerializer(UserStateMixin, CustomUserSerializer):
+    """Nested serializer for GetRecipeSerializer."""
+
+    is_subscribed = serializers.SerializerMethodField()
+
+    def get_is_subscribed(self, obj):
+        return obj.id in self.user_state.subscriptions
+
+
+class GetRecipeSerializer(
+    UserStateMixin, RecipeImageMixin, serializers.ModelSerializer
+):
     """Serializer for Get requests to endpoints of 'Recipes' resource."""
 
     tags = TagSerializer(many=True, read_only=True)
-    author = CustomUserSerializer(read_only=True)
+    author = RecipeAuthorSerializer(read_only=True)
     ingredients = RecipeIngredientsSerializer(
         many=True, read_only=True, source="recipe_ingredient"
     )
-    is_favorited = serializers.BooleanField(read_only=True, default=False)
-    is_in_shopping_cart = serializers.BooleanField(
-        read_only=True, default=False
-    )
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -141,8 +214,203 @@ class GetRecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_width",
+            "image_height",
+            "image_srcset",
+            "text",
+            "cooking_time",
+        )
+
+    def get_is_favorited(self, obj):
+        return obj.id in self.user_state.favorites
+
+    def get_is_in_shopping_cart(self, obj):
+        return obj.id in self.user_state.shopping_cart
+
+
+class RecipeRowListSerializer(serializers.ListSerializer):
+    """Serializer of recipe rows loading related data for the whole page."""
+
+    def to_representation(self, data):
+        rows = list(data)
+        self.child.load_related(rows)
+        return [self.child.to_representation(row) for row in rows]
+
+
+class RecipeRowSerializer(
+    UserStateMixin, RecipeImageMixin, serializers.BaseSerializer
+):
+    """Fast serializer for GET requests to endpoints of 'Recipes' resource.
+
+    Builds the same representation as GetRecipeSerializer from plain rows
+    of the 'get_rows' queryset. Tags and ingredients of all recipes of
+    the page are loaded by one query each.
+    """
+
+    tag_fields = ("id", "name", "color", "slug")
+    ingredient_fields = ("id", "name", "measurement_unit", "amount")
+
+    class Meta:
+        list_serializer_class = RecipeRowListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tags = None
+        self.ingredients = None
+        self.derivatives = None
+
+    @staticmethod
+    def get_rows(queryset):
+        """Return the recipes queryset as rows of the serialized values."""
+        return queryset.values(
+            "id",
+            "name",
+            "image",
+            "image_width",
+            "image_height",
             "text",
             "cooking_time",
+            "pub_date",
+            "author_id",
+            "author__email",
+            "author__username",
+            "author__first_name",
+            "author__last_name",
+            # The search rank stays selected for DISTINCT queries.
+            *queryset.query.extra_select,
+        )
+
+    @staticmethod
+    def group_by_recipe(queryset, fields):
+        groups = {}
+        for recipe_id, *values in queryset:
+            groups.setdefault(recipe_id, []).append(dict(zip(fields, values)))
+        return groups
+
+    def load_related(self, rows):
+        """Load tags and ingredients of the recipes."""
+        recipe_ids = [row["id"] for row in rows]
+        self.tags = self.group_by_recipe(
+            Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids)
+            .order_by("tag__name")
+            .values_list(
+                "recipe_id",
+                *(f"tag__{field}" for field in self.tag_fields),
+            ),
+            self.tag_fields,
+        )
+        self.ingredients = self.group_by_recipe(
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .order_by("id")
+            .values_list(
+                "recipe_id",
+                "ingredient_id",
+                "ingredient__name",
+                "ingredient__measurement_unit",
+                "amount",
+            ),
+            self.ingredient_fields,
+        )
+        self.derivatives = {}
+        for recipe_id, *derivative in RecipeImage.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list("recipe_id", "format", "width", "file"):
+            self.derivatives.setdefault(recipe_id, []).append(derivative)
+
+    def to_representation(self, instance):
+        if self.tags is None:
+            self.load_related((instance,))
+        state = self.user_state
+        recipe_id = instance["id"]
+        author_id = instance["author_id"]
+        return {
+            "id": recipe_id,
+            "tags": self.tags.get(recipe_id, []),
+            "author": {
+                "email": instance["author__email"],
+                "id": author_id,
+                "username": instance["author__username"],
+                "first_name": instance["author__first_name"],
+                "last_name": instance["author__last_name"],
+                "is_subscribed": author_id in state.subscriptions,
+            },
+            "ingredients": self.ingredients.get(recipe_id, []),
+            "is_favorited": recipe_id in state.favorites,
+            "is_in_shopping_cart": recipe_id in state.shopping_cart,
+            "name": instance["name"],
+            "image": self.get_image_url(instance["image"]),
+            "image_width": instance["image_width"],
+            "image_height": instance["image_height"],
+            "image_srcset": self.get_srcset(
+                self.derivatives.get(recipe_id, ())
+            ),
+            "text": instance["text"],
+            "cooking_time": instance["cooking_time"],
+        }
+
+
+class PantryRecipeRowSerializer(RecipeRowSerializer):
+    """Serializer of recipe rows for recipes/pantry/ endpoint.
+
+    Numbers of missing ingredients by recipe ID are taken from the
+    'missing' item of the context.
+    """
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["missing_ingredients_count"] = self.context["missing"][
+            instance["id"]
+        ]
+        return data
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Serializer for requests to recipes/images/ endpoint."""
+
+    file = serializers.FileField(write_only=True)
+    image_token = serializers.UUIDField(source="token", read_only=True)
+
+    class Meta:
+        model = ImageUpload
+        fields = ("file", "image_token", "width", "height")
+        read_only_fields = ("width", "height")
+
+    def validate(self, attrs):
+        file = attrs["file"]
+        if file.size > settings.RECIPE_IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                {"file": "The image file is too large."}
+            )
+        header = read_image_header(file)
+        formats = settings.RECIPE_IMAGE_UPLOAD_FORMATS
+        if header is None or header[0] not in formats:
+            raise serializers.ValidationError(
+                {"file": f"Upload an image in {', '.join(formats)} format."}
+            )
+        image_format, width, height = header
+        if width * height > settings.RECIPE_IMAGE_UPLOAD_MAX_PIXELS:
+            raise serializers.ValidationError(
+                {"file": "The image dimensions are too large."}
+            )
+        file.name = f"{uuid4().hex}.{image_format.lower()}"
+        return {**attrs, "width": width, "height": height}
+
+
+class ImageTokenField(serializers.SlugRelatedField):
+    """Token of the image uploaded by the request user.
+
+    Uploads older than RECIPE_IMAGE_UPLOAD_LIFETIME are not accepted,
+    they may be deleted by clear_image_uploads at any moment.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(slug_field="token", **kwargs)
+
+    def get_queryset(self):
+        return ImageUpload.objects.filter(
+            user=self.context["request"].user,
+            created__gte=timezone.now()
+            - timedelta(seconds=settings.RECIPE_IMAGE_UPLOAD_LIFETIME),
         )
 
 
@@ -154,6 +422,8 @@ class PostPatchRecipeSerializer(GetRecipeSerializer):
     )
     author = CustomUserSerializer(default=serializers.CurrentUserDefault())
     ingredients = IngredientAmountSerializer(many=True)
+    image = Base64ImageField(required=False)
+    image_token = ImageTokenField(write_only=True, required=False)
 
     class Meta:
         model = Recipe
@@ -166,14 +436,48 @@ class PostPatchRecipeSerializer(GetRecipeSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_width",
+            "image_height",
+            "image_srcset",
+            "image_token",
             "text",
             "cooking_time",
         )
 
+    def validate(self, attrs):
+        if "image" in attrs and "image_token" in attrs:
+            raise serializers.ValidationError(
+                {"image_token": "Send either image or image_token."}
+            )
+        if self.instance is None and not (
+            "image" in attrs or "image_token" in attrs
+        ):
+            raise serializers.ValidationError(
+                {"image": "This field is required."}
+            )
+        return attrs
+
     @staticmethod
     def extract_tags_ingredients(data):
         return data.pop("tags"), data.pop("ingredients")
 
+    @staticmethod
+    def take_image_upload(data):
+        """Replace the image token with the file of the uploaded image."""
+        upload = data.pop("image_token", None)
+        if upload is not None:
+            data["image"] = File(
+                upload.file.open("rb"),
+                name=os.path.basename(upload.file.name),
+            )
+        return upload
+
+    @staticmethod
+    def release_image_upload(upload):
+        if upload is not None:
+            upload.file.close()
+            upload.delete()
+
     @staticmethod
     def add_ingredients_to_recipe(recipe, ingredients):
         try:
@@ -196,33 +500,162 @@ class PostPatchRecipeSerializer(GetRecipeSerializer):
     @transaction.atomic
     def create(self, validated_data, update_obj_id=None):
         tags, ingredients = self.extract_tags_ingredients(validated_data)
+        upload = self.take_image_upload(validated_data)
         recipe = Recipe.objects.create(**validated_data)
+        self.release_image_upload(upload)
         recipe.tags.set(tags)
-        return self.add_ingredients_to_recipe(recipe, ingredients)
+        self.add_ingredients_to_recipe(recipe, ingredients)
+        schedule_image_derivatives(recipe)
+        update_recipe_search_index((recipe.id,))
+        return recipe
+
+    @staticmethod
+    def is_stored_file(field_file, file):
+        """Check whether the file has the content of the stored file.
+
+        The sizes are compared first, then the files chunk by chunk, so
+        neither file is read into memory at once.
+        """
+        try:
+            if not field_file or field_file.size != file.size:
+                return False
+            with field_file.open("rb"):
+                return all(
+                    stored == chunk
+                    for stored, chunk in zip(
+                        field_file.chunks(), file.chunks()
+                    )
+                )
+        except OSError:
+            return False
+        finally:
+            file.seek(0)
+
+    @staticmethod
+    def update_tags(recipe, tags):
+        """Add the new tags of the recipe, remove the missing ones.
+
+        Return True if the tags have changed.
+        """
+        old_ids = {tag.id for tag in recipe.tags.all()}
+        new_ids = {tag.id for tag in tags}
+        if old_ids - new_ids:
+            recipe.tags.remove(*(old_ids - new_ids))
+        if new_ids - old_ids:
+            recipe.tags.add(*(new_ids - old_ids))
+        return old_ids != new_ids
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Save the changes of the recipe ingredients.
+
+        Amounts are updated in place, new ingredients are inserted and
+        removed ones are deleted. Return True if the ingredients have
+        changed.
+        """
+        new_amounts = {}
+        for ingredient in ingredients:
+            if ingredient["id"].id in new_amounts:
+                raise serializers.ValidationError(
+                    {"ingredients_id": "This field must be unique."}
+                )
+            new_amounts[ingredient["id"].id] = ingredient["amount"]
+        rows = {
+            row.ingredient_id: row for row in recipe.recipe_ingredient.all()
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
+        removed = [
+            row.id
+            for ingredient_id, row in rows.items()
+            if ingredient_id not in new_amounts
+        ]
+        changed = []
+        for ingredient_id, row in rows.items():
+            amount = new_amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        added = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in rows
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ("amount",))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        shopping_list.change_recipe(
+            recipe.id, shopping_list.get_deltas(old_amounts, new_amounts)
+        )
+        return bool(removed or changed or added)
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags, ingredients = self.extract_tags_ingredients(validated_data)
-        super().update(instance, validated_data)
-        instance.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        return self.add_ingredients_to_recipe(instance, ingredients)
+        """Save only the changed fields and relations of the recipe.
+
+        Tags and ingredients which are not sent are left unchanged, as is
+        the image when the sent file has the content of the stored one.
+        """
+        tags = validated_data.pop("tags", None)
+        ingredients = validated_data.pop("ingredients", None)
+        upload = self.take_image_upload(validated_data)
+        if "image" in validated_data and self.is_stored_file(
+            instance.image, validated_data["image"]
+        ):
+            del validated_data["image"]
+        changed_fields = [
+            field
+            for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        tags_changed = tags is not None and self.update_tags(instance, tags)
+        ingredients_changed = ingredients is not None and (
+            self.update_ingredients(instance, ingredients)
+        )
+        if changed_fields or tags_changed or ingredients_changed:
+            instance.save(update_fields=[*changed_fields, "modified"])
+        self.release_image_upload(upload)
+        if "image" in changed_fields:
+            schedule_image_derivatives(instance)
+        if ingredients_changed or {"name", "text"} & set(changed_fields):
+            update_recipe_search_index((instance.id,))
+        return instance
 
     def to_representation(self, instance):
+        # The view drops the prefetched relations of the saved recipe.
+        prefetch_related_objects(
+            (instance,),
+            "tags",
+            "recipe_ingredient__ingredient",
+            "image_derivatives",
+        )
         return GetRecipeSerializer(
             instance, context={"request": self.context.get("request")}
         ).data
 
 
-class RecipeBriefSerializer(serializers.ModelSerializer):
+class RecipeBriefSerializer(RecipeImageMixin, serializers.ModelSerializer):
     """Brief information about the recipe."""
 
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = (
             "id",
             "name",
             "image",
+            "image_width",
+            "image_height",
+            "image_srcset",
             "cooking_time",
         )
 
@@ -295,13 +728,39 @@ class SubscribeSerializer(serializers.ModelSerializer):
         return value
 
     def to_representation(self, instance):
-        author = instance.author
-        author.recipes_count = author.recipes.values().count()
         return SubscriptionsSerializer(
-            author, context={"request": self.context.get("request")}
+            instance.author, context={"request": self.context.get("request")}
         ).data
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    """Serializer for requests to the bulk endpoints of user relations."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.MAX_BULK_SIZE,
+    )
+
+
+class PantrySerializer(serializers.Serializer):
+    """Serializer for query parameters of recipes/pantry/ endpoint."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.MAX_PANTRY_SIZE,
+    )
+    tags = serializers.SlugRelatedField(
+        many=True,
+        slug_field="slug",
+        queryset=Tag.objects.all(),
+        required=False,
+    )
+    max_cooking_time = serializers.IntegerField(min_value=1, required=False)
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
 class SubscriptionsSerializer(CustomUserSerializer):
     """Serializer for requests to users/subscriptions/ endpoint."""
 
@@ -324,9 +783,13 @@ class SubscriptionsSerializer(CustomUserSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get("request")
-        queryset = obj.recipes.all()
-        if request.query_params.get("recipes_limit") is not None:
-            queryset = LimitPagination().paginate_queryset(queryset, request)
+        queryset = getattr(obj, "recipes_preview", None)
+        if queryset is None:
+            queryset = obj.recipes.prefetch_related("image_derivatives")
+            if request.query_params.get("recipes_limit") is not None:
+                queryset = LimitPagination().paginate_queryset(
+                    queryset, request
+                )
         serializer = RecipeBriefSerializer(
             queryset, many=True, context={"request": request}
         )
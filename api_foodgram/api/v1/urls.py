@@ -5,6 +5,9 @@ from djoser.views import UserViewSet
 from rest_framework.routers import DefaultRouter
 
 from api.v1.views import (
+    BulkFavoriteViewSet,
+    BulkShoppingCartViewSet,
+    BulkSubscribeViewSet,
     CustomUserViewSet,
     FavoriteViewSet,
     IngredientViewSet,
@@ -16,9 +19,20 @@ from api.v1.views import (
 
 router_v1 = DefaultRouter()
 
+router_v1.register(
+    "users/subscribe", BulkSubscribeViewSet, basename="bulk_subscribe"
+)
 router_v1.register("users", CustomUserViewSet, basename="users")
 router_v1.register("ingredients", IngredientViewSet, basename="ingredients")
 router_v1.register("tags", TagViewSet, basename="tags")
+router_v1.register(
+    "recipes/favorite", BulkFavoriteViewSet, basename="bulk_favorite"
+)
+router_v1.register(
+    "recipes/shopping_cart",
+    BulkShoppingCartViewSet,
+    basename="bulk_shopping_cart",
+)
 router_v1.register("recipes", RecipeViewSet, basename="recipes")
 router_v1.register(
     "recipes/(?P<recipe_id>\d+)/favorite", FavoriteViewSet, basename="favorite"
@@ -1,45 +1,67 @@
 """URLs request handlers of the 'api' application."""
 
-from django.db.models import (
-    Count,
-    Exists,
-    OuterRef,
-    Sum,
-)
-from django.http.response import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db.models import Exists, OuterRef, Prefetch, Subquery
+from django.http.response import HttpResponse, StreamingHttpResponse
 from django_filters import rest_framework
-from rest_framework import viewsets
+from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
 
-from api.pagination import PageNumberLimitPagination
+from api.pagination import (
+    FeedPagination,
+    LimitPagination,
+    PageNumberLimitPagination,
+    PageNumberOrCursorPagination,
+)
+from api.parsers import RawImageUploadParser
+from api.renderers import SHOPPING_LIST_RENDERERS
 from api.v1.filters import IngredientSearchFilter, RecipeFilter
 from api.v1.permissions import IsAuthorOrReadOnly
 from api.v1.serializers import (
+    BulkIdsSerializer,
     CustomUserCreateSerializer,
     CustomUserSerializer,
     FavoriteSerializer,
     GetRecipeSerializer,
+    ImageUploadSerializer,
     IngredientSerializer,
+    PantryRecipeRowSerializer,
+    PantrySerializer,
     PostPatchRecipeSerializer,
+    RecipeRowSerializer,
     ShoppingCartSerializer,
     SubscribeSerializer,
     SubscriptionsSerializer,
     TagSerializer,
 )
 from api.viewsets import (
+    BulkCreateDestroyViewSet,
     CustomCreateDestroyViewSet,
     GetPostPatchDeleteViewSet,
     GetPostViewSet,
+    ReferenceDataViewSet,
+)
+from recipes import shopping_list
+from recipes.cache import (
+    INGREDIENTS_VERSION,
+    TAGS_VERSION,
+    get_data_version,
 )
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
-    RecipeIngredient,
     ShoppingCart,
+    ShoppingListItem,
     Tag,
 )
+from recipes.pantry import pantry_index
 from users.models import Subscription, User
 
 
@@ -47,13 +69,36 @@ class CustomUserViewSet(GetPostViewSet):
     """URL requests handler to 'Users' resource endpoints."""
 
     permission_classes = (AllowAny,)
-    pagination_class = PageNumberLimitPagination
+    pagination_class = PageNumberOrCursorPagination
+    cursor_ordering = ("username", "id")
+    lookup_value_regex = r"\d+"
+
+    def get_recipes_preview(self):
+        """Latest recipes of all authors on the page in one query."""
+        queryset = Recipe.objects.all()
+        if "recipes_limit" in self.request.query_params:
+            limit = LimitPagination().get_page_size(self.request)
+            if not limit:
+                queryset = Recipe.objects.none()
+            else:
+                queryset = queryset.filter(
+                    id__in=Subquery(
+                        Recipe.objects.filter(
+                            author_id=OuterRef("author_id")
+                        ).values("id")[:limit]
+                    )
+                )
+        return Prefetch(
+            "recipes",
+            queryset=queryset.prefetch_related("image_derivatives"),
+            to_attr="recipes_preview",
+        )
 
     def get_queryset(self):
         if self.action == "subscriptions":
             return User.objects.filter(
                 subscription__user=self.request.user
-            ).annotate(recipes_count=(Count("recipes")))
+            ).prefetch_related(self.get_recipes_preview())
         queryset = User.objects.all()
         user = self.request.user
         if self.request.method == "GET" and user.is_authenticated:
@@ -75,7 +120,7 @@ class CustomUserViewSet(GetPostViewSet):
         return super().list(self, request)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceDataViewSet):
     """URL requests handler to 'Ingredients' resource endpoints."""
 
     queryset = Ingredient.objects.all()
@@ -83,67 +128,173 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     filter_backends = (IngredientSearchFilter,)
     search_fields = ("name",)
+    data_version = INGREDIENTS_VERSION
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReferenceDataViewSet):
     """URL requests handler to 'Tags' resource endpoints."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
+    data_version = TAGS_VERSION
 
 
 class RecipeViewSet(GetPostPatchDeleteViewSet):
     """URL requests handler to 'Recipes' resource endpoints."""
 
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = PageNumberLimitPagination
+    pagination_class = PageNumberOrCursorPagination
+    cursor_ordering = ("-pub_date", "id")
     filter_backends = (rest_framework.DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    lookup_value_regex = r"\d+"
+
+    read_actions = ("list", "retrieve")
 
     def get_serializer_class(self):
+        if self.action in self.read_actions:
+            return RecipeRowSerializer
         if self.request.method == "GET":
             return GetRecipeSerializer
         return PostPatchRecipeSerializer
 
     def get_queryset(self):
-        queryset = Recipe.objects.select_related("author").prefetch_related(
-            "tags", "ingredients"
+        if self.action in self.read_actions:
+            return Recipe.objects.all()
+        return Recipe.objects.select_related("author").prefetch_related(
+            "tags", "recipe_ingredient__ingredient", "image_derivatives"
+        )
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.read_actions:
+            return RecipeRowSerializer.get_rows(queryset)
+        return queryset
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        recipe_ids = self.paginate_queryset(request.user)
+        rows = RecipeRowSerializer.get_rows(
+            Recipe.objects.filter(id__in=recipe_ids).order_by(
+                "-pub_date", "-id"
+            )
         )
-        user_id = self.request.user.id or None
-        subquery_subscription = Subscription.objects.filter(
-            user_id=user_id, author=OuterRef("pk")
+        serializer = RecipeRowSerializer(
+            rows, many=True, context=self.get_serializer_context()
         )
-        subquery_favorite = Favorite.objects.filter(
-            user_id=user_id, recipe=OuterRef("pk")
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        rows = RecipeRowSerializer.get_rows(
+            Recipe.objects.filter(neighbour_of__recipe_id=pk).order_by(
+                "-neighbour_of__score", "id"
+            )
         )
-        subquery_shopping_cart = ShoppingCart.objects.filter(
-            user_id=user_id, recipe=OuterRef("pk")
+        data = RecipeRowSerializer(
+            rows, many=True, context=self.get_serializer_context()
+        ).data
+        if not data and not Recipe.objects.filter(pk=pk).exists():
+            raise NotFound
+        return Response(data)
+
+    @action(detail=False, pagination_class=PageNumberLimitPagination)
+    def pantry(self, request):
+        params = PantrySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        matches = pantry_index.match(
+            params.validated_data["ingredients"],
+            [tag.id for tag in params.validated_data.get("tags", ())],
+            params.validated_data.get("max_cooking_time"),
+            params.validated_data.get("max_missing"),
         )
-        queryset = queryset.annotate(
-            is_subscribed=(Exists(subquery_subscription)),
-            is_favorited=(Exists(subquery_favorite)),
-            is_in_shopping_cart=(Exists(subquery_shopping_cart)),
+        missing = dict(row.tolist() for row in self.paginate_queryset(matches))
+        positions = {recipe_id: i for i, recipe_id in enumerate(missing)}
+        rows = sorted(
+            RecipeRowSerializer.get_rows(
+                Recipe.objects.filter(id__in=list(missing))
+            ),
+            key=lambda row: positions[row["id"]],
         )
-        return queryset
+        serializer = PantryRecipeRowSerializer(
+            rows,
+            many=True,
+            context={**self.get_serializer_context(), "missing": missing},
+        )
+        return self.get_paginated_response(serializer.data)
 
-    @action(detail=False, permission_classes=(IsAuthenticated,))
+    @action(
+        detail=False,
+        methods=("post",),
+        url_path="images",
+        permission_classes=(IsAuthenticated,),
+        parser_classes=(MultiPartParser, RawImageUploadParser),
+    )
+    def upload_image(self, request):
+        # Large images are written to a temporary file, not kept in memory.
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        serializer = ImageUploadSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def get_shopping_list_pdf(user, renderer, rows):
+        """Return the PDF shopping list cached until the list changes.
+
+        The names of the ingredients are in the document, so it is also
+        rebuilt when the ingredients are changed.
+        """
+        key = "shopping_list_pdf:{}:{}:{}".format(
+            user.id,
+            shopping_list.get_version(user.id),
+            get_data_version(INGREDIENTS_VERSION),
+        )
+        content = cache.get(key)
+        if content is None:
+            content = renderer.build(rows)
+            cache.set(key, content, settings.SHOPPING_LIST_PDF_CACHE_TIMEOUT)
+        return content
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+    )
     def download_shopping_cart(self, request):
-        ingredients = [
-            *RecipeIngredient.objects.filter(
-                recipe__carts__user=request.user
-            ).select_related(
-                "ingredient"
-            ).values_list(
+        renderer = request.accepted_renderer
+        rows = (
+            ShoppingListItem.objects.filter(user=request.user)
+            .values_list(
                 "ingredient__name",
                 "ingredient__measurement_unit",
-            ).annotate(Sum("amount")).order_by("ingredient__name")
-        ]
-        shopping_list = (
-            (" ".join((str(element) for element in ingredient)) + "\n")
-            for ingredient in ingredients
+                "amount",
+            )
+            .order_by("ingredient__name", "ingredient__measurement_unit")
+        )
+        if renderer.format == "pdf":
+            response = HttpResponse(
+                self.get_shopping_list_pdf(request.user, renderer, rows),
+                content_type=renderer.media_type,
+            )
+        else:
+            response = StreamingHttpResponse(
+                renderer.stream(
+                    rows.iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
+                ),
+                content_type=f"{renderer.media_type}; charset=utf-8",
+            )
+        response["Content-Disposition"] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
-        return HttpResponse(shopping_list, content_type="text/plain")
+        return response
 
 
 class FavoriteViewSet(CustomCreateDestroyViewSet):
@@ -174,3 +325,29 @@ class SubscribeViewSet(CustomCreateDestroyViewSet):
     request_instance_field = "author"
     request_kwarg = "author_id"
     error_message = "There was no subscription to this author."
+
+
+class BulkFavoriteViewSet(BulkCreateDestroyViewSet):
+    """URL requests handler to bulk 'Favorites' resource endpoints."""
+
+    serializer_class = BulkIdsSerializer
+    queryset = Recipe.objects.all()
+    model = Favorite
+
+
+class BulkShoppingCartViewSet(BulkCreateDestroyViewSet):
+    """URL requests handler to bulk 'Shopping list' resource endpoints."""
+
+    serializer_class = BulkIdsSerializer
+    queryset = Recipe.objects.all()
+    model = ShoppingCart
+
+
+class BulkSubscribeViewSet(BulkCreateDestroyViewSet):
+    """URL requests handler to bulk 'Subscriptions' resource endpoints."""
+
+    serializer_class = BulkIdsSerializer
+    model = Subscription
+
+    def get_queryset(self):
+        return User.objects.exclude(pk=self.request.user.id)
@@ -1,11 +1,25 @@
 """Custom viewsets."""
 
+import gzip
 from abc import ABCMeta
 
+import brotli
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.http.response import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework import mixins, serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
+
+from recipes.cache import get_data_version
+from recipes.relations import add_relations, lock_user, remove_relations
 
 
 class GetPostViewSet(
@@ -23,20 +37,95 @@ class GetPostPatchDeleteViewSet(viewsets.ModelViewSet):
     http_method_names = ("get", "post", "patch", "delete", "head", "options")
 
 
+class ReferenceDataViewSet(viewsets.ReadOnlyModelViewSet):
+    """Read-only viewset serving the full list from the cache.
+
+    The serialized list and its compressed copies are cached under the
+    version of the data set, so they are built once per data change.
+    The copies of the previous version are deleted when the new ones are
+    cached. The responses carry a strong ETag and are revalidated with
+    304.
+    """
+
+    data_version = None
+    encodings = ("br", "gzip")
+
+    def build_bodies(self):
+        data = self.get_serializer(self.get_queryset(), many=True).data
+        body = JSONRenderer().render(data)
+        return {
+            "identity": body,
+            "gzip": gzip.compress(body),
+            "br": brotli.compress(body),
+        }
+
+    def get_bodies(self, version):
+        latest_key = f"reference_data:{self.data_version}"
+        key = f"{latest_key}:{version}"
+        bodies = cache.get(key)
+        if bodies is None:
+            bodies = self.build_bodies()
+            previous_key = cache.get(latest_key)
+            if previous_key not in (None, key):
+                cache.delete(previous_key)
+            cache.set_many(
+                {key: bodies, latest_key: key},
+                settings.REFERENCE_DATA_CACHE_TIMEOUT,
+            )
+        return bodies
+
+    def get_encoding(self, request):
+        accepted = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        accepted = {
+            encoding.split(";")[0].strip() for encoding in accepted.split(",")
+        }
+        for encoding in self.encodings:
+            if encoding in accepted:
+                return encoding
+        return "identity"
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        version = get_data_version(self.data_version)
+        encoding = self.get_encoding(request)
+        etag = f'"{self.data_version}-{version}-{encoding}"'
+        if_none_match = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                self.get_bodies(version)[encoding],
+                content_type="application/json",
+            )
+            if encoding != "identity":
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Cache-Control"] = settings.REFERENCE_DATA_CACHE_CONTROL
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+
 class CustomCreateDestroyViewSet(
     mixins.CreateModelMixin,
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet,
     metaclass=ABCMeta,
 ):
-    """Base viewset for resources: Favorites, Subscriptions, Shopping list"""
+    """Base viewset for resources: Favorites, Subscriptions, Shopping list.
+
+    Changes lock the request user row like the bulk changes do, so the
+    relations are never counted twice by concurrent requests.
+    """
 
     model = None
     request_instance_field = None
     request_kwarg = None
     error_message = None
 
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
+        lock_user(request.user.id)
         data = {
             "user": request.user.id,
             self.request_instance_field: kwargs[self.request_kwarg],
@@ -49,9 +138,66 @@ class CustomCreateDestroyViewSet(
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=("delete",), detail=False)
+    @transaction.atomic
     def delete(self, request, **kwargs):
+        lock_user(request.user.id)
         try:
             self.model.objects.get(user=request.user, **kwargs).delete()
         except ObjectDoesNotExist:
             raise serializers.ValidationError({"errors": self.error_message})
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BulkCreateDestroyViewSet(viewsets.GenericViewSet, metaclass=ABCMeta):
+    """Base viewset for bulk changes of Favorites, Subscriptions, Carts.
+
+    POST relates the request user to the objects whose IDs are listed in
+    the request body, DELETE removes the relations. The objects are
+    validated by one query, the relations are saved in bulk. The
+    response holds the status of every ID: 'created', 'exists' or
+    'invalid' for POST, 'deleted' or 'absent' for DELETE.
+    """
+
+    model = None
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (ScopedRateThrottle,)
+    throttle_scope = "bulk"
+
+    def get_ids(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data["ids"]))
+
+    @staticmethod
+    def get_response(ids, statuses, default):
+        return Response(
+            {
+                "results": [
+                    {"id": pk, "status": statuses.get(pk, default)}
+                    for pk in ids
+                ]
+            }
+        )
+
+    def create(self, request, *args, **kwargs):
+        ids = self.get_ids(request)
+        statuses = dict.fromkeys(
+            self.get_queryset()
+            .filter(pk__in=ids)
+            .values_list("pk", flat=True),
+            "exists",
+        )
+        statuses.update(
+            dict.fromkeys(
+                add_relations(self.model, request.user.id, list(statuses)),
+                "created",
+            )
+        )
+        return self.get_response(ids, statuses, "invalid")
+
+    def delete(self, request, *args, **kwargs):
+        ids = self.get_ids(request)
+        statuses = dict.fromkeys(
+            remove_relations(self.model, request.user.id, ids), "deleted"
+        )
+        return self.get_response(ids, statuses, "absent")
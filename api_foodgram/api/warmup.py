@@ -0,0 +1,87 @@
+"""Warmup of the application process before it serves requests.
+
+URL resolvers are populated, the fields of the serializers are built and
+the WARMUP_PATHS are requested through the WSGI application, so that
+lazily imported modules are loaded and the reference data caches are
+filled before the first request of a client. The pantry index is built,
+with the preloaded application it is shared by the forked workers.
+"""
+
+import inspect
+import logging
+from time import perf_counter
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.urls import reverse
+from rest_framework.serializers import Serializer
+
+from api.v1 import serializers
+from recipes.pantry import pantry_index
+
+logger = logging.getLogger(__name__)
+
+
+def get_host():
+    """Return a host name allowed by the settings."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*" and not host.startswith("."):
+            return host
+    return "localhost"
+
+
+def request(application, path):
+    """Make a GET request to the WSGI application, return the status."""
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "HTTP_HOST": get_host(),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    response = application(environ, start_response)
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, "close"):
+            response.close()
+    return statuses[0]
+
+
+def close_connections():
+    """Close database and cache connections, e.g. before forking."""
+    connections.close_all()
+    for cache in caches.all():
+        cache.close()
+
+
+def warm_up(application):
+    """Prepare the process with the WSGI application for the requests."""
+    started = perf_counter()
+    reverse("api:recipes-list")
+    for _, serializer_class in inspect.getmembers(
+        serializers, inspect.isclass
+    ):
+        if (
+            issubclass(serializer_class, Serializer)
+            and serializer_class.__module__ == serializers.__name__
+        ):
+            serializer_class().fields
+    for path in settings.WARMUP_PATHS:
+        try:
+            status = request(application, path)
+        except Exception:
+            logger.exception("Warmup request to %s failed.", path)
+            continue
+        if not status.startswith("2"):
+            logger.warning("Warmup request to %s: %s.", path, status)
+    pantry_index.get_state()
+    close_connections()
+    logger.info("Warmed up in %.1f ms.", (perf_counter() - started) * 1000)
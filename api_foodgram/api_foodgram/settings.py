@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -28,11 +29,12 @@ INSTALLED_APPS = [
     "django_filters",
     "djoser",
     "users.apps.UsersConfig",
-    "recipes",
-    "api",
+    "recipes.apps.RecipesConfig",
+    "api.apps.ApiConfig",
 ]
 
 MIDDLEWARE = [
+    "api.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,6 +88,27 @@ if DEBUG:
 else:
     DATABASES = DEBUG_FALSE_DATABASES
 
+# Read replicas: comma separated 'host[:port]' of PostgreSQL replicas or
+# paths of SQLite database files (copies of the primary for local tests)
+DB_REPLICAS = [
+    replica.strip()
+    for replica in os.getenv("DB_REPLICAS", "").split(",")
+    if replica.strip()
+]
+for number, replica in enumerate(DB_REPLICAS, 1):
+    database = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+    if database["ENGINE"] == "django.db.backends.sqlite3":
+        database["NAME"] = replica
+    else:
+        host, _, port = replica.partition(":")
+        database.update(HOST=host, PORT=port or database["PORT"])
+    DATABASES[f"replica_{number}"] = database
+DB_PRIMARY_PIN_SECONDS = int(os.getenv("DB_PRIMARY_PIN_SECONDS", "10"))
+DB_REPLICA_RETRY_SECONDS = 30
+if DB_REPLICAS:
+    MIDDLEWARE.insert(1, "api.middleware.ReplicaRoutingMiddleware")
+    DATABASE_ROUTERS = ("api.db_router.ReplicaRouter",)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -115,6 +138,22 @@ STATICFILES_DIRS_DATA = os.path.join(BASE_DIR, "csv_data")
 MEDIA_URL = "/media/django/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": os.getenv(
+            "CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "foodgram_cache"),
+        ),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "100000")),
+        },
+    }
+}
+
 # Redefining the 'User' model
 AUTH_USER_MODEL = "users.User"
 
@@ -123,8 +162,11 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
+    "DEFAULT_THROTTLE_RATES": {
+        "bulk": os.getenv("BULK_THROTTLE_RATE", "60/minute"),
+    },
 }
 
 # Debug mode settings
@@ -140,7 +182,7 @@ if DEBUG:
     REST_FRAMEWORK.update(
         {
             "DEFAULT_AUTHENTICATION_CLASSES": [
-                "rest_framework.authentication.TokenAuthentication",
+                "api.authentication.CachedTokenAuthentication",
                 "rest_framework.authentication.SessionAuthentication",
             ],
         }
@@ -162,3 +204,87 @@ PAGE_SIZE = 6
 MAX_PAGE_SIZE = 24
 DEFAULT_LIMIT = 0
 MAX_LIMIT = 7
+
+# Ingredient search options
+INGREDIENT_SEARCH_FUZZY = True
+INGREDIENT_SEARCH_FUZZY_MIN_LENGTH = 3
+
+# Recipe full-text search options
+RECIPE_SEARCH_CONFIG = "russian"
+RECIPE_SEARCH_INGREDIENTS = True
+
+# Shopping list export options
+SHOPPING_LIST_CHUNK_SIZE = 500
+SHOPPING_LIST_PDF_CACHE_TIMEOUT = 60 * 60 * 24
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    "SHOPPING_LIST_PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+)
+
+# Reference data (tags, ingredients) cache options
+REFERENCE_DATA_CACHE_CONTROL = "public, no-cache"
+REFERENCE_DATA_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Cache timeout of the user relations with recipes and authors
+USER_STATE_CACHE_TIMEOUT = 60 * 60
+
+# Recipe image derivatives options
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_FORMATS = ("webp", "jpeg")
+RECIPE_IMAGE_QUALITY = 80
+
+# Recipe image uploads options
+RECIPE_IMAGE_UPLOAD_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+RECIPE_IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+RECIPE_IMAGE_UPLOAD_MAX_PIXELS = 50 * 1000 * 1000
+RECIPE_IMAGE_UPLOAD_LIFETIME = 60 * 60 * 24
+
+# Token authentication cache options
+TOKEN_CACHE_TIMEOUT = 60
+TOKEN_LOCAL_CACHE_SIZE = 10000
+
+# Similar recipes options
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+SIMILAR_RECIPES_MAX_DF = 0.2
+SIMILAR_RECIPES_BATCH_SIZE = 256
+
+# Pantry matching options
+MAX_PANTRY_SIZE = 100
+PANTRY_INDEX_CHANGES_TIMEOUT = 60 * 60 * 24
+PANTRY_INDEX_CHANGES_WAIT = 10
+PANTRY_INDEX_MAX_CHANGES = 10000
+
+# Bulk favorites, shopping cart and subscriptions options
+MAX_BULK_SIZE = 100
+
+# Subscription feed options
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+# Pulled authors are written to the feeds again by 'fan_out_feeds'
+# when their followers fall to this number.
+FEED_FANOUT_MIN_FOLLOWERS = 9000
+FEED_BACKFILL_SIZE = 100
+FEED_BATCH_SIZE = 1000
+
+# Request performance instrumentation options
+PERFORMANCE_SAMPLE_RATE = float(os.getenv("PERFORMANCE_SAMPLE_RATE", "0.1"))
+PERFORMANCE_SLOW_REQUEST_MS = 500
+PERFORMANCE_REPEATED_QUERIES = 10
+PERFORMANCE_TOP_QUERIES = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api.middleware": {"handlers": ["console"], "level": "INFO"},
+        "api.warmup": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+# Requests made by the worker warmup before it serves clients
+WARMUP_PATHS = ("/api/tags/", "/api/ingredients/", "/api/recipes/")
+
+# Query plan snapshots of the 'explain_queries' command
+QUERY_PLAN_SNAPSHOT_DIR = os.path.join(BASE_DIR, "query_plans")
@@ -0,0 +1,46 @@
+"""Gunicorn settings of the production server.
+
+Workers are sized by the CPU count and recycled after a jittered number
+of requests. With the preloaded application the warmup runs once in the
+master process and the workers inherit the primed state; database and
+cache connections are closed before forking, so that workers never
+share sockets. Without preloading every worker warms up before it
+accepts connections.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0:8000")
+workers = int(
+    os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+)
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from api.warmup import warm_up
+
+        warm_up(server.app.wsgi())
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        from api.warmup import close_connections
+
+        close_connections()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        from api.warmup import warm_up
+
+        warm_up(worker.wsgi)
@@ -1,8 +1,9 @@
 """Admin site settings of the 'Recipes' application."""
 
 from django.contrib import admin
-from django.db.models import Count
 
+from recipes import shopping_list
+from recipes.images import build_image_derivatives
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -11,6 +12,7 @@ from recipes.models import (
     ShoppingCart,
     Tag,
 )
+from recipes.search import update_recipe_search_index
 from users.admin_site_permissions import (
     StaffAllowedBaseModelAdmin,
     StaffAllowedModelAdmin,
@@ -61,11 +63,17 @@ class RecipeAdmin(StaffAllowedModelAdmin):
         "author",
         "name",
         "cooking_time",
-        "in_favorite",
+        "favorites_count",
+        "in_carts_count",
         "pub_date",
         "tags_display",
     )
-    readonly_fields = ("in_favorite",)
+    readonly_fields = (
+        "favorites_count",
+        "in_carts_count",
+        "image_width",
+        "image_height",
+    )
     inlines = [
         RecipeIngredientsInline,
     ]
@@ -73,17 +81,23 @@ class RecipeAdmin(StaffAllowedModelAdmin):
     search_fields = ("name",)
     list_filter = ("author", "name", "tags")
 
-    @staticmethod
-    def in_favorite(obj):
-        return obj.in_favorite
-
-    def get_queryset(self, request):
-        """Annotating objects with "in_favorite" value."""
-        qs = Recipe.objects.annotate(in_favorite=Count("favorites"))
-        ordering = self.get_ordering(request)
-        if ordering:
-            qs.order_by(*ordering)
-        return qs
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if "image" in form.changed_data:
+            build_image_derivatives(obj)
+
+    def save_related(self, request, form, formsets, change):
+        """Refresh derived data after the ingredients are saved."""
+        recipe_id = form.instance.id
+        old_amounts = shopping_list.get_amounts((recipe_id,))
+        super().save_related(request, form, formsets, change)
+        shopping_list.change_recipe(
+            recipe_id,
+            shopping_list.get_deltas(
+                old_amounts, shopping_list.get_amounts((recipe_id,))
+            ),
+        )
+        update_recipe_search_index((recipe_id,))
 
     def tags_display(self, obj):
         return ", ".join([tag.name for tag in obj.tags.all()])
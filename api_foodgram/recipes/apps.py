@@ -5,3 +5,6 @@ from django.apps import AppConfig
 
 class RecipesConfig(AppConfig):
     name = "recipes"
+
+    def ready(self):
+        import recipes.signals  # noqa: F401
@@ -0,0 +1,196 @@
+"""Bulk loading of rows into the tables of the project.
+
+PostgreSQL receives the rows by COPY FROM STDIN into a temporary table
+and moves them to the target table with INSERT ... ON CONFLICT DO
+NOTHING. Other databases use batched bulk_create with ignored conflicts.
+Bulk loading bypasses signals, so the derived data is refreshed
+separately by 'refresh_derived_data'.
+"""
+
+import csv
+from contextlib import contextmanager
+from itertools import islice
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from recipes import feed, shopping_list
+from recipes.cache import INGREDIENTS_VERSION, TAGS_VERSION, bump_data_version
+from recipes.counters import COUNTERS, fix_counter
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from recipes.pantry import PANTRY_INDEX_VERSION
+from recipes.search import update_recipe_search_index
+from recipes.user_state import USER_STATES_VERSION
+from users.models import Subscription, User
+
+NULL = "\\N"
+COPY_SQL = "COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+
+class RowStream:
+    """File-like object reading the rows as CSV lines."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.writer = csv.writer(self, lineterminator="\n")
+        self.buffer = ""
+        self.count = 0
+
+    @staticmethod
+    def write(value):
+        return value
+
+    def read(self, size=-1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        for row in self.rows:
+            line = self.writer.writerow(
+                NULL if value is None else value for value in row
+            )
+            chunks.append(line)
+            length += len(line)
+            self.count += 1
+            if 0 <= size <= length:
+                break
+        data = "".join(chunks)
+        if size < 0:
+            size = len(data)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def get_table_models():
+    """Return models of the project by the names of their tables."""
+    return {
+        model._meta.db_table: model
+        for model in apps.get_models(include_auto_created=True)
+    }
+
+
+def get_fields(model, columns):
+    """Return model fields of the table columns."""
+    fields = {field.column: field for field in model._meta.concrete_fields}
+    unknown = [column for column in columns if column not in fields]
+    if unknown:
+        raise ValueError(
+            f"Unknown columns of {model._meta.db_table}: {', '.join(unknown)}"
+        )
+    return [fields[column] for column in columns]
+
+
+def copy_rows(model, columns, rows, using):
+    """Load rows to the PostgreSQL table, skip conflicting ones."""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    temporary_table = quote(f"{model._meta.db_table}_load")
+    column_list = ", ".join(quote(column) for column in columns)
+    stream = RowStream(rows)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {temporary_table} AS"
+            f" SELECT {column_list} FROM {table} WITH NO DATA"
+        )
+        cursor.copy_expert(
+            COPY_SQL.format(table=temporary_table, columns=column_list),
+            stream,
+        )
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list})"
+            f" SELECT {column_list} FROM {temporary_table}"
+            " ON CONFLICT DO NOTHING"
+        )
+        cursor.execute(f"DROP TABLE {temporary_table}")
+    return stream.count
+
+
+@contextmanager
+def explicit_dates(fields):
+    """Keep the loaded values of auto_now and auto_now_add fields."""
+    fields = [
+        field
+        for field in fields
+        if getattr(field, "auto_now", False)
+        or getattr(field, "auto_now_add", False)
+    ]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def create_rows(model, columns, rows, using):
+    """Load rows by bulk_create, skip conflicting ones."""
+    fields = get_fields(model, columns)
+    names = [field.attname for field in fields]
+    objects = [model(**dict(zip(names, row))) for row in rows]
+    with explicit_dates(fields):
+        model.objects.using(using).bulk_create(objects, ignore_conflicts=True)
+    return len(objects)
+
+
+def load_rows(model, columns, rows, batch_size, using=DEFAULT_DB_ALIAS):
+    """Load rows of column values in batches, return the number of rows.
+
+    Empty strings of nullable columns are loaded as NULL.
+    """
+    fields = get_fields(model, columns)
+    nullable = [field.null for field in fields]
+    rows = (
+        [
+            None if value == "" and null else value
+            for value, null in zip(row, nullable)
+        ]
+        for row in rows
+    )
+    load = create_rows
+    if connections[using].vendor == "postgresql":
+        load = copy_rows
+    count = 0
+    while True:
+        loaded = load(model, columns, islice(rows, batch_size), using)
+        if not loaded:
+            return count
+        count += loaded
+
+
+def reset_sequences(models, using=DEFAULT_DB_ALIAS):
+    """Move the ID sequences past the explicitly loaded IDs."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def refresh_derived_data(models):
+    """Refresh the data which signals keep up to date for single saves."""
+    models = set(models)
+    if Ingredient in models:
+        transaction.on_commit(lambda: bump_data_version(INGREDIENTS_VERSION))
+    if Tag in models:
+        transaction.on_commit(lambda: bump_data_version(TAGS_VERSION))
+    if models & {Recipe, RecipeIngredient, Ingredient}:
+        update_recipe_search_index()
+    if models & {Recipe, RecipeIngredient, Ingredient, Tag}:
+        transaction.on_commit(lambda: bump_data_version(PANTRY_INDEX_VERSION))
+    if models & {Recipe, Favorite, ShoppingCart, Subscription, User}:
+        for model, field, related_name in COUNTERS:
+            fix_counter(model, field, related_name)
+    if models & {ShoppingCart, RecipeIngredient}:
+        shopping_list.rebuild_shopping_lists()
+    if models & {Recipe, Subscription, User}:
+        feed.rebuild_feeds()
+    if models & {Favorite, ShoppingCart, Subscription}:
+        transaction.on_commit(lambda: bump_data_version(USER_STATES_VERSION))
@@ -0,0 +1,24 @@
+"""Versions of the cached data of the 'Recipes' application."""
+
+from uuid import uuid4
+
+from django.core.cache import cache
+
+DATA_VERSION_KEY = "data_version:{}"
+INGREDIENTS_VERSION = "ingredients"
+TAGS_VERSION = "tags"
+
+
+def get_data_version(name):
+    """Return the current version of the named data set."""
+    key = DATA_VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(name):
+    """Mark the named data set as changed."""
+    cache.set(DATA_VERSION_KEY.format(name), uuid4().hex, timeout=None)
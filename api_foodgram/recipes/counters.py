@@ -0,0 +1,66 @@
+"""Denormalized counters of recipes and users, named sequences."""
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, Sequence
+from users.models import User
+
+COUNTERS = (
+    (Recipe, "favorites_count", "favorites"),
+    (Recipe, "in_carts_count", "carts"),
+    (User, "recipes_count", "recipes"),
+    (User, "followers_count", "subscription"),
+)
+
+
+def change_counter(model, field, pks, delta):
+    """Change the counter of the objects by the delta."""
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def find_counter_drift(model, field, related_name):
+    """Return (pk, stored, actual) of the objects with a wrong counter."""
+    return list(
+        model.objects.annotate(actual=Count(related_name))
+        .exclude(**{field: F("actual")})
+        .values_list("pk", field, "actual")
+        .order_by("pk")
+    )
+
+
+def fix_counter(model, field, related_name):
+    """Write the actual values of the counter of all objects by one UPDATE."""
+    relation = model._meta.get_field(related_name)
+    model.objects.update(
+        **{
+            field: Coalesce(
+                Subquery(
+                    relation.related_model.objects.filter(
+                        **{relation.field.name: OuterRef("pk")}
+                    )
+                    .order_by()
+                    .values(relation.field.name)
+                    .annotate(total=Count("pk"))
+                    .values("total")
+                ),
+                0,
+            )
+        }
+    )
+
+
+def increment_sequence(name):
+    """Increment the named sequence, return its new value.
+
+    The UPDATE locks the row until the end of the transaction, so the
+    values are unique and the callers holding them are serialized.
+    """
+    sequences = Sequence.objects.filter(name=name)
+    if not sequences.update(value=F("value") + 1):
+        Sequence.objects.get_or_create(name=name)
+        sequences.update(value=F("value") + 1)
+    return sequences.values_list("value", flat=True).get()
@@ -0,0 +1,214 @@
+"""Recipe feeds of users from the followed authors.
+
+A new recipe is written to the feed of every follower of its author
+(fan-out on write), so the feed of a user is read by one range scan of
+the feed entries. An author followed by more than
+FEED_FANOUT_MAX_FOLLOWERS users is marked as pulled: the recipes are not
+written to the feeds, they are read from the recipes of these authors
+together with the entries. A new subscription adds the latest recipes of
+the author to the feed, a deleted one removes them.
+
+A request never writes the recipes of an author to the feeds of all
+followers. Pulled authors are fanned out again by 'fan_out_feeds' when
+their followers fall to FEED_FANOUT_MIN_FOLLOWERS, so an author with
+about FEED_FANOUT_MAX_FOLLOWERS followers does not switch back and forth.
+"""
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+REBUILD_FEEDS_SQL = (
+    f"INSERT INTO {FeedEntry._meta.db_table}"
+    " (user_id, recipe_id, author_id, pub_date)"
+    " SELECT subscription.user_id, recipe.id, recipe.author_id,"
+    " recipe.pub_date"
+    " FROM (SELECT id, author_id, pub_date, ROW_NUMBER() OVER"
+    " (PARTITION BY author_id ORDER BY pub_date DESC, id DESC) AS position"
+    f" FROM {Recipe._meta.db_table}) AS recipe"
+    f" JOIN {Subscription._meta.db_table} AS subscription"
+    " ON subscription.author_id = recipe.author_id"
+    f" JOIN {User._meta.db_table} AS author ON author.id = recipe.author_id"
+    " WHERE recipe.position <= %s AND author.feed_pulled = %s"
+)
+FAN_OUT_AUTHOR_SQL = (
+    f"INSERT INTO {FeedEntry._meta.db_table}"
+    " (user_id, recipe_id, author_id, pub_date)"
+    " SELECT subscription.user_id, recipe.id, recipe.author_id,"
+    " recipe.pub_date"
+    f" FROM (SELECT id, author_id, pub_date FROM {Recipe._meta.db_table}"
+    " WHERE author_id = %s ORDER BY pub_date DESC, id DESC LIMIT %s)"
+    " AS recipe"
+    f" JOIN {Subscription._meta.db_table} AS subscription"
+    " ON subscription.author_id = recipe.author_id"
+)
+
+
+def create_entries(entries):
+    """Save the entries in batches, skip the existing ones."""
+    # bulk_create of Django 2.2 does not limit an explicit batch size by
+    # the limits of the database backend.
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.FEED_BATCH_SIZE))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def get_followers(author_id):
+    """Return IDs of followers of the author whose recipes are fanned out."""
+    return Subscription.objects.filter(
+        author_id=author_id, author__feed_pulled=False
+    ).values_list("user_id", flat=True)
+
+
+def get_latest_recipes(author_id):
+    """Return (ID, publication date) of the latest recipes of the author."""
+    return list(
+        Recipe.objects.filter(author_id=author_id)
+        .order_by("-pub_date", "-id")
+        .values_list("id", "pub_date")[: settings.FEED_BACKFILL_SIZE]
+    )
+
+
+def add_recipe(recipe):
+    """Write the new recipe to the feeds of the followers of its author."""
+    create_entries(
+        FeedEntry(
+            user_id=user_id,
+            recipe_id=recipe.id,
+            author_id=recipe.author_id,
+            pub_date=recipe.pub_date,
+        )
+        for user_id in get_followers(recipe.author_id).iterator()
+    )
+
+
+def add_author(user_ids, author_id):
+    """Write the latest recipes of the author to the feeds of the users."""
+    recipes = get_latest_recipes(author_id)
+    create_entries(
+        FeedEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in user_ids
+        for recipe_id, pub_date in recipes
+    )
+
+
+def follow(user_id, author_id):
+    """Write the latest recipes of the followed author to the user feed.
+
+    Nothing is written for a pulled author, the recipes of the author
+    are read on request. The author is marked as pulled when the
+    followers exceed FEED_FANOUT_MAX_FOLLOWERS.
+    """
+    author = User.objects.filter(pk=author_id)
+    pulled, followers_count = author.values_list(
+        "feed_pulled", "followers_count"
+    ).get()
+    if pulled:
+        return
+    if followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        author.update(feed_pulled=True)
+        return
+    add_author((user_id,), author_id)
+
+
+def unfollow(user_id, author_id):
+    """Remove the recipes of the author from the user feed."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def get_before(queryset, before, id_field):
+    """Filter the rows published before the position."""
+    if before is None:
+        return queryset
+    pub_date, recipe_id = before
+    return queryset.filter(pub_date__lte=pub_date).exclude(
+        **{"pub_date": pub_date, f"{id_field}__gte": recipe_id}
+    )
+
+
+def get_feed(user, limit, before=None):
+    """Return (publication date, recipe ID) of the latest feed recipes.
+
+    Only the recipes published before the (publication date, recipe ID)
+    position are returned when it is given. Recipes of the followed
+    pulled authors are read by one query and merged with the entries.
+    """
+    positions = set(
+        get_before(FeedEntry.objects.filter(user=user), before, "recipe_id")
+        .order_by("-pub_date", "-recipe_id")
+        .values_list("pub_date", "recipe_id")[:limit]
+    )
+    pulled_authors = Subscription.objects.filter(
+        user=user, author__feed_pulled=True
+    ).values("author_id")
+    positions.update(
+        get_before(
+            Recipe.objects.filter(author_id__in=pulled_authors), before, "id"
+        )
+        .order_by("-pub_date", "-id")
+        .values_list("pub_date", "id")[:limit]
+    )
+    return sorted(positions, reverse=True)[:limit]
+
+
+@transaction.atomic
+def rebuild_feeds():
+    """Recreate the feeds of all users from their subscriptions.
+
+    Authors with more than FEED_FANOUT_MAX_FOLLOWERS followers are
+    marked as pulled. The latest recipes of the other authors are written
+    to the feeds of their followers by one INSERT ... SELECT.
+    """
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS
+    User.objects.filter(followers_count__gt=limit).update(feed_pulled=True)
+    User.objects.filter(followers_count__lte=limit).update(feed_pulled=False)
+    FeedEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_FEEDS_SQL, (settings.FEED_BACKFILL_SIZE, False))
+
+
+def fan_out_author(author_id):
+    """Write the latest recipes of the pulled author to the feeds.
+
+    The author row is updated first: it locks the row against the
+    follower counting of new subscriptions until the commit, so their
+    followers are either selected here or see the author fanned out.
+    """
+    with transaction.atomic():
+        fanned_out = User.objects.filter(
+            pk=author_id,
+            feed_pulled=True,
+            followers_count__lte=settings.FEED_FANOUT_MIN_FOLLOWERS,
+        ).update(feed_pulled=False)
+        if not fanned_out:
+            return False
+        FeedEntry.objects.filter(author_id=author_id).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                FAN_OUT_AUTHOR_SQL, (author_id, settings.FEED_BACKFILL_SIZE)
+            )
+    return True
+
+
+def fan_out_authors():
+    """Fan out the pulled authors with few followers, return their count.
+
+    Every author is written in its own transaction.
+    """
+    author_ids = User.objects.filter(
+        feed_pulled=True,
+        followers_count__lte=settings.FEED_FANOUT_MIN_FOLLOWERS,
+    ).values_list("id", flat=True)
+    return sum(fan_out_author(author_id) for author_id in list(author_ids))
@@ -0,0 +1,159 @@
+"""Resized derivatives of recipe images.
+
+Every recipe image is saved in several widths and formats, the original
+is never upscaled. Derivatives are encoded without EXIF metadata after
+the orientation from EXIF is applied to the pixels. Requests only save
+the original image, the derivatives are built after the commit by a
+background thread.
+"""
+
+import logging
+import os.path
+from io import BytesIO
+from threading import Thread
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe, RecipeImage
+
+IMAGE_FORMATS = {
+    "webp": ("WEBP", "webp", {"method": 6}),
+    "jpeg": ("JPEG", "jpg", {"optimize": True, "progressive": True}),
+}
+ALPHA_MODES = ("RGBA", "LA", "PA")
+EXIF_ORIENTATION = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+logger = logging.getLogger(__name__)
+
+
+def read_image_header(file):
+    """Return the format and the size of the image, the data is not read.
+
+    None is returned for files which are not images.
+    """
+    try:
+        image = Image.open(file)
+    except (OSError, Image.DecompressionBombError):
+        return None
+    width, height = image.size
+    if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return image.format, width, height
+
+
+def open_image(file):
+    """Read the image with the EXIF orientation applied."""
+    with file.open("rb"):
+        image = Image.open(file)
+        image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def get_widths(original_width):
+    return sorted(
+        {min(width, original_width) for width in settings.RECIPE_IMAGE_WIDTHS}
+    )
+
+
+def convert(image, image_format):
+    """Convert the image to the color mode supported by the format."""
+    has_alpha = image.mode in ALPHA_MODES or "transparency" in image.info
+    if image_format == "webp" and has_alpha:
+        return image.convert("RGBA")
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def encode(image, image_format):
+    pil_format, _, options = IMAGE_FORMATS[image_format]
+    buffer = BytesIO()
+    convert(image, image_format).save(
+        buffer,
+        format=pil_format,
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        **options,
+    )
+    return buffer.getvalue()
+
+
+def build_image_derivatives(recipe):
+    """Replace the derivatives of the recipe image, record its size."""
+    image = open_image(recipe.image)
+    RecipeImage.objects.filter(recipe=recipe).delete()
+    name = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    derivatives = []
+    for width in get_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image
+        if width != image.width:
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for image_format in settings.RECIPE_IMAGE_FORMATS:
+            extension = IMAGE_FORMATS[image_format][1]
+            derivative = RecipeImage(
+                recipe=recipe, format=image_format, width=width, height=height
+            )
+            derivative.file.save(
+                f"{name}_{width}.{extension}",
+                ContentFile(encode(resized, image_format)),
+                save=False,
+            )
+            derivatives.append(derivative)
+    RecipeImage.objects.bulk_create(derivatives)
+    recipe.image_width, recipe.image_height = image.size
+    Recipe.objects.filter(id=recipe.id).update(
+        image_width=recipe.image_width, image_height=recipe.image_height
+    )
+    return derivatives
+
+
+def build_current_image_derivatives(recipe_id, image_name):
+    """Build the derivatives unless the recipe image was replaced.
+
+    The recipe row is locked, so concurrent builds of one recipe do not
+    mix their derivatives.
+    """
+    with transaction.atomic():
+        recipe = (
+            Recipe.objects.select_for_update()
+            .filter(id=recipe_id, image=image_name)
+            .first()
+        )
+        if recipe is not None:
+            build_image_derivatives(recipe)
+
+
+def build_in_background(recipe_id, image_name):
+    try:
+        build_current_image_derivatives(recipe_id, image_name)
+    except (OSError, ValueError):
+        logger.exception("Image derivatives of recipe %s failed.", recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_image_derivatives(recipe):
+    """Drop the derivatives of the old image, build new ones after commit.
+
+    Until they are built the recipe serves the original image and has no
+    image size. The build_recipe_images command builds the derivatives
+    of the recipes whose background build was lost.
+    """
+    if recipe.image_width is not None:
+        RecipeImage.objects.filter(recipe=recipe).delete()
+        recipe.image_width = recipe.image_height = None
+        Recipe.objects.filter(id=recipe.id).update(
+            image_width=None, image_height=None
+        )
+    recipe_id, image_name = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: Thread(
+            target=build_in_background,
+            args=(recipe_id, image_name),
+            daemon=True,
+        ).start()
+    )
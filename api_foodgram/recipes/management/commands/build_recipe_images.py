@@ -0,0 +1,69 @@
+"""Build resized derivatives of the existing recipe images."""
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_current_image_derivatives
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Backfill image derivatives, continuing from the unprocessed recipes.
+
+    Recipes are processed in the order of IDs, each one in its own
+    transaction, so an interrupted run resumes with the next recipe. It
+    also builds the derivatives which a background build of a request
+    did not, e.g. on a restart of the worker.
+    """
+
+    help = "Build resized derivatives of recipe images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild the derivatives of already processed recipes.",
+        )
+        parser.add_argument(
+            "--start-id",
+            type=int,
+            default=0,
+            help="Skip the recipes with smaller IDs.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of recipes read from the database at once.",
+        )
+
+    def get_batches(self, queryset, start_id, batch_size):
+        last_id = start_id - 1
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1].id
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.exclude(image="").order_by("id")
+        if not options["all"]:
+            queryset = queryset.filter(image_width__isnull=True)
+        built = failed = 0
+        for batch in self.get_batches(
+            queryset, options["start_id"], options["batch_size"]
+        ):
+            for recipe in batch:
+                try:
+                    build_current_image_derivatives(
+                        recipe.id, recipe.image.name
+                    )
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f"Recipe {recipe.id}: {error}")
+                    continue
+                built += 1
+            self.stdout.write(f"Processed recipes up to ID {batch[-1].id}.")
+        self.stdout.write(
+            f"Image derivatives built for {built} recipes, {failed} failed."
+        )
@@ -0,0 +1,31 @@
+"""Build the nearest neighbours of recipes by ingredients and tags."""
+
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import update_similar_recipes
+
+
+class Command(BaseCommand):
+    """Update the similar recipes modified since the last run.
+
+    All similar recipes are rebuilt on the first run and with '--full'.
+    """
+
+    help = "Build the similar recipes from their ingredients and tags."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild the similar recipes of all recipes.",
+        )
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        count = update_similar_recipes(full=options["full"])
+        self.stdout.write(
+            f"Similar recipes of {count} recipes updated in "
+            f"{perf_counter() - started:.1f} s."
+        )
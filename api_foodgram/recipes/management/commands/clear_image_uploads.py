@@ -0,0 +1,29 @@
+"""Delete image uploads which were not used by recipes."""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import ImageUpload
+
+
+class Command(BaseCommand):
+    """Delete expired image uploads with their files."""
+
+    help = "Delete image uploads older than RECIPE_IMAGE_UPLOAD_LIFETIME."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lifetime",
+            type=int,
+            default=settings.RECIPE_IMAGE_UPLOAD_LIFETIME,
+            help="Age of the uploads to delete, in seconds.",
+        )
+
+    def handle(self, *args, **options):
+        deleted, _ = ImageUpload.objects.filter(
+            created__lt=timezone.now() - timedelta(seconds=options["lifetime"])
+        ).delete()
+        self.stdout.write(f"{deleted} expired image uploads deleted.")
@@ -0,0 +1,25 @@
+"""Write the recipes of pulled authors to the feeds of their followers."""
+
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.feed import fan_out_authors
+
+
+class Command(BaseCommand):
+    """Fan out the pulled authors which lost followers.
+
+    Recipes of the pulled authors with at most FEED_FANOUT_MIN_FOLLOWERS
+    followers are written to the feeds, the authors are fanned out on
+    write again. Run it periodically, e.g. by cron.
+    """
+
+    help = "Write the recipes of pulled authors to the feeds."
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        count = fan_out_authors()
+        self.stdout.write(
+            f"{count} authors fanned out in {perf_counter() - started:.1f} s."
+        )
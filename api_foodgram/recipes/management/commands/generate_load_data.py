@@ -0,0 +1,354 @@
+"""Generate synthetic users, recipes and relations for load testing."""
+
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from recipes.bulk import load_rows, refresh_derived_data, reset_sequences
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription, User
+
+PASSWORD = "load-test-password"
+POPULARITY_EXPONENT = 1.1
+PLACEHOLDER_SIZE = (1280, 853)
+NAME_WORDS = (
+    ("Домашний", "Быстрый", "Пряный", "Летний", "Сырный", "Овощной"),
+    ("суп", "салат", "пирог", "омлет", "плов", "рагу", "соус", "кекс"),
+    ("с курицей", "с грибами", "с сыром", "по-деревенски", "с зеленью"),
+)
+TEXT_WORDS = (
+    "нарезать",
+    "смешать",
+    "обжарить",
+    "запечь",
+    "добавить",
+    "посолить",
+    "варить",
+    "подавать",
+    "горячим",
+    "минут",
+    "духовке",
+    "сковороде",
+    "кастрюле",
+    "соусом",
+    "зеленью",
+)
+
+USER_FIELDS = (
+    "id",
+    "password",
+    "last_login",
+    "is_superuser",
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "is_staff",
+    "is_active",
+    "date_joined",
+    "recipes_count",
+    "followers_count",
+    "feed_pulled",
+)
+RECIPE_FIELDS = (
+    "id",
+    "name",
+    "cooking_time",
+    "author_id",
+    "text",
+    "image",
+    "image_width",
+    "image_height",
+    "pub_date",
+    "modified",
+    "favorites_count",
+    "in_carts_count",
+)
+
+
+def get_popularity(size):
+    """Return cumulative Zipf-like weights of the ranks."""
+    return list(
+        accumulate(rank**-POPULARITY_EXPONENT for rank in range(1, size + 1))
+    )
+
+
+class Popular:
+    """Population with skewed, seeded popularity of its members."""
+
+    def __init__(self, rng, members):
+        self.rng = rng
+        self.members = list(members)
+        rng.shuffle(self.members)
+        self.weights = get_popularity(len(self.members))
+
+    def sample(self, count, exclude=None):
+        """Return up to 'count' distinct members."""
+        count = min(count, len(self.members))
+        chosen = set()
+        for _ in range(10):
+            if len(chosen) >= count:
+                break
+            chosen.update(
+                self.rng.choices(
+                    self.members,
+                    cum_weights=self.weights,
+                    k=count - len(chosen),
+                )
+            )
+            chosen.discard(exclude)
+        return sorted(chosen)[:count]
+
+    def choice(self):
+        return self.rng.choices(self.members, cum_weights=self.weights)[0]
+
+
+class Command(BaseCommand):
+    """Create a reproducible dataset of the configured scale.
+
+    Users and recipes get explicit IDs after the existing ones. Recipes,
+    favorites, carts and subscriptions follow skewed distributions: few
+    authors write most recipes, few recipes get most favorites.
+    """
+
+    help = "Generate synthetic data for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument(
+            "--authors",
+            type=float,
+            default=0.2,
+            help="Share of new users writing recipes.",
+        )
+        parser.add_argument(
+            "--ingredients",
+            type=int,
+            default=9,
+            help="Mean number of ingredients per recipe.",
+        )
+        parser.add_argument(
+            "--favorites",
+            type=float,
+            default=8,
+            help="Mean number of favorites per user.",
+        )
+        parser.add_argument(
+            "--carts",
+            type=float,
+            default=2,
+            help="Mean number of recipes in the cart per user.",
+        )
+        parser.add_argument(
+            "--subscriptions",
+            type=float,
+            default=5,
+            help="Mean number of subscriptions per user.",
+        )
+        parser.add_argument(
+            "--images",
+            type=int,
+            default=0,
+            help="Number of placeholder images shared by the recipes.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Publication period of the recipes.",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def load(self, model, fields, rows):
+        started = perf_counter()
+        count = load_rows(
+            model,
+            [model._meta.get_field(field).column for field in fields],
+            rows,
+            self.batch_size,
+        )
+        elapsed = perf_counter() - started
+        self.stdout.write(
+            f"Table '{model._meta.db_table}': {count} rows in "
+            f"{elapsed:.1f} s, {count / elapsed:.0f} rows/s."
+        )
+
+    def get_count(self, mean):
+        if mean <= 0:
+            return 0
+        return int(self.rng.expovariate(1 / mean))
+
+    def create_placeholder_images(self, count):
+        """Save solid color images, return (name, width, height)."""
+        images = []
+        for number in range(count):
+            buffer = BytesIO()
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            Image.new("RGB", PLACEHOLDER_SIZE, color).save(buffer, "JPEG")
+            name = default_storage.save(
+                f"recipes/images/placeholder_{number}.jpg",
+                ContentFile(buffer.getvalue()),
+            )
+            images.append((name, *PLACEHOLDER_SIZE))
+        return images or [("", None, None)]
+
+    def generate_users(self, user_ids, now):
+        password = make_password(PASSWORD)
+        for user_id in user_ids:
+            yield (
+                user_id,
+                password,
+                None,
+                False,
+                f"load_user_{user_id}",
+                f"Имя{user_id}",
+                f"Фамилия{user_id}",
+                f"load_user_{user_id}@example.com",
+                False,
+                True,
+                now - timedelta(days=self.rng.uniform(0, self.days)),
+                0,
+                0,
+                False,
+            )
+
+    def generate_recipes(self, recipe_ids, authors, images, now):
+        rng = self.rng
+        started = now - timedelta(days=self.days)
+        step = timedelta(days=self.days) / max(len(recipe_ids), 1)
+        for number, recipe_id in enumerate(recipe_ids):
+            image, width, height = images[recipe_id % len(images)]
+            yield (
+                recipe_id,
+                " ".join(rng.choice(words) for words in NAME_WORDS),
+                max(1, min(600, int(rng.lognormvariate(3.4, 0.6)))),
+                authors.choice(),
+                " ".join(rng.choices(TEXT_WORDS, k=rng.randint(10, 60))),
+                image,
+                width,
+                height,
+                started + step * (number + rng.random()),
+                now,
+                0,
+                0,
+            )
+
+    def generate_recipe_tags(self, recipe_ids, tag_ids):
+        for recipe_id in recipe_ids:
+            for tag_id in self.rng.sample(
+                tag_ids, min(len(tag_ids), self.rng.randint(1, 3))
+            ):
+                yield recipe_id, tag_id
+
+    def generate_recipe_ingredients(self, recipe_ids, ingredients, mean):
+        for recipe_id in recipe_ids:
+            count = max(1, round(self.rng.gauss(mean, mean / 3)))
+            for ingredient_id in ingredients.sample(count):
+                yield recipe_id, ingredient_id, self.rng.randint(1, 500)
+
+    def generate_relations(self, user_ids, targets, mean):
+        """Yield (user, target) pairs, skewed by target popularity."""
+        for user_id in user_ids:
+            for target_id in targets.sample(
+                self.get_count(mean), exclude=user_id
+            ):
+                yield user_id, target_id
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.days = options["days"]
+        self.batch_size = options["batch_size"]
+        ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+        if not ingredient_ids:
+            raise CommandError("Import the ingredients first.")
+        tag_ids = list(Tag.objects.values_list("id", flat=True))
+        first_user = (User.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+        first_recipe = (
+            Recipe.objects.aggregate(Max("id"))["id__max"] or 0
+        ) + 1
+        user_ids = range(first_user, first_user + options["users"])
+        recipe_ids = range(first_recipe, first_recipe + options["recipes"])
+        if not user_ids and recipe_ids:
+            raise CommandError("Recipes need new users as authors.")
+        authors = Popular(
+            self.rng,
+            user_ids[: max(1, int(len(user_ids) * options["authors"]))],
+        )
+        recipes = Popular(self.rng, recipe_ids)
+        now = timezone.now()
+        images = self.create_placeholder_images(options["images"])
+        with transaction.atomic():
+            self.load(User, USER_FIELDS, self.generate_users(user_ids, now))
+            self.load(
+                Recipe,
+                RECIPE_FIELDS,
+                self.generate_recipes(recipe_ids, authors, images, now),
+            )
+            if tag_ids:
+                self.load(
+                    Recipe.tags.through,
+                    ("recipe_id", "tag_id"),
+                    self.generate_recipe_tags(recipe_ids, tag_ids),
+                )
+            self.load(
+                RecipeIngredient,
+                ("recipe_id", "ingredient_id", "amount"),
+                self.generate_recipe_ingredients(
+                    recipe_ids,
+                    Popular(self.rng, ingredient_ids),
+                    options["ingredients"],
+                ),
+            )
+            for model, fields, targets, mean in (
+                (
+                    Subscription,
+                    ("user_id", "author_id"),
+                    authors,
+                    "subscriptions",
+                ),
+                (Favorite, ("user_id", "recipe_id"), recipes, "favorites"),
+                (ShoppingCart, ("user_id", "recipe_id"), recipes, "carts"),
+            ):
+                self.load(
+                    model,
+                    fields,
+                    self.generate_relations(user_ids, targets, options[mean]),
+                )
+            models = (
+                User,
+                Recipe,
+                Recipe.tags.through,
+                RecipeIngredient,
+                Subscription,
+                Favorite,
+                ShoppingCart,
+            )
+            reset_sequences(models)
+            started = perf_counter()
+            refresh_derived_data(models)
+            self.stdout.write(
+                f"Derived data refreshed in {perf_counter() - started:.1f} s."
+            )
+        self.stdout.write(
+            f"Generated {len(user_ids)} users and {len(recipe_ids)} recipes."
+        )
@@ -2,53 +2,103 @@
 
 import csv
 import os.path
-import sqlite3
+from time import perf_counter
 
 from django.conf import settings
 from django.core import management
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.bulk import (
+    get_table_models,
+    load_rows,
+    refresh_derived_data,
+    reset_sequences,
+)
 
 
 class Command(BaseCommand):
-    """Import test data in database."""
+    """Import test data in database.
 
-    def handle(self, *args, **options):
-        management.call_command("migrate")
-        fill_test_data(self)
-        self.stdout.write("All test data loaded success.")
+    Every CSV file is named after its table and starts with a header of
+    the column names. Rows conflicting with existing ones are skipped.
+    """
 
+    help = "Import CSV files of STATICFILES_DIRS_DATA into the tables."
 
-def fill_table_from_csv(self, db, cursor, filename):
-    """Clear table and fill data."""
-    try:
-        csv_data = open(
-            os.path.join(settings.STATICFILES_DIRS_DATA, filename),
-            "r",
-            encoding="utf8",
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "tables",
+            nargs="*",
+            help="Tables to import, all CSV files are imported by default.",
         )
-    except IOError:
-        self.stdout.write(f"File '{filename}' open error.")
-    else:
-        table = filename.split(".")[0]
-        cursor.execute(f"DELETE FROM {table}")
-        dr = csv.DictReader(csv_data, delimiter=",")
-        values = []
-        for i in dr:
-            keys = ",".join(i.keys())
-            values.append(tuple(i.values()))
-        fields = ",".join("?" * len(values[0]))
-        cursor.executemany(
-            f"INSERT INTO {table} ({keys}) VALUES ({fields})", values
+        parser.add_argument(
+            "--path",
+            default=settings.STATICFILES_DIRS_DATA,
+            help="Directory of the CSV files.",
         )
-        db.commit()
-        self.stdout.write(
-            f"Data from file '{filename}' imported in table '{table}'."
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows loaded at once.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Load the data and roll the changes back.",
         )
 
+    @staticmethod
+    def get_tables(path, tables):
+        if tables:
+            return tables
+        return sorted(
+            os.path.splitext(filename)[0]
+            for filename in os.listdir(path)
+            if filename.endswith(".csv")
+        )
 
-def fill_test_data(self):
-    """Iterate for all tables, call funcs to prepare and fill data in db."""
-    db = sqlite3.connect(os.path.join(settings.BASE_DIR, "db.sqlite3"))
-    cursor = db.cursor()
-    for filename in os.listdir(settings.STATICFILES_DIRS_DATA):
-        fill_table_from_csv(self, db, cursor, filename)
+    def import_table(self, model, filename, batch_size):
+        """Load the CSV file into the table of the model."""
+        with open(filename, encoding="utf8", newline="") as csv_data:
+            reader = csv.reader(csv_data)
+            columns = next(reader, None)
+            if columns is None:
+                self.stdout.write(f"File '{filename}' is empty.")
+                return
+            before = model.objects.count()
+            started = perf_counter()
+            count = load_rows(model, columns, reader, batch_size)
+            elapsed = perf_counter() - started
+        inserted = model.objects.count() - before
+        self.stdout.write(
+            f"Table '{model._meta.db_table}': {count} rows read, "
+            f"{inserted} inserted, {count / elapsed:.0f} rows/s."
+        )
+
+    def handle(self, *args, **options):
+        if not options["dry_run"]:
+            management.call_command("migrate")
+        table_models = get_table_models()
+        models = []
+        with transaction.atomic():
+            for table in self.get_tables(options["path"], options["tables"]):
+                if table not in table_models:
+                    raise CommandError(f"Unknown table '{table}'.")
+                models.append(table_models[table])
+                try:
+                    self.import_table(
+                        models[-1],
+                        os.path.join(options["path"], f"{table}.csv"),
+                        options["batch_size"],
+                    )
+                except (OSError, ValueError) as error:
+                    raise CommandError(error)
+            reset_sequences(models)
+            refresh_derived_data(models)
+            if options["dry_run"]:
+                transaction.set_rollback(True)
+                self.stdout.write("Dry run, changes rolled back.")
+                return
+        self.stdout.write("All test data loaded success.")
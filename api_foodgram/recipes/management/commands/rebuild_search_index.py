@@ -0,0 +1,17 @@
+"""Rebuild the full-text search index of recipes."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.search import update_recipe_search_index
+
+
+class Command(BaseCommand):
+    """Rebuild the full-text search index of all recipes."""
+
+    help = "Rebuild the full-text search index of all recipes."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            update_recipe_search_index()
+        self.stdout.write("Search index of recipes rebuilt.")
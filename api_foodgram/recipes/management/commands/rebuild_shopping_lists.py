@@ -0,0 +1,37 @@
+"""Reconcile summary shopping lists with the shopping carts."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.shopping_list import find_drift, rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    """Find and fix the drift of summary shopping lists."""
+
+    help = "Rebuild summary shopping lists of users from shopping carts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report the drift, fail if it is found.",
+        )
+
+    def handle(self, *args, **options):
+        drift = find_drift()
+        for (user_id, ingredient_id), (stored, expected) in sorted(
+            drift.items()
+        ):
+            self.stdout.write(
+                f"user {user_id}, ingredient {ingredient_id}: "
+                f"stored {stored}, expected {expected}"
+            )
+        if options["check"]:
+            if drift:
+                raise CommandError(f"Drift found in {len(drift)} items.")
+            self.stdout.write("Summary shopping lists are consistent.")
+            return
+        rebuild_shopping_lists()
+        self.stdout.write(
+            f"Summary shopping lists rebuilt, {len(drift)} items fixed."
+        )
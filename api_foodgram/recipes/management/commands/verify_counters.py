@@ -0,0 +1,35 @@
+"""Verify denormalized counters of recipes and users."""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import COUNTERS, find_counter_drift, fix_counter
+
+
+class Command(BaseCommand):
+    """Compare the stored counters with the actual numbers."""
+
+    help = "Verify the counters of recipes and users, fix them on request."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Write the actual values of the wrong counters.",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        wrong = 0
+        for model, field, related_name in COUNTERS:
+            drift = find_counter_drift(model, field, related_name)
+            for pk, stored, actual in drift:
+                self.stdout.write(
+                    f"{model.__name__} {pk}: {field} {stored}, actual {actual}"
+                )
+            if options["fix"] and drift:
+                fix_counter(model, field, related_name)
+            wrong += len(drift)
+        if wrong and not options["fix"]:
+            raise CommandError(f"{wrong} counters are wrong.")
+        self.stdout.write(f"Counters verified, {wrong} wrong values found.")
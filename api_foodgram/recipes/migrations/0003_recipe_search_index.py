@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.db import migrations
+
+POSTGRESQL_CREATE_SQL = (
+    "ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector",
+    "CREATE INDEX recipes_recipe_search_vector_idx"
+    " ON recipes_recipe USING gin (search_vector)",
+)
+POSTGRESQL_DROP_SQL = (
+    "DROP INDEX recipes_recipe_search_vector_idx",
+    "ALTER TABLE recipes_recipe DROP COLUMN search_vector",
+)
+POSTGRESQL_FILL_SQL = (
+    "UPDATE recipes_recipe SET search_vector ="
+    " setweight(to_tsvector(%(config)s::regconfig, name), 'A')"
+    " || setweight(to_tsvector(%(config)s::regconfig, text), 'B')"
+    " || setweight(to_tsvector(%(config)s::regconfig, {ingredients}), 'C')"
+)
+SQLITE_CREATE_SQL = (
+    "CREATE VIRTUAL TABLE recipes_recipe_fts"
+    " USING fts5(name, text, ingredients,"
+    " tokenize='unicode61 remove_diacritics 2')",
+)
+SQLITE_DROP_SQL = ("DROP TABLE recipes_recipe_fts",)
+SQLITE_FILL_SQL = (
+    "INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)"
+    " SELECT id, name, text, {ingredients} FROM recipes_recipe"
+)
+INGREDIENT_NAMES_SQL = (
+    "coalesce((SELECT {aggregate}"
+    " FROM recipes_recipeingredient AS recipe_ingredient"
+    " JOIN recipes_ingredient AS ingredient"
+    " ON ingredient.id = recipe_ingredient.ingredient_id"
+    " WHERE recipe_ingredient.recipe_id = recipes_recipe.id), '')"
+)
+
+
+def get_fill_sql(template, aggregate):
+    ingredients = "''"
+    if settings.RECIPE_SEARCH_INGREDIENTS:
+        ingredients = INGREDIENT_NAMES_SQL.format(aggregate=aggregate)
+    return template.format(ingredients=ingredients)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for statement in POSTGRESQL_CREATE_SQL:
+            schema_editor.execute(statement)
+        schema_editor.execute(
+            get_fill_sql(
+                POSTGRESQL_FILL_SQL, "string_agg(ingredient.name, ' ')"
+            ),
+            {"config": settings.RECIPE_SEARCH_CONFIG},
+        )
+    elif vendor == "sqlite":
+        for statement in SQLITE_CREATE_SQL:
+            schema_editor.execute(statement)
+        schema_editor.execute(
+            get_fill_sql(SQLITE_FILL_SQL, "group_concat(ingredient.name, ' ')")
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {
+        "postgresql": POSTGRESQL_DROP_SQL,
+        "sqlite": SQLITE_DROP_SQL,
+    }.get(schema_editor.connection.vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0002_auto_20230214_0729"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
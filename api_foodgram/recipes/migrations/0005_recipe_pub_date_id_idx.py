@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-17 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0004_shoppinglistitem"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["-pub_date", "id"], name="recipe_pub_date_id_idx"
+            ),
+        ),
+    ]
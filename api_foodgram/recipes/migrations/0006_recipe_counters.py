@@ -0,0 +1,55 @@
+# Generated by Django 2.2.28 on 2026-10-17 04:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def count_related(related_model, related_field):
+    return Subquery(
+        related_model.objects.filter(**{related_field: OuterRef("pk")})
+        .order_by()
+        .values(related_field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Favorite = apps.get_model("recipes", "Favorite")
+    Recipe = apps.get_model("recipes", "Recipe")
+    ShoppingCart = apps.get_model("recipes", "ShoppingCart")
+    User = apps.get_model("users", "User")
+    for model, field, related_model, related_field in (
+        (Recipe, "favorites_count", Favorite, "recipe"),
+        (Recipe, "in_carts_count", ShoppingCart, "recipe"),
+        (User, "recipes_count", Recipe, "author"),
+    ):
+        model.objects.filter(
+            pk__in=related_model.objects.values(related_field)
+        ).update(**{field: count_related(related_model, related_field)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0005_recipe_pub_date_id_idx"),
+        ("users", "0002_user_recipes_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="in favorites"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="in_carts_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="in shopping carts"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 2.2.28 on 2026-10-17 04:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0006_recipe_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                editable=False, null=True, verbose_name="image height"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                editable=False, null=True, verbose_name="image width"
+            ),
+        ),
+        migrations.CreateModel(
+            name="RecipeImage",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "format",
+                    models.CharField(max_length=10, verbose_name="format"),
+                ),
+                ("width", models.PositiveIntegerField(verbose_name="width")),
+                ("height", models.PositiveIntegerField(verbose_name="height")),
+                (
+                    "file",
+                    models.ImageField(
+                        upload_to="recipes/derivatives/", verbose_name="file"
+                    ),
+                ),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="image_derivatives",
+                        to="recipes.Recipe",
+                        verbose_name="recipe",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "recipe image derivative",
+                "verbose_name_plural": "recipe image derivatives",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="recipeimage",
+            constraint=models.UniqueConstraint(
+                fields=("recipe", "format", "width"),
+                name="unique_recipe_image_derivative",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.28 on 2026-10-17 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0011_similarrecipe"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Sequence",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=200, unique=True, verbose_name="name"
+                    ),
+                ),
+                (
+                    "value",
+                    models.BigIntegerField(default=0, verbose_name="value"),
+                ),
+            ],
+            options={
+                "verbose_name": "sequence",
+                "verbose_name_plural": "sequences",
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 """Database settings of the 'Recipes' application."""
 
+from uuid import uuid4
+
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -115,12 +117,36 @@ class Recipe(models.Model):
         verbose_name="recipe image",
         help_text="Add recipe image",
     )
+    image_width = models.PositiveIntegerField(
+        null=True, editable=False, verbose_name="image width"
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, editable=False, verbose_name="image height"
+    )
     pub_date = models.DateTimeField(auto_now_add=True, db_index=True)
+    modified = models.DateTimeField(
+        auto_now=True, db_index=True, verbose_name="modified"
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, verbose_name="in favorites"
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, verbose_name="in shopping carts"
+    )
 
     class Meta:
         ordering = ("-pub_date",)
         verbose_name = "recipe"
         verbose_name_plural = "recipes"
+        indexes = (
+            models.Index(
+                fields=("-pub_date", "id"), name="recipe_pub_date_id_idx"
+            ),
+            models.Index(
+                fields=("author", "-pub_date"),
+                name="recipe_author_pub_date_idx",
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -207,3 +233,164 @@ class ShoppingCart(models.Model):
                 fields=["user", "recipe"], name="unique_shopping_cart"
             ),
         )
+
+
+class ShoppingListItem(models.Model):
+    """Summary amount of ingredient in the user shopping cart."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="user",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="ingredient",
+    )
+    amount = models.PositiveIntegerField(verbose_name="amount")
+
+    class Meta:
+        verbose_name = "shopping list item"
+        verbose_name_plural = "shopping list items"
+        constraints = (
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_shopping_list_item",
+            ),
+        )
+
+
+class RecipeImage(models.Model):
+    """Resized copy of the recipe image."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="image_derivatives",
+        verbose_name="recipe",
+    )
+    format = models.CharField(max_length=10, verbose_name="format")
+    width = models.PositiveIntegerField(verbose_name="width")
+    height = models.PositiveIntegerField(verbose_name="height")
+    file = models.ImageField(
+        upload_to="recipes/derivatives/", verbose_name="file"
+    )
+
+    class Meta:
+        verbose_name = "recipe image derivative"
+        verbose_name_plural = "recipe image derivatives"
+        constraints = (
+            models.UniqueConstraint(
+                fields=["recipe", "format", "width"],
+                name="unique_recipe_image_derivative",
+            ),
+        )
+
+
+class ImageUpload(models.Model):
+    """Image uploaded for a recipe that is not created or changed yet."""
+
+    token = models.UUIDField(
+        default=uuid4, unique=True, editable=False, verbose_name="token"
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="image_uploads",
+        verbose_name="user",
+    )
+    file = models.ImageField(upload_to="recipes/uploads/", verbose_name="file")
+    width = models.PositiveIntegerField(verbose_name="width")
+    height = models.PositiveIntegerField(verbose_name="height")
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "image upload"
+        verbose_name_plural = "image uploads"
+
+
+class FeedEntry(models.Model):
+    """Recipe of a followed author in the feed of the user."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="user",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="recipe",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="author",
+    )
+    pub_date = models.DateTimeField(verbose_name="publication date")
+
+    class Meta:
+        verbose_name = "feed entry"
+        verbose_name_plural = "feed entries"
+        constraints = (
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_feed_entry"
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=("user", "-pub_date", "-recipe"),
+                name="feed_entry_user_pub_date_idx",
+            ),
+            models.Index(
+                fields=("user", "author"), name="feed_entry_user_author_idx"
+            ),
+        )
+
+
+class SimilarRecipe(models.Model):
+    """Recipe among the nearest neighbours of the recipe by ingredients."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="similar_recipes",
+        db_index=False,
+        verbose_name="recipe",
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="neighbour_of",
+        verbose_name="similar recipe",
+    )
+    score = models.FloatField(verbose_name="similarity")
+
+    class Meta:
+        verbose_name = "similar recipe"
+        verbose_name_plural = "similar recipes"
+        indexes = (
+            models.Index(
+                fields=("recipe", "-score"), name="similar_recipe_score_idx"
+            ),
+        )
+
+
+class Sequence(models.Model):
+    """Named counter incremented by concurrent processes."""
+
+    name = models.CharField(max_length=200, unique=True, verbose_name="name")
+    value = models.BigIntegerField(default=0, verbose_name="value")
+
+    class Meta:
+        verbose_name = "sequence"
+        verbose_name_plural = "sequences"
+
+    def __str__(self):
+        return self.name
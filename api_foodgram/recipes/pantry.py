@@ -0,0 +1,385 @@
+"""Recipes which can be cooked from the ingredients of a pantry.
+
+Every worker holds an inverted index of the recipes: sorted arrays of the
+recipe rows by ingredient and by tag, the number of ingredients and the
+cooking time of every recipe. The posting lists of the pantry ingredients
+are concatenated and counted at once, so the recipes sharing at least one
+ingredient with the pantry and the number of their missing ingredients
+are found without looking at the other recipes.
+
+Recipe writes publish the changed recipe IDs in numbered cache entries
+after the commit. The numbers come from a database sequence, whose row
+lock also orders the writes of the entries and of the last number, so
+concurrent writers never share or reorder a number. A worker reloads
+only these recipes and replaces the posting lists they touch. The index
+is rebuilt from the database when it misses changes (the sequence of the
+entries was reset or an entry is lost), after PANTRY_INDEX_MAX_CHANGES
+changed recipes and when the version of the index is bumped by bulk data
+loading. Only the first build runs in a request, later ones run in a
+background thread and the requests are served from the old index until
+the new one replaces it.
+"""
+
+import logging
+from collections import namedtuple
+from itertools import chain
+from threading import Lock, Thread
+from time import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+
+from recipes.cache import get_data_version
+from recipes.counters import increment_sequence
+from recipes.models import Recipe, RecipeIngredient
+
+PANTRY_INDEX_VERSION = "pantry_index"
+CHANGES_SEQUENCE_KEY = "pantry_index:changes"
+CHANGES_KEY = "pantry_index:changes:{}"
+
+EMPTY_ROWS = np.array([], dtype=np.int64)
+
+logger = logging.getLogger(__name__)
+
+Postings = namedtuple("Postings", ("lists", "indptr", "indices", "overrides"))
+PantryState = namedtuple(
+    "PantryState",
+    (
+        "version",
+        "sequence",
+        "changes",
+        "recipe_ids",
+        "sizes",
+        "cooking_times",
+        "ingredients",
+        "tags",
+    ),
+)
+
+
+def record_changes(recipe_ids):
+    """Publish the changed recipes to the indexes after the commit."""
+    recipe_ids = list(recipe_ids)
+
+    def publish():
+        with transaction.atomic():
+            sequence = increment_sequence(CHANGES_SEQUENCE_KEY)
+            cache.set(
+                CHANGES_KEY.format(sequence),
+                recipe_ids,
+                settings.PANTRY_INDEX_CHANGES_TIMEOUT,
+            )
+            cache.set(CHANGES_SEQUENCE_KEY, sequence, timeout=None)
+
+    transaction.on_commit(publish)
+
+
+def get_pairs(queryset, *fields):
+    """Return the integer field values of the rows as columns of an array."""
+    # Reads go to the primary database: a replica may not have the
+    # published changes yet, and a stale row would stay in the index.
+    values = chain.from_iterable(
+        queryset.using(DEFAULT_DB_ALIAS).values_list(*fields).iterator()
+    )
+    pairs = np.fromiter(values, dtype=np.int64).reshape(-1, len(fields))
+    return pairs.T
+
+
+def get_known_rows(recipe_ids, pairs):
+    """Return rows and keys of the (recipe ID, key) pairs of known recipes."""
+    rows = np.searchsorted(recipe_ids, pairs[0])
+    known = rows < len(recipe_ids)
+    known[known] = recipe_ids[rows[known]] == pairs[0][known]
+    return rows[known], pairs[1][known]
+
+
+def build_postings(rows, keys, count):
+    """Return the posting lists of the keys and the keys of the rows."""
+    size = keys.max(initial=0) + 1
+    pairs = np.sort(rows * size + keys)
+    pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+    rows, keys = pairs // size, pairs % size
+    order = np.argsort(keys, kind="stable")
+    values, starts = np.unique(keys[order], return_index=True)
+    lists = dict(zip(values.tolist(), np.split(rows[order], starts[1:])))
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=indptr[1:])
+    return Postings(lists, indptr, keys, {})
+
+
+def get_keys(postings, row):
+    """Return the sorted keys of the row."""
+    if row in postings.overrides:
+        return postings.overrides[row]
+    if row + 1 >= len(postings.indptr):
+        return EMPTY_ROWS
+    start, end = postings.indptr[row], postings.indptr[row + 1]
+    return postings.indices[start:end]
+
+
+def update_postings(postings, changes):
+    """Return the posting lists with the new keys of the changed rows."""
+    removed, added = {}, {}
+    for row, keys in changes.items():
+        old_keys = get_keys(postings, row)
+        for key in np.setdiff1d(old_keys, keys).tolist():
+            removed.setdefault(key, []).append(row)
+        for key in np.setdiff1d(keys, old_keys).tolist():
+            added.setdefault(key, []).append(row)
+    lists = dict(postings.lists)
+    for key in removed.keys() | added.keys():
+        rows = lists.get(key, EMPTY_ROWS)
+        if key in removed:
+            rows = np.delete(rows, np.searchsorted(rows, removed[key]))
+        if key in added:
+            new_rows = np.sort(added[key])
+            rows = np.insert(rows, np.searchsorted(rows, new_rows), new_rows)
+        if len(rows):
+            lists[key] = rows
+        else:
+            lists.pop(key, None)
+    return postings._replace(
+        lists=lists, overrides={**postings.overrides, **changes}
+    )
+
+
+def get_rows(postings, keys):
+    """Return the concatenated posting lists of the keys."""
+    lists = [postings.lists[key] for key in keys if key in postings.lists]
+    return np.concatenate(lists) if lists else EMPTY_ROWS
+
+
+def group_keys(pairs, rows_by_id):
+    """Return the sorted keys of every row from (recipe ID, key) pairs."""
+    groups = {row: [] for row in rows_by_id.values()}
+    for recipe_id, key in pairs.T.tolist():
+        groups[rows_by_id[recipe_id]].append(key)
+    return {
+        row: np.unique(np.array(keys, dtype=np.int64))
+        for row, keys in groups.items()
+    }
+
+
+class PantryIndex:
+    """In-memory inverted index of recipes by ingredients and tags."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._state = None
+        self._missing_since = None
+        self._building = False
+
+    @staticmethod
+    def get_sequence():
+        return cache.get(CHANGES_SEQUENCE_KEY, 0)
+
+    def build(self, version):
+        """Read all recipes and build the index state."""
+        sequence = self.get_sequence()
+        recipe_ids, cooking_times = get_pairs(
+            Recipe.objects.order_by("id"), "id", "cooking_time"
+        )
+        ingredient_pairs = get_pairs(
+            RecipeIngredient.objects.all(), "recipe_id", "ingredient_id"
+        )
+        tag_pairs = get_pairs(
+            Recipe.tags.through.objects.all(), "recipe_id", "tag_id"
+        )
+        ingredients = build_postings(
+            *get_known_rows(recipe_ids, ingredient_pairs), len(recipe_ids)
+        )
+        tags = build_postings(
+            *get_known_rows(recipe_ids, tag_pairs), len(recipe_ids)
+        )
+        return PantryState(
+            version,
+            sequence,
+            0,
+            recipe_ids,
+            np.diff(ingredients.indptr),
+            cooking_times,
+            ingredients,
+            tags,
+        )
+
+    def get_changes(self, state, sequence):
+        """Return IDs of the changed recipes and the last applied change.
+
+        The latest entries may not be written yet, they are read later.
+        None is returned when an entry is missing for longer than
+        PANTRY_INDEX_CHANGES_WAIT seconds.
+        """
+        numbers = range(state.sequence + 1, sequence + 1)
+        entries = cache.get_many([CHANGES_KEY.format(n) for n in numbers])
+        changed_ids, applied = set(), state.sequence
+        for number in numbers:
+            entry = entries.get(CHANGES_KEY.format(number))
+            if entry is None:
+                if self._missing_since is None:
+                    self._missing_since = time()
+                elif (
+                    time() - self._missing_since
+                    > settings.PANTRY_INDEX_CHANGES_WAIT
+                ):
+                    return None
+                return changed_ids, applied
+            changed_ids.update(entry)
+            applied = number
+        self._missing_since = None
+        return changed_ids, applied
+
+    @staticmethod
+    def apply_changes(state, changed_ids, sequence):
+        """Reload the changed recipes, return the new index state."""
+        changed_ids = sorted(changed_ids)
+        found_ids, cooking_times = get_pairs(
+            Recipe.objects.filter(id__in=changed_ids), "id", "cooking_time"
+        )
+        known = np.flatnonzero(np.isin(state.recipe_ids, changed_ids))
+        new_ids = np.setdiff1d(found_ids, state.recipe_ids[known])
+        recipe_ids = np.concatenate((state.recipe_ids, new_ids))
+        rows_by_id = dict(
+            zip(
+                recipe_ids[known].tolist() + new_ids.tolist(),
+                known.tolist()
+                + list(range(len(state.recipe_ids), len(recipe_ids))),
+            )
+        )
+        found_ids = found_ids.tolist()
+        ingredient_keys = group_keys(
+            get_pairs(
+                RecipeIngredient.objects.filter(recipe_id__in=found_ids),
+                "recipe_id",
+                "ingredient_id",
+            ),
+            rows_by_id,
+        )
+        tag_keys = group_keys(
+            get_pairs(
+                Recipe.tags.through.objects.filter(recipe_id__in=found_ids),
+                "recipe_id",
+                "tag_id",
+            ),
+            rows_by_id,
+        )
+        padding = np.zeros(len(new_ids), dtype=np.int64)
+        sizes = np.concatenate((state.sizes, padding))
+        sizes[list(ingredient_keys)] = [
+            len(keys) for keys in ingredient_keys.values()
+        ]
+        times = np.concatenate((state.cooking_times, padding))
+        times[[rows_by_id[recipe_id] for recipe_id in found_ids]] = (
+            cooking_times
+        )
+        return state._replace(
+            sequence=sequence,
+            changes=state.changes + len(changed_ids),
+            recipe_ids=recipe_ids,
+            sizes=sizes,
+            cooking_times=times,
+            ingredients=update_postings(state.ingredients, ingredient_keys),
+            tags=update_postings(state.tags, tag_keys),
+        )
+
+    def refresh(self, state, version, sequence):
+        """Return the state with the changes applied, None to rebuild it."""
+        if state.version != version:
+            return None
+        if (
+            state.sequence > sequence
+            or sequence - state.sequence > settings.PANTRY_INDEX_MAX_CHANGES
+        ):
+            return None
+        if state.sequence == sequence:
+            return state
+        changes = self.get_changes(state, sequence)
+        if changes is None:
+            return None
+        changed_ids, applied = changes
+        if state.changes + len(changed_ids) > (
+            settings.PANTRY_INDEX_MAX_CHANGES
+        ):
+            return None
+        return self.apply_changes(state, changed_ids, applied)
+
+    def rebuild(self, version):
+        """Build the index state and serve it instead of the old one."""
+        state = self.build(version)
+        with self._lock:
+            self._state = state
+
+    def rebuild_in_background(self, version):
+        try:
+            self.rebuild(version)
+        except Exception:
+            logger.exception("Pantry index build failed.")
+        finally:
+            self._building = False
+            connection.close()
+
+    def get_state(self):
+        version = get_data_version(PANTRY_INDEX_VERSION)
+        sequence = self.get_sequence()
+        state = self._state
+        if state is not None and (state.version, state.sequence) == (
+            version,
+            sequence,
+        ):
+            return state
+        with self._lock:
+            state = self._state
+            if state is None:
+                state = self._state = self.build(version)
+            elif not self._building:
+                refreshed = self.refresh(state, version, sequence)
+                if refreshed is None:
+                    self._building = True
+                    Thread(
+                        target=self.rebuild_in_background,
+                        args=(version,),
+                        daemon=True,
+                    ).start()
+                else:
+                    state = self._state = refreshed
+        return state
+
+    def match(
+        self,
+        ingredient_ids,
+        tag_ids=(),
+        max_cooking_time=None,
+        max_missing=None,
+    ):
+        """Return (recipe ID, missing ingredients) rows of the matches.
+
+        Recipes with at least one of the ingredients are matched, the
+        cookable ones first, then by the number of missing ingredients
+        and from the newest. Tags filter recipes with any of the tags.
+        """
+        state = self.get_state()
+        counts = np.bincount(
+            get_rows(state.ingredients, set(ingredient_ids)),
+            minlength=len(state.recipe_ids),
+        )
+        rows = np.flatnonzero(counts)
+        have = counts[rows]
+        keep = np.ones(len(rows), dtype=bool)
+        if tag_ids:
+            tagged = np.zeros(len(state.recipe_ids), dtype=bool)
+            tagged[get_rows(state.tags, set(tag_ids))] = True
+            keep &= tagged[rows]
+        if max_cooking_time is not None:
+            keep &= state.cooking_times[rows] <= max_cooking_time
+        missing = state.sizes[rows] - have
+        if max_missing is not None:
+            keep &= missing <= max_missing
+        recipe_ids, missing = state.recipe_ids[rows[keep]], missing[keep]
+        # One sort by the missing count and the descending recipe ID.
+        newest = recipe_ids.max(initial=0)
+        order = np.argsort(missing * (newest + 1) + newest - recipe_ids)
+        return np.column_stack((recipe_ids[order], missing[order]))
+
+
+pantry_index = PantryIndex()
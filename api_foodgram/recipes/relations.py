@@ -0,0 +1,127 @@
+"""Bulk changes of the user relations with recipes and authors.
+
+Bulk inserts and deletes do not send the model signals, so the
+counters, summary shopping lists, feeds and cached user states which
+the signal handlers keep up to date for single saves are updated here.
+Changes of the relations of a user are serialized by a lock of the user
+row, so the relations read before a change are the ones it changes and
+concurrent requests never apply the derived updates twice.
+"""
+
+from collections import namedtuple
+
+from django.db import connection, transaction
+
+from recipes import feed, shopping_list
+from recipes.counters import change_counter
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.user_state import invalidate_user_state
+from users.models import Subscription, User
+
+Relation = namedtuple("Relation", ("target_field", "added", "removed"))
+
+
+def favorites_added(user_id, recipe_ids):
+    change_counter(Recipe, "favorites_count", recipe_ids, 1)
+
+
+def favorites_removed(user_id, recipe_ids):
+    change_counter(Recipe, "favorites_count", recipe_ids, -1)
+
+
+def cart_recipes_added(user_id, recipe_ids):
+    change_counter(Recipe, "in_carts_count", recipe_ids, 1)
+    shopping_list.apply_deltas(user_id, shopping_list.get_amounts(recipe_ids))
+
+
+def cart_recipes_removed(user_id, recipe_ids):
+    change_counter(Recipe, "in_carts_count", recipe_ids, -1)
+    shopping_list.apply_deltas(
+        user_id,
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in shopping_list.get_amounts(
+                recipe_ids
+            ).items()
+        },
+    )
+
+
+def authors_followed(user_id, author_ids):
+    change_counter(User, "followers_count", author_ids, 1)
+    for author_id in author_ids:
+        feed.follow(user_id, author_id)
+
+
+def authors_unfollowed(user_id, author_ids):
+    change_counter(User, "followers_count", author_ids, -1)
+    for author_id in author_ids:
+        feed.unfollow(user_id, author_id)
+
+
+RELATIONS = {
+    Favorite: Relation("recipe_id", favorites_added, favorites_removed),
+    ShoppingCart: Relation(
+        "recipe_id", cart_recipes_added, cart_recipes_removed
+    ),
+    Subscription: Relation("author_id", authors_followed, authors_unfollowed),
+}
+
+
+def lock_user(user_id):
+    """Lock the user row until the end of the transaction."""
+    list(User.objects.select_for_update().filter(pk=user_id).values("pk"))
+
+
+def get_related_ids(model, user_id, target_ids):
+    """Return IDs of the targets already related to the user."""
+    field = RELATIONS[model].target_field
+    return set(
+        model.objects.filter(
+            user_id=user_id, **{f"{field}__in": target_ids}
+        ).values_list(field, flat=True)
+    )
+
+
+@transaction.atomic
+def add_relations(model, user_id, target_ids):
+    """Relate the user to the targets, return IDs of the new relations."""
+    relation = RELATIONS[model]
+    lock_user(user_id)
+    added = sorted(
+        set(target_ids) - get_related_ids(model, user_id, target_ids)
+    )
+    if not added:
+        return []
+    model.objects.bulk_create(
+        [
+            model(user_id=user_id, **{relation.target_field: target_id})
+            for target_id in added
+        ],
+        ignore_conflicts=True,
+    )
+    relation.added(user_id, added)
+    invalidate_user_state(user_id)
+    return added
+
+
+@transaction.atomic
+def remove_relations(model, user_id, target_ids):
+    """Remove relations of the user to the targets, return removed IDs."""
+    relation = RELATIONS[model]
+    lock_user(user_id)
+    removed = sorted(get_related_ids(model, user_id, target_ids))
+    if not removed:
+        return []
+    # No rows depend on the relations, so they are deleted by one query
+    # without the per-object delete signals repeating the updates below.
+    placeholders = ", ".join("%s" for _ in removed)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {model._meta.db_table} WHERE user_id = %s"
+            f" AND {relation.target_field} IN ({placeholders})",
+            [user_id, *removed],
+        )
+    relation.removed(user_id, removed)
+    invalidate_user_state(user_id)
+    return removed
@@ -0,0 +1,257 @@
+"""Search indexes of the 'Recipes' application."""
+
+import re
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+
+from recipes.cache import INGREDIENTS_VERSION, get_data_version
+from recipes.models import Ingredient
+
+TRIGRAM_LENGTH = 3
+
+RECIPE_SEARCH_TABLE = "recipes_recipe_fts"
+RECIPE_INGREDIENT_NAMES_SQL = (
+    "coalesce((SELECT {aggregate}"
+    " FROM recipes_recipeingredient AS recipe_ingredient"
+    " JOIN recipes_ingredient AS ingredient"
+    " ON ingredient.id = recipe_ingredient.ingredient_id"
+    " WHERE recipe_ingredient.recipe_id = recipes_recipe.id), '')"
+)
+POSTGRESQL_UPDATE_SQL = (
+    "UPDATE recipes_recipe SET search_vector ="
+    " setweight(to_tsvector(%(config)s::regconfig, name), 'A')"
+    " || setweight(to_tsvector(%(config)s::regconfig, text), 'B')"
+    " || setweight(to_tsvector(%(config)s::regconfig, {ingredients}), 'C')"
+)
+POSTGRESQL_SEARCH_RANK_SQL = (
+    "-ts_rank(recipes_recipe.search_vector,"
+    " plainto_tsquery(%s::regconfig, %s))"
+)
+POSTGRESQL_SEARCH_MATCH_SQL = (
+    "recipes_recipe.search_vector @@ plainto_tsquery(%s::regconfig, %s)"
+)
+SQLITE_INSERT_SQL = (
+    f"INSERT INTO {RECIPE_SEARCH_TABLE} (rowid, name, text, ingredients)"
+    " SELECT id, name, text, {ingredients} FROM recipes_recipe"
+)
+SQLITE_RANK_WEIGHTS = "bm25(10.0, 5.0, 1.0)"
+
+
+def normalize(value):
+    """Fold the case and the letter 'ё' of the search string."""
+    return value.casefold().replace("ё", "е")
+
+
+def trigrams(value):
+    """Return the set of trigrams of the normalized string."""
+    return {
+        value[i:i + TRIGRAM_LENGTH]
+        for i in range(len(value) - TRIGRAM_LENGTH + 1)
+    }
+
+
+def within_one_edit(first, second):
+    """Check that the strings differ by at most one edit."""
+    if first == second:
+        return True
+    if abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+    i = 0
+    while i < len(first) and first[i] == second[i]:
+        i += 1
+    if len(first) == len(second):
+        return first[i + 1:] == second[i + 1:]
+    return first[i:] == second[i + 1:]
+
+
+class IngredientIndex:
+    """In-memory prefix and trigram index of ingredient names.
+
+    Every worker holds its own copy of the index. The index is rebuilt
+    when the version of the ingredients data set changes.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._state = None
+
+    @staticmethod
+    def build():
+        """Read ingredients and build the index state."""
+        ingredients = tuple(
+            Ingredient(**values)
+            for values in Ingredient.objects.order_by("name", "id").values(
+                "id", "name", "measurement_unit"
+            )
+        )
+        names = tuple(
+            normalize(ingredient.name) for ingredient in ingredients
+        )
+        prefixes = sorted(
+            (name, position) for position, name in enumerate(names)
+        )
+        grams = {}
+        for position, name in enumerate(names):
+            for gram in trigrams(name):
+                grams.setdefault(gram, set()).add(position)
+        return ingredients, names, prefixes, grams
+
+    def get_state(self):
+        version = get_data_version(INGREDIENTS_VERSION)
+        if self._state is None or self._version != version:
+            with self._lock:
+                if self._state is None or self._version != version:
+                    self._state = self.build()
+                    self._version = version
+        return self._state
+
+    def search(self, query):
+        """Find ingredients: prefix matches first, then substring ones."""
+        ingredients, names, prefixes, grams = self.get_state()
+        query = normalize(query)
+        found = set()
+        for index in range(bisect_left(prefixes, (query,)), len(prefixes)):
+            name, position = prefixes[index]
+            if not name.startswith(query):
+                break
+            found.add(position)
+        matches = sorted(found)
+        if len(query) >= TRIGRAM_LENGTH:
+            candidates = set.intersection(
+                *(grams.get(gram, set()) for gram in trigrams(query))
+            )
+        else:
+            candidates = range(len(names))
+        matches.extend(
+            sorted(
+                position
+                for position in candidates
+                if position not in found and query in names[position]
+            )
+        )
+        if not matches and self.fuzzy_allowed(query):
+            matches = [
+                position
+                for position, name in enumerate(names)
+                if self.fuzzy_prefix_match(query, name)
+            ]
+        return [ingredients[position] for position in matches]
+
+    @staticmethod
+    def fuzzy_allowed(query):
+        return (
+            settings.INGREDIENT_SEARCH_FUZZY
+            and len(query) >= settings.INGREDIENT_SEARCH_FUZZY_MIN_LENGTH
+        )
+
+    @staticmethod
+    def fuzzy_prefix_match(query, name):
+        """Check that the name starts with the query with one typo."""
+        length = len(query)
+        return any(
+            within_one_edit(query, name[:size])
+            for size in (length - 1, length, length + 1)
+        )
+
+
+ingredient_index = IngredientIndex()
+
+
+def get_indexing_sql(template, aggregate):
+    """Return the SQL indexing recipes with or without ingredient names."""
+    ingredients = "''"
+    if settings.RECIPE_SEARCH_INGREDIENTS:
+        ingredients = RECIPE_INGREDIENT_NAMES_SQL.format(aggregate=aggregate)
+    return template.format(ingredients=ingredients)
+
+
+def update_recipe_search_index(recipe_ids=None, using=DEFAULT_DB_ALIAS):
+    """Refresh full-text search data of recipes (all of them by default)."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            sql = get_indexing_sql(
+                POSTGRESQL_UPDATE_SQL, "string_agg(ingredient.name, ' ')"
+            )
+            params = {"config": settings.RECIPE_SEARCH_CONFIG}
+            if recipe_ids is not None:
+                sql += " WHERE id = ANY(%(ids)s)"
+                params["ids"] = list(recipe_ids)
+            cursor.execute(sql, params)
+        elif connection.vendor == "sqlite":
+            sql = get_indexing_sql(
+                SQLITE_INSERT_SQL, "group_concat(ingredient.name, ' ')"
+            )
+            if recipe_ids is None:
+                cursor.execute(f"DELETE FROM {RECIPE_SEARCH_TABLE}")
+                cursor.execute(sql)
+                return
+            recipe_ids = list(recipe_ids)
+            placeholders = ", ".join("%s" for _ in recipe_ids)
+            cursor.execute(
+                f"DELETE FROM {RECIPE_SEARCH_TABLE}"
+                f" WHERE rowid IN ({placeholders})",
+                recipe_ids,
+            )
+            cursor.execute(f"{sql} WHERE id IN ({placeholders})", recipe_ids)
+
+
+def delete_recipe_search_index(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """Remove full-text search data of deleted recipes.
+
+    PostgreSQL keeps the data in the rows of the recipes, only the
+    SQLite index table has rows of its own.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    recipe_ids = list(recipe_ids)
+    placeholders = ", ".join("%s" for _ in recipe_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {RECIPE_SEARCH_TABLE}"
+            f" WHERE rowid IN ({placeholders})",
+            recipe_ids,
+        )
+
+
+def search_recipes(queryset, query):
+    """Filter recipes by the search query and order them by rank."""
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        params = (settings.RECIPE_SEARCH_CONFIG, query)
+        queryset = queryset.extra(
+            select={"search_rank": POSTGRESQL_SEARCH_RANK_SQL},
+            select_params=params,
+            where=(POSTGRESQL_SEARCH_MATCH_SQL,),
+            params=params,
+        )
+    elif vendor == "sqlite":
+        words = re.findall(r"\w+", query)
+        if not words:
+            return queryset.none()
+        queryset = queryset.extra(
+            select={"search_rank": f"{RECIPE_SEARCH_TABLE}.rank"},
+            tables=(RECIPE_SEARCH_TABLE,),
+            where=(
+                f"{RECIPE_SEARCH_TABLE} MATCH %s",
+                f"{RECIPE_SEARCH_TABLE}.rank MATCH %s",
+                f"{RECIPE_SEARCH_TABLE}.rowid = recipes_recipe.id",
+            ),
+            params=(
+                " ".join(f'"{word}"' for word in words),
+                SQLITE_RANK_WEIGHTS,
+            ),
+        )
+    else:
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        )
+    return queryset.order_by("search_rank", "-pub_date")
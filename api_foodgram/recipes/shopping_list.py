@@ -0,0 +1,188 @@
+"""Summary shopping lists of users.
+
+The summary list of a user holds the total amount of every ingredient of
+the recipes in the user shopping cart. It is changed by deltas when the
+cart or the ingredients of a recipe change.
+"""
+
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from recipes.cache import bump_data_version, get_data_version
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+SHOPPING_LISTS_VERSION = "shopping_lists"
+USER_SHOPPING_LIST_VERSION = "shopping_list:{}"
+REBUILD_BATCH_SIZE = 1000
+
+
+def get_version(user_id):
+    """Return the version of the summary list of the user."""
+    return ":".join(
+        (
+            get_data_version(SHOPPING_LISTS_VERSION),
+            get_data_version(USER_SHOPPING_LIST_VERSION.format(user_id)),
+        )
+    )
+
+
+def bump_versions(user_ids):
+    """Mark summary lists of the users as changed after the commit."""
+    user_ids = tuple(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            bump_data_version(USER_SHOPPING_LIST_VERSION.format(user_id))
+
+    transaction.on_commit(bump)
+
+
+def get_amounts(recipe_ids):
+    """Return total amounts of ingredients of the recipes."""
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values("ingredient_id")
+        .annotate(total=Sum("amount"))
+        .values_list("ingredient_id", "total")
+        .order_by()
+    )
+
+
+def get_deltas(old_amounts, new_amounts):
+    """Return changes of ingredient amounts."""
+    deltas = Counter(new_amounts)
+    deltas.subtract(old_amounts)
+    return {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items()
+        if delta
+    }
+
+
+@transaction.atomic
+def apply_deltas(user_id, deltas):
+    """Change the summary list of the user by the ingredient deltas."""
+    if not deltas:
+        return
+    items = ShoppingListItem.objects.select_for_update().filter(
+        user_id=user_id, ingredient_id__in=deltas
+    )
+    items = {item.ingredient_id: item for item in items}
+    created, updated, deleted = [], [], []
+    for ingredient_id, delta in deltas.items():
+        item = items.get(ingredient_id)
+        if item is None:
+            if delta > 0:
+                created.append(
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=delta,
+                    )
+                )
+        elif item.amount + delta > 0:
+            item.amount += delta
+            updated.append(item)
+        else:
+            deleted.append(item.pk)
+    ShoppingListItem.objects.bulk_create(created)
+    ShoppingListItem.objects.bulk_update(updated, ("amount",))
+    ShoppingListItem.objects.filter(pk__in=deleted).delete()
+    bump_versions((user_id,))
+
+
+def add_recipe(user_id, recipe_id):
+    """Add ingredients of the recipe to the summary list of the user."""
+    apply_deltas(user_id, get_amounts((recipe_id,)))
+
+
+def remove_recipe(user_id, recipe_id):
+    """Remove ingredients of the recipe from the summary list of the user."""
+    apply_deltas(
+        user_id,
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in get_amounts((recipe_id,)).items()
+        },
+    )
+
+
+@transaction.atomic
+def change_recipe(recipe_id, deltas):
+    """Apply changes of the recipe ingredients to the summary lists."""
+    if not deltas:
+        return
+    carts = ShoppingCart.objects.filter(recipe_id=recipe_id)
+    bump_versions(carts.values_list("user_id", flat=True))
+    for ingredient_id, delta in deltas.items():
+        ShoppingListItem.objects.filter(
+            user_id__in=carts.values("user_id"), ingredient_id=ingredient_id
+        ).update(amount=F("amount") + delta)
+        if delta < 0:
+            ShoppingListItem.objects.filter(
+                ingredient_id=ingredient_id, amount=0
+            ).delete()
+            continue
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=delta
+            )
+            for user_id in carts.exclude(
+                user__shopping_list__ingredient_id=ingredient_id
+            ).values_list("user_id", flat=True)
+        )
+
+
+def get_expected_items():
+    """Return summary amounts computed from the shopping carts."""
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe__carts__isnull=False
+        )
+        .values("recipe__carts__user_id", "ingredient_id")
+        .annotate(total=Sum("amount"))
+        .values_list("recipe__carts__user_id", "ingredient_id", "total")
+        .order_by()
+    }
+
+
+def find_drift():
+    """Return summary items which differ from the shopping carts."""
+    expected = get_expected_items()
+    stored = {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in (
+            ShoppingListItem.objects.values_list(
+                "user_id", "ingredient_id", "amount"
+            )
+        )
+    }
+    return {
+        key: (stored.get(key), expected.get(key))
+        for key in expected.keys() | stored.keys()
+        if stored.get(key) != expected.get(key)
+    }
+
+
+@transaction.atomic
+def rebuild_shopping_lists():
+    """Recalculate summary lists of all users from the shopping carts."""
+    ShoppingListItem.objects.all().delete()
+    items = (
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for (user_id, ingredient_id), amount in get_expected_items().items()
+    )
+    # bulk_create of Django 2.2 does not limit an explicit batch size by
+    # the limits of the database backend.
+    while True:
+        batch = list(islice(items, REBUILD_BATCH_SIZE))
+        if not batch:
+            break
+        ShoppingListItem.objects.bulk_create(batch)
+    transaction.on_commit(lambda: bump_data_version(SHOPPING_LISTS_VERSION))
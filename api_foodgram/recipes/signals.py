@@ -0,0 +1,142 @@
+"""Signal handlers of the 'Recipes' application."""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes import feed, pantry, shopping_list
+from recipes.cache import INGREDIENTS_VERSION, TAGS_VERSION, bump_data_version
+from recipes.counters import change_counter
+from recipes.models import (
+    Favorite,
+    ImageUpload,
+    Ingredient,
+    Recipe,
+    RecipeImage,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from recipes.search import (
+    delete_recipe_search_index,
+    update_recipe_search_index,
+)
+from recipes.user_state import invalidate_user_state
+from users.models import Subscription, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    """Invalidate the ingredients search index and cached list."""
+    transaction.on_commit(lambda: bump_data_version(INGREDIENTS_VERSION))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, update_fields, using, **kwargs):
+    """Reindex the recipes of a changed ingredient, it may be renamed."""
+    if created or update_fields is not None and "name" not in update_fields:
+        return
+    recipe_ids = list(
+        RecipeIngredient.objects.using(using)
+        .filter(ingredient=instance)
+        .values_list("recipe_id", flat=True)
+    )
+    if recipe_ids:
+        update_recipe_search_index(recipe_ids, using=using)
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleted(instance, **kwargs):
+    """Update the recipes of the ingredient in the pantry indexes."""
+    pantry.record_changes(
+        RecipeIngredient.objects.filter(ingredient=instance).values_list(
+            "recipe_id", flat=True
+        )
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    """Invalidate the cached list of tags."""
+    transaction.on_commit(lambda: bump_data_version(TAGS_VERSION))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, **kwargs):
+    """Count the recipe of the author, add it to the follower feeds.
+
+    The recipe is updated in the pantry indexes on every save.
+    """
+    pantry.record_changes((instance.id,))
+    if created:
+        change_counter(User, "recipes_count", (instance.author_id,), 1)
+        feed.add_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, using, **kwargs):
+    """Uncount the recipe of the author, remove it from the indexes."""
+    pantry.record_changes((instance.id,))
+    delete_recipe_search_index((instance.id,), using=using)
+    change_counter(User, "recipes_count", (instance.author_id,), -1)
+
+
+@receiver(post_save, sender=Favorite)
+def recipe_added_to_favorites(instance, created, **kwargs):
+    """Count the recipe in favorites."""
+    if created:
+        change_counter(Recipe, "favorites_count", (instance.recipe_id,), 1)
+        invalidate_user_state(instance.user_id)
+
+
+@receiver(post_delete, sender=Favorite)
+def recipe_removed_from_favorites(instance, **kwargs):
+    """Uncount the recipe in favorites."""
+    change_counter(Recipe, "favorites_count", (instance.recipe_id,), -1)
+    invalidate_user_state(instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def recipe_added_to_cart(instance, created, **kwargs):
+    """Count the recipe in carts, add its ingredients to the summary list."""
+    if created:
+        change_counter(Recipe, "in_carts_count", (instance.recipe_id,), 1)
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+        invalidate_user_state(instance.user_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def recipe_removed_from_cart(instance, **kwargs):
+    """Uncount the recipe in carts, remove it from the summary list.
+
+    Runs before the deletion, so that the ingredients of the recipe are
+    still available when the cart entry is deleted by a cascade.
+    """
+    change_counter(Recipe, "in_carts_count", (instance.recipe_id,), -1)
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+    invalidate_user_state(instance.user_id)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(instance, created, **kwargs):
+    """Count the follower of the author, update the subscriber feed."""
+    if created:
+        change_counter(User, "followers_count", (instance.author_id,), 1)
+        feed.follow(instance.user_id, instance.author_id)
+    invalidate_user_state(instance.user_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    """Uncount the follower of the author, update the subscriber feed."""
+    change_counter(User, "followers_count", (instance.author_id,), -1)
+    feed.unfollow(instance.user_id, instance.author_id)
+    invalidate_user_state(instance.user_id)
+
+
+@receiver(post_delete, sender=RecipeImage)
+@receiver(post_delete, sender=ImageUpload)
+def image_file_owner_deleted(instance, **kwargs):
+    """Delete the image file of the deleted row after the commit."""
+    storage, name = instance.file.storage, instance.file.name
+    transaction.on_commit(lambda: storage.delete(name))
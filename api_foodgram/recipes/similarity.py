@@ -0,0 +1,229 @@
+"""Similar recipes by the cosine similarity of their ingredients.
+
+Recipes are vectors of TF-IDF weights of their ingredients and, with
+SIMILAR_RECIPES_TAG_WEIGHT, of their tags. Ingredients of more than
+SIMILAR_RECIPES_MAX_DF of all recipes (salt, water) tell little about a
+recipe and are left out, which also keeps the products of the sparse
+ingredient matrix sparse. The vectors are normalized, so their products
+are the cosine similarities. Tags only rank the recipes sharing an
+ingredient: the few tags would make every product dense. Similarities
+are computed for batches of recipes, and the top SIMILAR_RECIPES_COUNT
+neighbours of every recipe are saved.
+
+An incremental update recomputes the recipes modified since the last
+run, the recipes which had them as neighbours and the recipes for which
+they are closer than the current neighbours. Recipes with less than
+SIMILAR_RECIPES_COUNT neighbours are recomputed too: the neighbours of
+a deleted recipe are deleted with it, which leaves their lists short.
+The weights of the other recipes are not recomputed, a full rebuild
+refreshes all of them.
+"""
+
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from scipy import sparse
+
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+LAST_UPDATE_KEY = "similar_recipes:last_update"
+
+Vectors = namedtuple("Vectors", ("recipe_ids", "ingredients", "tags"))
+
+
+def get_array(queryset, columns=1):
+    """Return the integer values of the queryset rows as an array."""
+    values = queryset.iterator()
+    if columns > 1:
+        values = chain.from_iterable(values)
+    return np.fromiter(values, dtype=np.int64).reshape(-1, columns)
+
+
+def get_rows(recipe_ids, ids):
+    """Return the vector rows of the recipe IDs, skip unknown recipes."""
+    rows = np.searchsorted(recipe_ids, ids)
+    known = rows < len(recipe_ids)
+    known[known] = recipe_ids[rows[known]] == ids[known]
+    return rows[known], known
+
+
+def get_weights(recipe_ids, queryset, field, weight, max_df=1):
+    """Return the TF-IDF matrix of the recipes by the related objects."""
+    pairs = get_array(queryset.values_list("recipe_id", field), columns=2)
+    rows, known = get_rows(recipe_ids, pairs[:, 0])
+    objects, columns = np.unique(pairs[known, 1], return_inverse=True)
+    frequencies = np.bincount(columns, minlength=len(objects))
+    informative = frequencies[columns] <= max_df * len(recipe_ids)
+    idf = np.log((1 + len(recipe_ids)) / (1 + frequencies)) + 1
+    return sparse.csr_matrix(
+        (
+            idf[columns[informative]] * weight,
+            (rows[informative], columns[informative]),
+        ),
+        shape=(len(recipe_ids), len(objects)),
+    )
+
+
+def build_vectors():
+    """Return the normalized vectors of all recipes sorted by ID."""
+    recipe_ids = get_array(
+        Recipe.objects.order_by("id").values_list("id", flat=True)
+    ).ravel()
+    ingredients = get_weights(
+        recipe_ids,
+        RecipeIngredient.objects,
+        "ingredient_id",
+        1,
+        settings.SIMILAR_RECIPES_MAX_DF,
+    )
+    tags = np.zeros((len(recipe_ids), 0))
+    if settings.SIMILAR_RECIPES_TAG_WEIGHT:
+        tags = get_weights(
+            recipe_ids,
+            Recipe.tags.through.objects,
+            "tag_id",
+            settings.SIMILAR_RECIPES_TAG_WEIGHT,
+        ).toarray()
+    norms = np.sqrt(
+        np.asarray(ingredients.multiply(ingredients).sum(axis=1)).ravel()
+        + (tags**2).sum(axis=1)
+    )
+    norms[norms == 0] = 1
+    return Vectors(
+        recipe_ids,
+        (sparse.diags(1 / norms) @ ingredients).tocsr(),
+        tags / norms[:, np.newaxis],
+    )
+
+
+def get_scores(vectors, rows):
+    """Return similarities of the rows to the recipes sharing ingredients."""
+    scores = (vectors.ingredients[rows] @ vectors.ingredients.T).tocsr()
+    owners = np.repeat(rows, np.diff(scores.indptr))
+    scores.data += np.einsum(
+        "ij,ij->i", vectors.tags[owners], vectors.tags[scores.indices]
+    )
+    return scores
+
+
+def get_neighbours(vectors, rows):
+    """Return (row, neighbour row, score) arrays of the nearest neighbours.
+
+    Neighbours of every row are ordered by descending similarity.
+    """
+    scores = get_scores(vectors, rows)
+    count = settings.SIMILAR_RECIPES_COUNT
+    owners, neighbours, similarities = [], [], []
+    for number, row in enumerate(rows):
+        start, end = scores.indptr[number], scores.indptr[number + 1]
+        columns, data = scores.indices[start:end], scores.data[start:end]
+        keep = (columns != row) & (data > 0)
+        columns, data = columns[keep], data[keep]
+        if len(data) > count:
+            top = np.argpartition(-data, count)[:count]
+            columns, data = columns[top], data[top]
+        order = np.lexsort((columns, -data))
+        owners.append(np.full(len(order), row))
+        neighbours.append(columns[order])
+        similarities.append(data[order])
+    if not owners:
+        return np.array([], int), np.array([], int), np.array([])
+    return (
+        np.concatenate(owners),
+        np.concatenate(neighbours),
+        np.concatenate(similarities),
+    )
+
+
+def save_neighbours(vectors, rows):
+    """Replace the saved neighbours of the rows in batches."""
+    recipe_ids = vectors.recipe_ids
+    batch_size = settings.SIMILAR_RECIPES_BATCH_SIZE
+    for batch in np.split(rows, range(batch_size, len(rows), batch_size)):
+        SimilarRecipe.objects.filter(
+            recipe_id__in=recipe_ids[batch].tolist()
+        ).delete()
+        owners, neighbours, scores = get_neighbours(vectors, batch)
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(
+                recipe_id=recipe_id, similar_id=similar_id, score=score
+            )
+            for recipe_id, similar_id, score in zip(
+                recipe_ids[owners].tolist(),
+                recipe_ids[neighbours].tolist(),
+                scores.tolist(),
+            )
+        )
+
+
+def get_thresholds(recipe_ids):
+    """Return the lowest neighbour score of the recipes, 0 if not full."""
+    stats = list(
+        SimilarRecipe.objects.values("recipe_id")
+        .annotate(count=Count("id"), lowest=Min("score"))
+        .filter(count__gte=settings.SIMILAR_RECIPES_COUNT)
+        .values_list("recipe_id", "lowest")
+        .order_by()
+    )
+    rows, known = get_rows(
+        recipe_ids, np.array([recipe_id for recipe_id, _ in stats], np.int64)
+    )
+    thresholds = np.zeros(len(recipe_ids))
+    thresholds[rows] = np.array([lowest for _, lowest in stats])[known]
+    return thresholds
+
+
+def get_affected_rows(vectors, since):
+    """Return rows of the recipes whose neighbours may have changed."""
+    recipe_ids = vectors.recipe_ids
+    changed, _ = get_rows(
+        recipe_ids,
+        get_array(
+            Recipe.objects.filter(modified__gte=since).values_list(
+                "id", flat=True
+            )
+        ).ravel(),
+    )
+    thresholds = get_thresholds(recipe_ids)
+    short = np.flatnonzero(thresholds == 0)
+    if not len(changed):
+        return short
+    former, _ = get_rows(
+        recipe_ids,
+        get_array(
+            SimilarRecipe.objects.filter(similar__modified__gte=since)
+            .values_list("recipe_id", flat=True)
+            .distinct()
+        ).ravel(),
+    )
+    closest = get_scores(vectors, changed).max(axis=0).toarray().ravel()
+    closer = np.flatnonzero(closest > thresholds)
+    return np.union1d(np.union1d(changed, former), np.union1d(short, closer))
+
+
+@transaction.atomic
+def update_similar_recipes(full=False):
+    """Update the saved neighbours, return the number of updated recipes.
+
+    All neighbours are rebuilt when 'full' is set or the time of the
+    last update is unknown.
+    """
+    started = timezone.now()
+    since = None if full else cache.get(LAST_UPDATE_KEY)
+    vectors = build_vectors()
+    if since is None:
+        SimilarRecipe.objects.all().delete()
+        rows = np.arange(len(vectors.recipe_ids))
+    else:
+        rows = get_affected_rows(vectors, since)
+    save_neighbours(vectors, rows)
+    transaction.on_commit(
+        lambda: cache.set(LAST_UPDATE_KEY, started, timeout=None)
+    )
+    return len(rows)
@@ -0,0 +1,71 @@
+"""Relations of users with recipes and authors.
+
+The IDs of favorite recipes, recipes in the shopping cart and followed
+authors are loaded once and cached under the version of the user state.
+The version is bumped when any of these relations of the user changes,
+the version of all user states is bumped by bulk data loading.
+"""
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.cache import bump_data_version, get_data_version
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+USER_STATES_VERSION = "user_states"
+USER_STATE_VERSION = "user_state:{}"
+
+UserState = namedtuple(
+    "UserState", ("favorites", "shopping_cart", "subscriptions")
+)
+EMPTY_USER_STATE = UserState(frozenset(), frozenset(), frozenset())
+
+
+def load_user_state(user):
+    return UserState(
+        frozenset(
+            Favorite.objects.filter(user=user).values_list(
+                "recipe_id", flat=True
+            )
+        ),
+        frozenset(
+            ShoppingCart.objects.filter(user=user).values_list(
+                "recipe_id", flat=True
+            )
+        ),
+        frozenset(
+            Subscription.objects.filter(user=user).values_list(
+                "author_id", flat=True
+            )
+        ),
+    )
+
+
+def get_user_state(user):
+    """Return the relations of the user, empty for anonymous users."""
+    if user is None or not user.is_authenticated:
+        return EMPTY_USER_STATE
+    version_name = USER_STATE_VERSION.format(user.id)
+    key = ":".join(
+        (
+            version_name,
+            get_data_version(USER_STATES_VERSION),
+            get_data_version(version_name),
+        )
+    )
+    state = cache.get(key)
+    if state is None:
+        state = load_user_state(user)
+        cache.set(key, state, settings.USER_STATE_CACHE_TIMEOUT)
+    return state
+
+
+def invalidate_user_state(user_id):
+    """Mark the relations of the user as changed after the commit."""
+    transaction.on_commit(
+        lambda: bump_data_version(USER_STATE_VERSION.format(user_id))
+    )
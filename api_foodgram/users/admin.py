@@ -3,6 +3,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from api.authentication import invalidate_user_tokens
 from users.admin_site_permissions import StaffAllowedModelAdmin
 from users.models import Subscription, User
 
@@ -41,12 +42,18 @@ class StaffAllowedUserAdmin(UserAdmin, StaffAllowedModelAdmin):
 
     def activate_users(self, request, queryset):
         """Admin actions: activate users."""
-        count = queryset.filter(is_active=False).update(is_active=True)
+        queryset = queryset.filter(is_active=False)
+        user_ids = list(queryset.values_list("pk", flat=True))
+        count = queryset.update(is_active=True)
+        invalidate_user_tokens(user_ids)
         self.message_user(request, "Activated {} users.".format(count))
 
     def deactivate_users(self, request, queryset):
         """Admin actions: deactivate users."""
-        count = queryset.filter(is_active=True).update(is_active=False)
+        queryset = queryset.filter(is_active=True)
+        user_ids = list(queryset.values_list("pk", flat=True))
+        count = queryset.update(is_active=False)
+        invalidate_user_tokens(user_ids)
         self.message_user(request, "Deactivated {} users.".format(count))
 
     list_display = (
@@ -55,6 +62,7 @@ class StaffAllowedUserAdmin(UserAdmin, StaffAllowedModelAdmin):
         "email",
         "first_name",
         "last_name",
+        "recipes_count",
         "is_staff",
         "is_active",
     )
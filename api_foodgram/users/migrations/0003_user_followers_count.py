@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-17 04:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def fill_followers_count(apps, schema_editor):
+    Subscription = apps.get_model("users", "Subscription")
+    User = apps.get_model("users", "User")
+    User.objects.filter(pk__in=Subscription.objects.values("author")).update(
+        followers_count=Subquery(
+            Subscription.objects.filter(author=OuterRef("pk"))
+            .order_by()
+            .values("author")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_user_recipes_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="followers count"
+            ),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+    ]
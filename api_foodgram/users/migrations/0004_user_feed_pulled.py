@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-17 18:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_feed_pulled(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    User.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_user_followers_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="feed_pulled",
+            field=models.BooleanField(
+                default=False, verbose_name="recipes are pulled to the feeds"
+            ),
+        ),
+        migrations.RunPython(fill_feed_pulled, migrations.RunPython.noop),
+    ]
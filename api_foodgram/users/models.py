@@ -12,6 +12,15 @@ class User(AbstractUser):
     last_name = models.CharField(max_length=150)
     email = models.EmailField(unique=True)
     password = models.CharField(max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        default=0, verbose_name="recipes count"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name="followers count"
+    )
+    feed_pulled = models.BooleanField(
+        default=False, verbose_name="recipes are pulled to the feeds"
+    )
 
     REQUIRED_FIELDS = ("email", "first_name", "last_name")
 
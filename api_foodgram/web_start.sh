@@ -1,2 +1,2 @@
 python manage.py migrate --no-input
-gunicorn api_foodgram.wsgi:application --bind 0:8000
+gunicorn api_foodgram.wsgi:application --config gunicorn_conf.py